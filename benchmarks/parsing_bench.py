@@ -0,0 +1,75 @@
+"""Microbenchmark of the per-event cost of decoding and validating webhook
+payloads.
+
+Compares the original pipeline (``json.loads``, pydantic model construction,
+and ``.dict()``) with the fast path (``orjson.loads`` and
+`ltdevents.eventregistry.EventRegistry.parse`).
+
+Run from the repository root::
+
+    python benchmarks/parsing_bench.py
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Callable
+
+import orjson
+
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+
+BODY = json.dumps(
+    {
+        "event_type": "edition.updated",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": {
+            "published_url": "https://example.lsst.io/",
+            "url": "https://keeper.lsst.codes/products/example",
+            "title": "Example product",
+            "slug": "example",
+        },
+        "edition": {
+            "published_url": "https://example.lsst.io/v/1.0",
+            "url": "https://keeper.lsst.codes/editions/1234",
+            "title": "Version 1.0",
+            "slug": "1.0",
+            "build_url": "https://keeper.lsst.codes/builds/1",
+        },
+    }
+).encode()
+
+ITERATIONS = 20000
+
+REGISTRY = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+
+
+def time_per_event(func: Callable[[bytes], Any]) -> float:
+    """Time a parsing function, returning microseconds per event."""
+    for _ in range(100):
+        func(BODY)
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func(BODY)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def pydantic_parse(body: bytes) -> Any:
+    return REGISTRY.parse_event(json.loads(body.decode())).dict()
+
+
+def fast_parse(body: bytes) -> Any:
+    return REGISTRY.parse(orjson.loads(body))[1]
+
+
+def main() -> None:
+    baseline = time_per_event(pydantic_parse)
+    optimized = time_per_event(fast_parse)
+    print(f"json + pydantic + dict(): {baseline:8.1f} us/event")
+    print(f"orjson + fast path:       {optimized:8.1f} us/event")
+    print(f"Speedup: {baseline / optimized:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Benchmark of the Kafka producer settings for ``edition.updated`` messages.
+
+For each compression codec and maximum batch size, ``ltd.edition_update_v1``
+messages are encoded into Kafka record batches (as the producer does before
+sending them) to compare the encoding throughput and the bytes on the wire
+per message.
+
+If a broker is given with ``--broker``, the messages are also sent with an
+`aiokafka.AIOKafkaProducer` for each combination of compression, linger,
+acks, and idempotence setting, to compare the end-to-end throughput.
+
+Run from the repository root::
+
+    python benchmarks/producer_bench.py [--broker localhost:9092]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import copy
+import itertools
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from aiokafka import AIOKafkaProducer
+from aiokafka.record.default_records import DefaultRecordBatchBuilder
+from kafkit.registry.manager import RecordNameSchemaManager
+from kafkit.registry.sansio import MockRegistryApi
+
+from ltdevents.bench import PAYLOAD_TEMPLATES
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+from ltdevents.serializers import AvroSerializers
+
+SCHEMA_ROOT = Path(__file__).parent.parent / "src" / "ltdevents" / "schemas"
+
+MESSAGE_COUNT = 20000
+
+CODECS = {
+    "none": DefaultRecordBatchBuilder.CODEC_NONE,
+    "gzip": DefaultRecordBatchBuilder.CODEC_GZIP,
+    "snappy": DefaultRecordBatchBuilder.CODEC_SNAPPY,
+    "lz4": DefaultRecordBatchBuilder.CODEC_LZ4,
+}
+
+BATCH_SIZES = [16384, 65536, 262144]
+
+LINGER_MS = [0, 5, 20]
+
+ACKS: List[Tuple[Union[int, str], bool]] = [
+    (1, False),
+    ("all", False),
+    ("all", True),
+]
+
+
+async def make_messages(count: int) -> List[Tuple[bytes, bytes]]:
+    """Serialize ``edition.updated`` events for 100 distinct editions."""
+    registry = MockRegistryApi()
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    for schema_id, schema in enumerate(manager.schemas.values(), start=1):
+        registry.schema_cache.insert(schema, schema_id)
+    serializers = await AvroSerializers.from_manager(manager, registry)
+    event_registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+
+    messages = []
+    for i in range(count):
+        payload = copy.deepcopy(PAYLOAD_TEMPLATES["edition.updated"])
+        payload["edition"]["slug"] = str(i % 100)
+        payload["edition"][
+            "build_url"
+        ] = f"https://keeper.lsst.codes/builds/{i}"
+        event_type, record = event_registry.parse(payload)
+        message = event_registry.serialize(event_type, record, serializers)
+        messages.append((message.key, message.value))
+    return messages
+
+
+def encode_batches(
+    messages: List[Tuple[bytes, bytes]], *, codec: int, batch_size: int
+) -> int:
+    """Encode messages into record batches, returning the total size."""
+    total = 0
+    builder: Optional[DefaultRecordBatchBuilder] = None
+    offset = 0
+    timestamp = int(time.time() * 1000)
+    for key, value in messages:
+        while True:
+            if builder is None:
+                builder = DefaultRecordBatchBuilder(
+                    2, codec, 0, -1, -1, -1, batch_size
+                )
+                offset = 0
+            if builder.append(offset, timestamp, key, value, []) is not None:
+                offset += 1
+                break
+            total += len(builder.build())
+            builder = None
+    if builder is not None:
+        total += len(builder.build())
+    return total
+
+
+def bench_encoding(messages: List[Tuple[bytes, bytes]]) -> None:
+    raw = sum(len(k) + len(v) for k, v in messages)
+    print(f"Raw key and value bytes: {raw / len(messages):.1f} bytes/message")
+    print()
+    print(
+        f"{'Compression':<12} {'Batch size':>10} {'Bytes/msg':>10} "
+        f"{'Ratio':>6} {'Messages/s':>12}"
+    )
+    for (name, codec), batch_size in itertools.product(
+        CODECS.items(), BATCH_SIZES
+    ):
+        try:
+            start = time.perf_counter()
+            total = encode_batches(
+                messages, codec=codec, batch_size=batch_size
+            )
+            duration = time.perf_counter() - start
+        except Exception as e:
+            print(f"{name:<12} {batch_size:>10} unavailable ({e})")
+            continue
+        print(
+            f"{name:<12} {batch_size:>10} {total / len(messages):>10.1f} "
+            f"{raw / total:>6.2f} {len(messages) / duration:>12.0f}"
+        )
+
+
+async def bench_producer(
+    messages: List[Tuple[bytes, bytes]], broker: str, topic: str
+) -> None:
+    print()
+    print(
+        f"{'Compression':<12} {'Linger':>6} {'Acks':>4} {'Idemp.':>6} "
+        f"{'Messages/s':>12}"
+    )
+    for name, linger_ms, (acks, idempotence) in itertools.product(
+        CODECS, LINGER_MS, ACKS
+    ):
+        settings: Dict[str, Any] = {
+            "compression_type": None if name == "none" else name,
+            "linger_ms": linger_ms,
+            "acks": acks,
+            "enable_idempotence": idempotence,
+        }
+        try:
+            producer = AIOKafkaProducer(bootstrap_servers=broker, **settings)
+        except Exception as e:
+            print(f"{name:<12} unavailable ({e})")
+            continue
+        await producer.start()
+        try:
+            start = time.perf_counter()
+            futures = [
+                await producer.send(topic, key=key, value=value)
+                for key, value in messages
+            ]
+            await asyncio.gather(*futures)
+            duration = time.perf_counter() - start
+        finally:
+            await producer.stop()
+        print(
+            f"{name:<12} {linger_ms:>6} {acks!s:>4} {idempotence!s:>6} "
+            f"{len(messages) / duration:>12.0f}"
+        )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Kafka producer settings."
+    )
+    parser.add_argument("--broker", help="Kafka broker (host:port).")
+    parser.add_argument("--topic", default="ltd.events.bench")
+    parser.add_argument("--count", type=int, default=MESSAGE_COUNT)
+    args = parser.parse_args()
+
+    messages = await make_messages(args.count)
+    bench_encoding(messages)
+    if args.broker:
+        await bench_producer(messages, args.broker, args.topic)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""Microbenchmark of the per-event cost of Avro key and value serialization.
+
+Compares serializing ``edition.updated`` events through
+`kafkit.registry.manager.RecordNameSchemaManager.serialize` (which resolves
+and re-parses the schema on every call) with the precompiled
+`ltdevents.serializers.AvroSerializers`.
+
+Run from the repository root::
+
+    python benchmarks/serialization_bench.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, Callable, Coroutine
+
+from kafkit.registry.manager import RecordNameSchemaManager
+from kafkit.registry.sansio import MockRegistryApi
+
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+from ltdevents.serializers import AvroSerializers
+from ltdevents.webhookmodels import EditionUpdatedEvent
+
+SCHEMA_ROOT = Path(__file__).parent.parent / "src" / "ltdevents" / "schemas"
+
+PAYLOAD = {
+    "event_type": "edition.updated",
+    "event_timestamp": "2020-01-01T12:00:00Z",
+    "product": {
+        "published_url": "https://example.lsst.io/",
+        "url": "https://keeper.lsst.codes/products/example",
+        "title": "Example product",
+        "slug": "example",
+    },
+    "edition": {
+        "published_url": "https://example.lsst.io/v/1.0",
+        "url": "https://keeper.lsst.codes/editions/1234",
+        "title": "Version 1.0",
+        "slug": "1.0",
+        "build_url": "https://keeper.lsst.codes/builds/1",
+    },
+}
+
+ITERATIONS = 5000
+
+
+async def time_per_event(
+    func: Callable[[EditionUpdatedEvent], Coroutine[Any, Any, Any]],
+    event: EditionUpdatedEvent,
+) -> float:
+    """Time a serialization function, returning microseconds per event."""
+    for _ in range(100):
+        await func(event)
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await func(event)
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+async def main() -> None:
+    registry = MockRegistryApi()
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    for schema_id, schema in enumerate(manager.schemas.values(), start=1):
+        registry.schema_cache.insert(schema, schema_id)
+    serializers = await AvroSerializers.from_manager(manager, registry)
+    event = EditionUpdatedEvent.parse_obj(PAYLOAD)
+
+    async def manager_serialize(event: EditionUpdatedEvent) -> None:
+        await manager.serialize(
+            data={
+                "product_slug": event.product.slug,
+                "edition_slug": event.edition.slug,
+            },
+            name="ltd.edition_key_v1",
+        )
+        await manager.serialize(
+            data=event.dict(), name="ltd.edition_update_v1"
+        )
+
+    _, record = EventRegistry(EVENT_TYPES, default_topic="ltd.events").parse(
+        PAYLOAD
+    )
+
+    async def precompiled_serialize(event: EditionUpdatedEvent) -> None:
+        serializers.serialize_key(
+            (record["product"]["slug"], record["edition"]["slug"]),
+            name="ltd.edition_key_v1",
+        )
+        serializers.serialize(record, name="ltd.edition_update_v1")
+
+    baseline = await time_per_event(manager_serialize, event)
+    optimized = await time_per_event(precompiled_serialize, event)
+    print(f"RecordNameSchemaManager.serialize: {baseline:8.1f} us/event")
+    print(f"AvroSerializers (precompiled):     {optimized:8.1f} us/event")
+    print(f"Speedup: {baseline / optimized:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
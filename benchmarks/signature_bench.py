@@ -0,0 +1,80 @@
+"""Microbenchmark of the per-request cost of webhook signature verification.
+
+Compares `ltdevents.signatures.SignatureVerifier.verify` (which copies HMAC
+objects that have already absorbed the keys) with computing a fresh
+``hmac.new`` for each request, for a single ``edition.updated`` payload and a
+``/webhook/batch`` body of 100 payloads. The cost of decoding the body with
+orjson is shown for scale.
+
+Run from the repository root::
+
+    python benchmarks/signature_bench.py
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import orjson
+
+from ltdevents.bench import PAYLOAD_TEMPLATES
+from ltdevents.signatures import SignatureVerifier, sign
+
+ITERATIONS = 20000
+
+KEYS = [b"a" * 32, b"b" * 32, b"c" * 32]
+
+
+def time_per_request(func: Callable[[], object]) -> float:
+    """Time a function, returning microseconds per call."""
+    for _ in range(100):
+        func()
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def main() -> None:
+    payload = PAYLOAD_TEMPLATES["edition.updated"]
+    bodies = {
+        "single payload": json.dumps(payload).encode(),
+        "batch of 100": json.dumps([payload] * 100).encode(),
+    }
+    for key_count in (1, len(KEYS)):
+        with tempfile.TemporaryDirectory() as keys_dir:
+            for i, key in enumerate(KEYS[:key_count]):
+                (Path(keys_dir) / f"key{i}").write_bytes(key)
+            verifier = SignatureVerifier(Path(keys_dir))
+
+        for name, body in bodies.items():
+            # The worst case: the signature matches the last key
+            signature = sign(KEYS[key_count - 1], body)
+            expected = signature[len("sha256=") :].encode()
+
+            def fresh_hmac() -> bool:
+                valid = False
+                for key in KEYS[:key_count]:
+                    digest = hmac.new(key, body, hashlib.sha256).hexdigest()
+                    if hmac.compare_digest(digest.encode(), expected):
+                        valid = True
+                return valid
+
+            cached = time_per_request(lambda: verifier.verify(body, signature))
+            fresh = time_per_request(fresh_hmac)
+            decode = time_per_request(lambda: orjson.loads(body))
+            print(
+                f"{key_count} key(s), {name} ({len(body)} bytes): "
+                f"cached {cached:.2f} us, fresh hmac.new {fresh:.2f} us, "
+                f"orjson.loads {decode:.2f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
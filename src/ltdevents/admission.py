@@ -0,0 +1,193 @@
+"""Admission control for the webhook endpoints.
+
+Each webhook request holds its payload in memory and, in the ``sync``
+delivery mode, a pending Kafka send until it's answered. The
+`AdmissionController` bounds the number of requests that are handled at
+once. Requests beyond the limit wait in a bounded queue; once the queue is
+full, requests are rejected with a 429 status, and requests that wait in the
+queue for longer than the queue timeout are rejected with a 503 status. Both
+responses have a ``Retry-After`` header.
+
+Handlers opt in to admission control with the `admission_controlled`
+decorator, and `admission_middleware` applies the controller that
+`setup_admission` makes available from the ``"ltdevents/admission"``
+application key.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from aiohttp import web
+
+from ltdevents.metrics import WebhookMetrics
+
+__all__ = [
+    "AdmissionController",
+    "AdmissionRejected",
+    "admission_controlled",
+    "admission_middleware",
+    "setup_admission",
+]
+
+HandlerType = TypeVar(
+    "HandlerType", bound=Callable[[web.Request], Awaitable[web.StreamResponse]]
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request isn't admitted.
+
+    Parameters
+    ----------
+    status : `int`
+        The HTTP status of the rejection: 429 if the queue is full, or 503 if
+        the request timed out in the queue.
+    reason : `str`
+        The reason: ``queue_full`` or ``queue_timeout``.
+    """
+
+    def __init__(self, status: int, reason: str) -> None:
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+class AdmissionController:
+    """A limit on the number of requests that are handled concurrently, with
+    a bounded queue of waiting requests.
+
+    Parameters
+    ----------
+    max_in_flight : `int`
+        The maximum number of requests that are handled at once.
+    max_queued : `int`
+        The maximum number of requests that wait to be handled.
+    queue_timeout : `float`
+        The maximum time, in seconds, that a request waits in the queue.
+    retry_after : `int`
+        The number of seconds in the ``Retry-After`` header of rejections.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_in_flight: int,
+        max_queued: int,
+        queue_timeout: float,
+        retry_after: int,
+    ) -> None:
+        if max_in_flight < 1:
+            raise ValueError(
+                "The maximum number of requests in flight must be positive, "
+                f"not {max_in_flight}"
+            )
+        self.max_in_flight = max_in_flight
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def acquire(self) -> None:
+        """Wait for a request to be admitted.
+
+        Raises
+        ------
+        AdmissionRejected
+            Raised if the request isn't admitted.
+        """
+        if self._semaphore.locked():
+            if self.queued >= self.max_queued:
+                self._reject(429, "queue_full")
+            self.queued += 1
+            try:
+                await asyncio.wait_for(
+                    self._semaphore.acquire(), self.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                self._reject(503, "queue_timeout")
+            finally:
+                self.queued -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+
+    def release(self) -> None:
+        """Release an admitted request."""
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def _reject(self, status: int, reason: str) -> None:
+        self.rejected[reason] += 1
+        raise AdmissionRejected(status, reason)
+
+
+def admission_controlled(handler: HandlerType) -> HandlerType:
+    """Mark a handler as subject to admission control."""
+    setattr(handler, "admission_controlled", True)
+    return handler
+
+
+@web.middleware
+async def admission_middleware(
+    request: web.Request,
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    """Apply admission control to the handlers marked with
+    `admission_controlled`.
+    """
+    controller: Optional[AdmissionController] = request.config_dict.get(
+        "ltdevents/admission"
+    )
+    if controller is None or not getattr(
+        request.match_info.handler, "admission_controlled", False
+    ):
+        return await handler(request)
+
+    try:
+        await controller.acquire()
+    except AdmissionRejected as e:
+        request.config_dict["ltdevents/webhook_logging"].error(
+            request["safir/logger"],
+            "Rejected webhook request",
+            level="warning",
+            reason=e.reason,
+            status=e.status,
+        )
+        return web.json_response(
+            {"error": f"The service is saturated ({e.reason})."},
+            status=e.status,
+            headers={"Retry-After": str(controller.retry_after)},
+        )
+    try:
+        return await handler(request)
+    finally:
+        controller.release()
+
+
+def setup_admission(app: web.Application) -> None:
+    """Set up the admission controller configured by ``max_in_flight`` and
+    the admission middleware.
+
+    If ``max_in_flight`` is 0, requests aren't limited. Call this function
+    after `ltdevents.metrics.setup_metrics`, so that the controller's state
+    is reported in the metrics and rejected requests are timed.
+    """
+    config = app["safir/config"]
+    controller: Optional[AdmissionController] = None
+    if config.max_in_flight > 0:
+        controller = AdmissionController(
+            max_in_flight=config.max_in_flight,
+            max_queued=config.admission_queue_size,
+            queue_timeout=config.admission_queue_timeout_ms / 1000.0,
+            retry_after=config.admission_retry_after,
+        )
+        metrics: Optional[WebhookMetrics] = app.get("ltdevents/metrics")
+        if metrics is not None:
+            metrics.track_admission(controller)
+    app["ltdevents/admission"] = controller
+    app.middlewares.append(admission_middleware)
@@ -2,28 +2,46 @@
 
 from __future__ import annotations
 
-from pathlib import Path
-from typing import AsyncGenerator
+from typing import Optional
 
-import structlog
 from aiohttp import web
-from kafkit.registry.aiohttp import RegistryApi
-from kafkit.registry.manager import RecordNameSchemaManager
-from safir.events import configure_kafka_ssl, init_kafka_producer
+from safir.events import configure_kafka_ssl
 from safir.http import init_http_session
 from safir.logging import configure_logging
 from safir.metadata import setup_metadata
 from safir.middleware import bind_logger
 
+from ltdevents.admission import setup_admission
 from ltdevents.config import Configuration
+from ltdevents.dedup import init_deduplicator
+from ltdevents.enrichment import init_enricher
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+from ltdevents.eventstore import EventStore
 from ltdevents.handlers import init_external_routes, init_internal_routes
+from ltdevents.lag import LagTracker
+from ltdevents.logsampling import WebhookLogging
+from ltdevents.metrics import setup_metrics
+from ltdevents.partitioner import KeyPartitioner
+from ltdevents.producer import init_kafka_producer
+from ltdevents.publisher import init_publisher
+from ltdevents.schemaregistration import init_schema_registration
+from ltdevents.signatures import init_signature_verifier
+from ltdevents.sinks import init_fanout
 
 __all__ = ["create_app"]
 
 
-def create_app() -> web.Application:
-    """Create and configure the aiohttp.web application."""
-    config = Configuration()
+def create_app(config: Optional[Configuration] = None) -> web.Application:
+    """Create and configure the aiohttp.web application.
+
+    Parameters
+    ----------
+    config : `ltdevents.config.Configuration`, optional
+        The application's configuration. By default, the configuration is
+        read from the environment.
+    """
+    if config is None:
+        config = Configuration()
     configure_logging(
         profile=config.profile,
         log_level=config.log_level,
@@ -32,13 +50,51 @@ def create_app() -> web.Application:
 
     root_app = web.Application()
     root_app["safir/config"] = config
+    root_app["ltdevents/webhook_logging"] = WebhookLogging(
+        config.logger_name,
+        sample_every=config.log_sample_every,
+        error_burst=config.error_log_burst,
+        error_interval=config.error_log_interval_ms / 1000.0,
+    )
+    partitioner = None
+    if config.kafka_partitions > 0:
+        partitioner = KeyPartitioner(
+            config.kafka_partitions, cache_size=config.key_cache_size
+        )
+    root_app["ltdevents/event_registry"] = EventRegistry(
+        EVENT_TYPES,
+        default_topic=config.events_kafka_topic,
+        partitioner=partitioner,
+        state_topic=config.state_kafka_topic,
+    )
+    root_app["ltdevents/event_store"] = (
+        EventStore(config.event_store_size)
+        if config.event_store_size > 0
+        else None
+    )
     setup_metadata(package_name="ltd-events", app=root_app)
     setup_middleware(root_app)
+    setup_metrics(root_app)
+    root_app["ltdevents/lag_tracker"] = (
+        LagTracker(
+            root_app["ltdevents/metrics"],
+            window=config.lag_window_ms / 1000.0,
+            max_samples=config.lag_max_samples,
+        )
+        if config.lag_max_samples > 0
+        else None
+    )
+    setup_admission(root_app)
     root_app.add_routes(init_internal_routes())
     root_app.cleanup_ctx.append(init_http_session)
     root_app.cleanup_ctx.append(configure_kafka_ssl)
-    root_app.cleanup_ctx.append(init_avro_serializers)
+    root_app.cleanup_ctx.append(init_signature_verifier)
+    root_app.cleanup_ctx.append(init_schema_registration)
     root_app.cleanup_ctx.append(init_kafka_producer)
+    root_app.cleanup_ctx.append(init_publisher)
+    root_app.cleanup_ctx.append(init_deduplicator)
+    root_app.cleanup_ctx.append(init_fanout)
+    root_app.cleanup_ctx.append(init_enricher)
 
     sub_app = web.Application()
     setup_middleware(sub_app)
@@ -51,40 +107,3 @@ def create_app() -> web.Application:
 def setup_middleware(app: web.Application) -> None:
     """Add middleware to the application."""
     app.middlewares.append(bind_logger)
-
-
-async def init_avro_serializers(app: web.Application) -> AsyncGenerator:
-    """Initialize Avro serializers."""
-    logger = structlog.get_logger(app["safir/config"].logger_name)
-
-    registry_url = app["safir/config"].schema_registry_url
-    if registry_url is None:
-        logger.info(
-            "Schema Registry is not configured, skipping schema "
-            "registration"
-        )
-        app["safir/schema_registry"] = None
-        app["safir/schema_manager"] = None
-
-    else:
-        registry = RegistryApi(
-            session=app["safir/http_session"],
-            url=app["safir/config"].schema_registry_url,
-        )
-
-        schema_root_dir = Path(__file__).parent / "schemas"
-
-        manager = RecordNameSchemaManager(
-            root=schema_root_dir,
-            suffix=app["safir/config"].schema_suffix,
-            registry=registry,
-        )
-        await manager.register_schemas(
-            compatibility=app["safir/config"].schema_compatibility
-        )
-
-        app["safir/schema_registry"] = registry
-        app["safir/schema_manager"] = manager
-        logger.info("Finished registering Avro schemas")
-
-    yield
@@ -0,0 +1,405 @@
+"""Backfill of historical LTD Keeper state into Kafka.
+
+The ``ltdevents backfill`` command publishes webhook-shaped payloads (such as
+an ``edition.updated`` payload for every edition) so that new consumers can
+build the current state of all editions. The payloads are read from a
+source, one at a time:
+
+- An NDJSON dump file (`ndjson_source`), with one payload per line.
+- A paginated HTTP API (`api_source`), where each page is a JSON object with
+  an ``items`` array of payloads and the URL of the ``next`` page (or
+  `null`).
+
+Each payload goes through the same parsing and serialization path as the
+``/webhook`` endpoint. Messages are handed to the Kafka producer as they are
+read, with a bounded number awaiting acknowledgement, and the position of
+the last acknowledged payload is saved in a checkpoint file so that an
+interrupted backfill resumes where it left off.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Optional,
+    Tuple,
+)
+
+import orjson
+import pydantic
+import structlog
+from aiohttp import web
+
+__all__ = [
+    "BackfillProgress",
+    "Checkpoint",
+    "ndjson_source",
+    "api_source",
+    "run_backfill",
+    "backfill",
+]
+
+if TYPE_CHECKING:
+    import aiohttp
+
+    Position = Dict[str, Any]
+    SourceItem = Tuple[Any, Position]
+
+
+@dataclass
+class BackfillProgress:
+    """Counts of the payloads processed by a backfill."""
+
+    read: int = 0
+    """The number of payloads read from the source."""
+
+    published: int = 0
+    """The number of messages acknowledged by the Kafka broker."""
+
+    invalid: int = 0
+    """The number of payloads that couldn't be decoded or validated."""
+
+    started: float = field(default_factory=time.monotonic)
+    """The time the backfill started (`time.monotonic`)."""
+
+    @property
+    def rate(self) -> float:
+        """Payloads read per second."""
+        elapsed = time.monotonic() - self.started
+        return self.read / elapsed if elapsed > 0 else 0.0
+
+    def format(self) -> str:
+        """Format a one-line progress report."""
+        return (
+            f"Read {self.read} payloads ({self.rate:.0f}/s): "
+            f"{self.published} published, {self.invalid} invalid"
+        )
+
+
+class Checkpoint:
+    """A checkpoint file that records the position of a backfill in its
+    source.
+
+    Parameters
+    ----------
+    path : `pathlib.Path`, optional
+        The path of the checkpoint file. If `None`, nothing is saved.
+    source : `str`
+        The source (file path or URL) of the backfill. A checkpoint from a
+        different source can't be resumed.
+    """
+
+    def __init__(self, path: Optional[Path], source: str) -> None:
+        self.path = path
+        self.source = source
+
+    def load(self) -> Optional[Position]:
+        """Load the saved position, or `None` if there isn't a checkpoint.
+
+        Raises
+        ------
+        ValueError
+            Raised if the checkpoint is for a different source.
+        """
+        if self.path is None or not self.path.exists():
+            return None
+        data = json.loads(self.path.read_text())
+        if data["source"] != self.source:
+            raise ValueError(
+                f"Checkpoint {self.path} is for a different source, "
+                f"{data['source']}"
+            )
+        return data["position"]
+
+    def save(self, position: Position, progress: BackfillProgress) -> None:
+        """Save the position, replacing the checkpoint file atomically."""
+        if self.path is None:
+            return
+        data = {
+            "source": self.source,
+            "position": position,
+            "read": progress.read,
+            "published": progress.published,
+            "invalid": progress.invalid,
+        }
+        temp_path = self.path.with_name(f"{self.path.name}.tmp")
+        temp_path.write_text(json.dumps(data))
+        os.replace(temp_path, self.path)
+
+
+async def ndjson_source(
+    path: Path, position: Optional[Position] = None
+) -> AsyncIterator[SourceItem]:
+    """Read payloads from an NDJSON file.
+
+    Parameters
+    ----------
+    path : `pathlib.Path`
+        The path of the file.
+    position : `dict`, optional
+        The position to resume from: ``{"offset": <byte offset>}``.
+
+    Yields
+    ------
+    payload
+        The decoded payload, or a `ValueError` if the line can't be decoded.
+    position : `dict`
+        The position after the payload.
+    """
+    offset = position["offset"] if position else 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                payload: Any = orjson.loads(line)
+            except ValueError as e:
+                payload = ValueError(f"Invalid JSON: {e}")
+            yield payload, {"offset": offset}
+
+
+async def api_source(
+    session: aiohttp.ClientSession,
+    url: str,
+    position: Optional[Position] = None,
+) -> AsyncIterator[SourceItem]:
+    """Read payloads from a paginated HTTP API.
+
+    Each page is a JSON object with an ``items`` array of payloads and the
+    URL of the ``next`` page, or `null` on the last page.
+
+    Parameters
+    ----------
+    session : `aiohttp.ClientSession`
+        The HTTP session.
+    url : `str`
+        The URL of the first page.
+    position : `dict`, optional
+        The position to resume from: ``{"page": <page URL>, "index": <index
+        of the next payload in the page>}``.
+
+    Yields
+    ------
+    payload
+        The payload.
+    position : `dict`
+        The position after the payload.
+    """
+    page_url: Optional[str] = position["page"] if position else url
+    skip = position["index"] if position else 0
+    while page_url is not None:
+        async with session.get(page_url) as response:
+            response.raise_for_status()
+            page = await response.json()
+        items = page["items"]
+        next_url = page.get("next")
+        for index in range(skip, len(items)):
+            if index + 1 < len(items) or next_url is None:
+                after = {"page": page_url, "index": index + 1}
+            else:
+                after = {"page": next_url, "index": 0}
+            yield items[index], after
+        page_url = next_url
+        skip = 0
+
+
+async def run_backfill(
+    app: web.Application,
+    source: AsyncIterator[SourceItem],
+    *,
+    checkpoint: Checkpoint,
+    max_pending: int = 1000,
+    checkpoint_interval: float = 5.0,
+    on_progress: Optional[Callable[[BackfillProgress], None]] = None,
+    progress_interval: float = 10.0,
+) -> BackfillProgress:
+    """Publish the payloads from a source.
+
+    Parameters
+    ----------
+    app : `aiohttp.web.Application`
+        The application, with its cleanup contexts already run (for the Kafka
+        producer, event registry, and serializers).
+    source : async iterator
+        The source of payloads and their positions (see `ndjson_source` and
+        `api_source`).
+    checkpoint : `Checkpoint`
+        The checkpoint, which is saved as messages are acknowledged.
+    max_pending : `int`, optional
+        The maximum number of messages awaiting acknowledgement.
+    checkpoint_interval : `float`, optional
+        The time, in seconds, between checkpoint saves.
+    on_progress : callable, optional
+        Called with the progress periodically and at the end.
+    progress_interval : `float`, optional
+        The time, in seconds, between calls of ``on_progress``.
+
+    Returns
+    -------
+    progress : `BackfillProgress`
+        The final counts.
+
+    Raises
+    ------
+    Exception
+        Raised if a message can't be published. The checkpoint is saved at
+        the last payload before the failed message.
+    """
+    logger = structlog.get_logger(app["safir/config"].logger_name)
+    producer = app["safir/kafka_producer"]
+    event_registry = app["ltdevents/event_registry"]
+    serializers = await app["ltdevents/schema_registration"].get_serializers()
+
+    progress = BackfillProgress()
+    # Positions and acknowledgement futures of the sent messages, in order.
+    # Payloads that aren't published have a `None` future.
+    pending: Deque[Tuple[Position, Optional[asyncio.Future]]] = deque()
+    position: Optional[Position] = None
+    last_checkpoint = last_progress = time.monotonic()
+
+    async def settle(count: int) -> None:
+        """Wait for the oldest pending messages to be acknowledged."""
+        nonlocal position
+        for _ in range(count):
+            item_position, future = pending.popleft()
+            if future is not None:
+                try:
+                    await future
+                except Exception:
+                    if position is not None:
+                        checkpoint.save(position, progress)
+                    raise
+                progress.published += 1
+            position = item_position
+
+    async for payload, item_position in source:
+        progress.read += 1
+        future: Optional[asyncio.Future] = None
+        try:
+            if isinstance(payload, ValueError):
+                raise payload
+            if not isinstance(payload, dict):
+                raise ValueError("Payload must be a JSON object.")
+            event_type, record = event_registry.parse(payload)
+        except (ValueError, RuntimeError, pydantic.ValidationError) as e:
+            progress.invalid += 1
+            logger.warning(
+                "Skipped invalid backfill payload",
+                position=item_position,
+                error=str(e),
+            )
+        else:
+            message = event_registry.serialize(event_type, record, serializers)
+            future = await producer.send(
+                message.topic,
+                key=message.key,
+                value=message.value,
+                partition=message.partition,
+            )
+        pending.append((item_position, future))
+
+        if len(pending) >= max_pending:
+            await settle(len(pending) - max_pending + 1)
+
+        now = time.monotonic()
+        if now - last_checkpoint >= checkpoint_interval:
+            # Only settled payloads are covered by the checkpoint
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                await settle(1)
+            if position is not None:
+                checkpoint.save(position, progress)
+            last_checkpoint = now
+        if on_progress is not None and (
+            now - last_progress >= progress_interval
+        ):
+            on_progress(progress)
+            last_progress = now
+
+    await settle(len(pending))
+    if position is not None:
+        checkpoint.save(position, progress)
+    if on_progress is not None:
+        on_progress(progress)
+    return progress
+
+
+async def backfill(
+    source: str,
+    *,
+    checkpoint_path: Optional[Path] = None,
+    max_pending: int = 1000,
+    on_progress: Optional[Callable[[BackfillProgress], None]] = None,
+    progress_interval: float = 10.0,
+    app: Optional[web.Application] = None,
+) -> BackfillProgress:
+    """Run the application's cleanup contexts, without serving HTTP, and
+    backfill payloads from a source.
+
+    Parameters
+    ----------
+    source : `str`
+        An ``http://`` or ``https://`` URL of a paginated API, or the path of
+        an NDJSON file.
+    checkpoint_path : `pathlib.Path`, optional
+        The path of the checkpoint file. If the file exists, the backfill
+        resumes from its position.
+    max_pending : `int`, optional
+        The maximum number of messages awaiting acknowledgement.
+    on_progress : callable, optional
+        Called with the progress periodically and at the end.
+    progress_interval : `float`, optional
+        The time, in seconds, between calls of ``on_progress``.
+    app : `aiohttp.web.Application`, optional
+        The application. By default, it's created with
+        `ltdevents.app.create_app`.
+
+    Returns
+    -------
+    progress : `BackfillProgress`
+        The final counts.
+    """
+    if app is None:
+        from ltdevents.app import create_app
+
+        app = create_app()
+
+    checkpoint = Checkpoint(checkpoint_path, source)
+    position = checkpoint.load()
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        if app["safir/kafka_producer"] is None:
+            raise RuntimeError(
+                "Backfilling requires the SAFIR_KAFKA_BROKER_URL "
+                "environment variable."
+            )
+        items: AsyncIterator[SourceItem]
+        if source.startswith(("http://", "https://")):
+            items = api_source(app["safir/http_session"], source, position)
+        else:
+            items = ndjson_source(Path(source), position)
+        return await run_backfill(
+            app,
+            items,
+            checkpoint=checkpoint,
+            max_pending=max_pending,
+            on_progress=on_progress,
+            progress_interval=progress_interval,
+        )
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,479 @@
+"""Load-test harness for the webhook ingestion path.
+
+The harness runs the application from `ltdevents.app.create_app` on a local
+port, with an in-memory `FakeKafkaProducer` and `FakeSchemaRegistry` in place
+of the Kafka broker and the Schema Registry, and drives the ``/webhook``
+endpoint with concurrent clients. Only the application itself is measured:
+payload decoding, validation, serialization, and publishing (up to the
+producer).
+
+Run the harness with the ``ltdevents bench`` command.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncGenerator,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from kafkit.registry.sansio import RegistryApi
+
+from ltdevents.app import create_app
+from ltdevents.producer import init_kafka_producer
+
+__all__ = [
+    "FakeClusterMetadata",
+    "FakeKafkaClient",
+    "FakeKafkaProducer",
+    "FakeSchemaRegistry",
+    "BenchmarkResult",
+    "PAYLOAD_TEMPLATES",
+    "create_bench_app",
+    "parse_mix",
+    "make_payloads",
+    "run_benchmark",
+]
+
+
+class FakeClusterMetadata:
+    """An in-memory stand-in for the producer's
+    `aiokafka.cluster.ClusterMetadata`.
+
+    The cluster has one broker, unless ``broker_ids`` is changed.
+    """
+
+    def __init__(self) -> None:
+        self.broker_ids: Set[int] = {0}
+
+    def brokers(self) -> Set[int]:
+        """The brokers of the cluster."""
+        return set(self.broker_ids)
+
+
+class FakeKafkaClient:
+    """An in-memory stand-in for the producer's
+    `aiokafka.client.AIOKafkaClient`.
+    """
+
+    def __init__(self) -> None:
+        self.cluster = FakeClusterMetadata()
+
+
+class FakeKafkaProducer:
+    """An in-memory stand-in for `aiokafka.AIOKafkaProducer`.
+
+    Messages are counted and discarded.
+
+    Parameters
+    ----------
+    ack_latency : `float`, optional
+        Simulated time, in seconds, for the broker to acknowledge a message.
+    """
+
+    def __init__(self, ack_latency: float = 0.0) -> None:
+        self.ack_latency = ack_latency
+        self.message_count = 0
+        self.byte_count = 0
+        self.client = FakeKafkaClient()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def send(
+        self,
+        topic: str,
+        value: Optional[bytes] = None,
+        key: Optional[bytes] = None,
+        partition: Optional[int] = None,
+    ) -> asyncio.Future:
+        """Send a message, returning a future that resolves when the message
+        is acknowledged.
+        """
+        self.message_count += 1
+        self.byte_count += len(key or b"") + len(value or b"")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self.ack_latency > 0:
+            loop.call_later(self.ack_latency, _set_result, future)
+        else:
+            future.set_result(None)
+        return future
+
+    async def send_and_wait(
+        self,
+        topic: str,
+        value: Optional[bytes] = None,
+        key: Optional[bytes] = None,
+        partition: Optional[int] = None,
+    ) -> None:
+        """Send a message and wait for it to be acknowledged."""
+        future = await self.send(
+            topic, value=value, key=key, partition=partition
+        )
+        await future
+
+
+def _set_result(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class FakeSchemaRegistry(RegistryApi):
+    """An in-memory Confluent Schema Registry.
+
+    The fake supports the requests made while registering schemas: schema
+    registration (``POST /subjects/{subject}/versions``) and subject
+    compatibility configuration (``GET`` and ``PUT /config/{subject}``).
+    The number of requests is counted in ``request_count``.
+    """
+
+    def __init__(self, url: str = "http://fake-registry:8081") -> None:
+        super().__init__(url=url)
+        self.request_count = 0
+        self._ids: Dict[str, int] = {}
+        self._compatibility: Dict[str, str] = {}
+
+    async def _request(
+        self, method: str, url: str, headers: Mapping[str, str], body: bytes
+    ) -> Tuple[int, Mapping[str, str], bytes]:
+        self.request_count += 1
+        path = url[len(self.url) :].strip("/").split("/")
+        data: Any
+        if method == "POST" and path[0] == "subjects":
+            schema = json.loads(body)["schema"]
+            schema_id = self._ids.setdefault(schema, len(self._ids) + 1)
+            data = {"id": schema_id}
+        elif method == "GET" and path[0] == "config":
+            data = {
+                "compatibilityLevel": self._compatibility.get(
+                    path[1], "BACKWARD"
+                )
+            }
+        elif method == "PUT" and path[0] == "config":
+            compatibility = json.loads(body)["compatibility"]
+            self._compatibility[path[1]] = compatibility
+            data = {"compatibility": compatibility}
+        else:
+            return 404, {}, b""
+        response_headers = {
+            "content-type": "application/vnd.schemaregistry.v1+json"
+        }
+        return 200, response_headers, json.dumps(data).encode()
+
+
+_PRODUCT = {
+    "published_url": "https://example.lsst.io/",
+    "url": "https://keeper.lsst.codes/products/example",
+    "title": "Example product",
+    "slug": "example",
+}
+
+PAYLOAD_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "edition.updated": {
+        "event_type": "edition.updated",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": _PRODUCT,
+        "edition": {
+            "published_url": "https://example.lsst.io/v/1.0",
+            "url": "https://keeper.lsst.codes/editions/1234",
+            "title": "Version 1.0",
+            "slug": "1.0",
+            "build_url": "https://keeper.lsst.codes/builds/1",
+        },
+    },
+    "edition.deleted": {
+        "event_type": "edition.deleted",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": _PRODUCT,
+        "edition": {
+            "published_url": "https://example.lsst.io/v/1.0",
+            "url": "https://keeper.lsst.codes/editions/1234",
+            "title": "Version 1.0",
+            "slug": "1.0",
+        },
+    },
+    "build.uploaded": {
+        "event_type": "build.uploaded",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": _PRODUCT,
+        "build": {
+            "published_url": "https://example.lsst.io/builds/1",
+            "url": "https://keeper.lsst.codes/builds/1",
+            "slug": "1",
+        },
+    },
+    "product.created": {
+        "event_type": "product.created",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": _PRODUCT,
+    },
+}
+"""Example webhook payloads for each event type."""
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse a payload mix specification.
+
+    Parameters
+    ----------
+    mix : `str`
+        Comma-separated event types with optional weights, such as
+        ``edition.updated=8,build.uploaded=2``. Event types without a weight
+        have a weight of 1. The ``invalid`` pseudo-event type stands for
+        payloads that fail validation.
+
+    Returns
+    -------
+    weights : `dict`
+        Mapping of event types to weights.
+
+    Raises
+    ------
+    ValueError
+        Raised if the specification can't be parsed or has an unknown event
+        type.
+    """
+    weights: Dict[str, float] = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name != "invalid" and name not in PAYLOAD_TEMPLATES:
+            raise ValueError(
+                f"Unknown event type {name!r}. Known types are: "
+                f"{', '.join(PAYLOAD_TEMPLATES)}, invalid"
+            )
+        weights[name] = float(weight) if weight else 1.0
+    if sum(weights.values()) <= 0:
+        raise ValueError("The payload mix must have a positive weight.")
+    return weights
+
+
+def make_payloads(
+    weights: Mapping[str, float], count: int, *, editions: int, seed: int = 0
+) -> List[bytes]:
+    """Make encoded webhook payloads.
+
+    Parameters
+    ----------
+    weights : `dict`
+        Mapping of event types to weights (see `parse_mix`).
+    count : `int`
+        The number of payloads.
+    editions : `int`
+        The number of distinct edition and build slugs to use.
+    seed : `int`, optional
+        The random seed, so that runs are repeatable.
+
+    Returns
+    -------
+    payloads : `list` of `bytes`
+        The JSON-encoded payloads.
+    """
+    rng = random.Random(seed)
+    names = list(weights.keys())
+    payloads = []
+    for name in rng.choices(
+        names, weights=[weights[n] for n in names], k=count
+    ):
+        slug = str(rng.randrange(editions))
+        if name == "invalid":
+            payload = copy.deepcopy(PAYLOAD_TEMPLATES["edition.updated"])
+            payload["event_timestamp"] = "not a timestamp"
+        else:
+            payload = copy.deepcopy(PAYLOAD_TEMPLATES[name])
+        for resource in ("edition", "build"):
+            if resource in payload:
+                payload[resource]["slug"] = slug
+        payloads.append(json.dumps(payload).encode())
+    return payloads
+
+
+@dataclass
+class BenchmarkResult:
+    """The result of a benchmark run."""
+
+    duration: float
+    """Wall-clock duration of the run, in seconds."""
+
+    latencies: List[float] = field(default_factory=list)
+    """Latency of each request, in seconds."""
+
+    statuses: Dict[int, int] = field(default_factory=dict)
+    """Count of responses by HTTP status."""
+
+    messages: int = 0
+    """The number of messages that reached the producer."""
+
+    @property
+    def requests(self) -> int:
+        """The number of requests."""
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """Requests per second."""
+        return self.requests / self.duration if self.duration else 0.0
+
+    @property
+    def message_throughput(self) -> float:
+        """Messages (that reached the producer) per second."""
+        return self.messages / self.duration if self.duration else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Get a latency percentile (nearest-rank), in seconds."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = math.ceil(p / 100 * len(ordered))
+        return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+    def format(self) -> str:
+        """Format a human-readable report."""
+        statuses = ", ".join(
+            f"{status}: {count}"
+            for status, count in sorted(self.statuses.items())
+        )
+        return "\n".join(
+            [
+                f"Requests:   {self.requests} ({statuses})",
+                f"Messages:   {self.messages}",
+                f"Duration:   {self.duration:.2f} s",
+                f"Throughput: {self.throughput:.1f} requests/s, "
+                f"{self.message_throughput:.1f} messages/s",
+                f"Latency:    p50 {self.percentile(50) * 1e3:.2f} ms, "
+                f"p95 {self.percentile(95) * 1e3:.2f} ms, "
+                f"p99 {self.percentile(99) * 1e3:.2f} ms",
+            ]
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Get the summary statistics as a JSON-serializable dict."""
+        return {
+            "requests": self.requests,
+            "statuses": {str(k): v for k, v in self.statuses.items()},
+            "messages": self.messages,
+            "duration": self.duration,
+            "throughput": self.throughput,
+            "message_throughput": self.message_throughput,
+            "latency_p50": self.percentile(50),
+            "latency_p95": self.percentile(95),
+            "latency_p99": self.percentile(99),
+        }
+
+
+def create_bench_app(
+    producer: FakeKafkaProducer, *, delivery_mode: Optional[str] = None
+) -> web.Application:
+    """Create the application with a fake Kafka producer and Schema
+    Registry.
+    """
+    app = create_app()
+    config = app["safir/config"]
+    config.schema_registry_url = "http://fake-registry:8081"
+    if delivery_mode is not None:
+        config.delivery_mode = delivery_mode
+    app["safir/schema_registry"] = FakeSchemaRegistry()
+
+    async def init_fake_kafka_producer(app: web.Application) -> AsyncGenerator:
+        app["safir/kafka_producer"] = producer
+        yield
+
+    index = list(app.cleanup_ctx).index(init_kafka_producer)
+    app.cleanup_ctx[index] = init_fake_kafka_producer
+    return app
+
+
+async def run_benchmark(
+    payloads: Sequence[bytes],
+    *,
+    concurrency: int,
+    warmup: int = 0,
+    delivery_mode: Optional[str] = None,
+    ack_latency: float = 0.0,
+    path: str = "/webhook",
+) -> BenchmarkResult:
+    """Run the application and send it webhook payloads.
+
+    Parameters
+    ----------
+    payloads : sequence of `bytes`
+        The encoded payloads (see `make_payloads`), sent in order.
+    concurrency : `int`
+        The number of concurrent clients.
+    warmup : `int`, optional
+        The number of requests to send before measuring.
+    delivery_mode : `str`, optional
+        Override the ``delivery_mode`` configuration.
+    ack_latency : `float`, optional
+        Simulated Kafka acknowledgement latency, in seconds.
+    path : `str`, optional
+        The endpoint to send payloads to.
+
+    Returns
+    -------
+    result : `BenchmarkResult`
+        The measurements.
+    """
+    producer = FakeKafkaProducer(ack_latency=ack_latency)
+    app = create_bench_app(producer, delivery_mode=delivery_mode)
+    server = TestServer(app)
+    await server.start_server()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    headers = {"Content-Type": "application/json"}
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            url = str(server.make_url(path))
+
+            async def send(body: bytes) -> Tuple[int, float]:
+                start = time.perf_counter()
+                async with session.post(
+                    url, data=body, headers=headers
+                ) as response:
+                    await response.read()
+                return response.status, time.perf_counter() - start
+
+            for body in payloads[:warmup]:
+                await send(body)
+            producer.message_count = 0
+
+            result = BenchmarkResult(duration=0.0)
+            next_index = 0
+
+            async def client() -> None:
+                nonlocal next_index
+                while next_index < len(payloads):
+                    body = payloads[next_index]
+                    next_index += 1
+                    status, latency = await send(body)
+                    result.latencies.append(latency)
+                    result.statuses[status] = (
+                        result.statuses.get(status, 0) + 1
+                    )
+
+            start = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            result.duration = time.perf_counter() - start
+    finally:
+        await server.close()
+    result.messages = producer.message_count
+    return result
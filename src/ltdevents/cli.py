@@ -1,11 +1,16 @@
 """Administrative command-line interface."""
 
-__all__ = ["main", "help", "run"]
+__all__ = ["main", "help", "run", "bench", "backfill", "materialize"]
 
-from typing import Any, Union
+import asyncio
+import json
+import signal
+from pathlib import Path
+from typing import Any, Optional, Union
 
 import click
 from aiohttp.web import run_app
+from safir.logging import configure_logging
 
 from ltdevents.app import create_app
 
@@ -47,8 +52,274 @@ def help(ctx: click.Context, topic: Union[None, str], **kw: Any) -> None:
 @click.option(
     "--port", default=8080, type=int, help="Port to run the application on."
 )
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    envvar="LTD_EVENTS_WORKERS",
+    show_default=True,
+    help=(
+        "Number of worker processes. With more than one worker, the workers "
+        "share the port (SO_REUSEPORT) and are restarted if they exit. "
+        "Can also be set with the LTD_EVENTS_WORKERS environment variable."
+    ),
+)
 @click.pass_context
-def run(ctx: click.Context, port: int) -> None:
+def run(ctx: click.Context, port: int, workers: int) -> None:
     """Run the application (for production)."""
-    app = create_app()
-    run_app(app, port=port)
+    if workers > 1:
+        from ltdevents.config import Configuration
+        from ltdevents.workers import WorkerSupervisor
+
+        config = Configuration()
+        configure_logging(
+            profile=config.profile,
+            log_level=config.log_level,
+            name=config.logger_name,
+        )
+        supervisor = WorkerSupervisor(
+            workers=workers, port=port, logger_name=config.logger_name
+        )
+        supervisor.run()
+    else:
+        app = create_app()
+        run_app(app, port=port)
+
+
+@main.command()
+@click.option(
+    "--requests",
+    "request_count",
+    default=10000,
+    show_default=True,
+    type=int,
+    help="Number of webhook requests to send.",
+)
+@click.option(
+    "--concurrency",
+    default=16,
+    show_default=True,
+    type=int,
+    help="Number of concurrent clients.",
+)
+@click.option(
+    "--warmup",
+    default=500,
+    show_default=True,
+    type=int,
+    help="Number of requests to send before measuring.",
+)
+@click.option(
+    "--mix",
+    default="edition.updated",
+    show_default=True,
+    help=(
+        "Payload mix as comma-separated event types with optional weights "
+        "(for example, edition.updated=8,build.uploaded=1,invalid=1)."
+    ),
+)
+@click.option(
+    "--editions",
+    default=100,
+    show_default=True,
+    type=int,
+    help="Number of distinct edition and build slugs in the payloads.",
+)
+@click.option(
+    "--delivery-mode",
+    type=click.Choice(["sync", "queue", "spool"]),
+    default=None,
+    help="Override the LTD_EVENTS_DELIVERY_MODE configuration.",
+)
+@click.option(
+    "--ack-latency-ms",
+    default=0.0,
+    show_default=True,
+    type=float,
+    help="Simulated Kafka acknowledgement latency.",
+)
+@click.option(
+    "--batch",
+    "batch_size",
+    default=0,
+    show_default=True,
+    type=int,
+    help=(
+        "Send payloads to POST /webhook/batch in batches of this size "
+        "instead of one at a time to POST /webhook."
+    ),
+)
+@click.option("--json", "as_json", is_flag=True, help="Output JSON.")
+@click.pass_context
+def bench(
+    ctx: click.Context,
+    request_count: int,
+    concurrency: int,
+    warmup: int,
+    mix: str,
+    editions: int,
+    delivery_mode: Optional[str],
+    ack_latency_ms: float,
+    batch_size: int,
+    as_json: bool,
+) -> None:
+    """Benchmark webhook ingestion with a fake Kafka broker and Schema
+    Registry.
+    """
+    from ltdevents.bench import make_payloads, parse_mix, run_benchmark
+
+    try:
+        weights = parse_mix(mix)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--mix")
+
+    payloads = make_payloads(weights, request_count, editions=editions)
+    path = "/webhook"
+    if batch_size > 0:
+        path = "/webhook/batch"
+        payloads = [
+            b"[" + b",".join(payloads[i : i + batch_size]) + b"]"
+            for i in range(0, len(payloads), batch_size)
+        ]
+
+    result = asyncio.run(
+        run_benchmark(
+            payloads,
+            concurrency=concurrency,
+            warmup=min(warmup, len(payloads)),
+            delivery_mode=delivery_mode,
+            ack_latency=ack_latency_ms / 1000,
+            path=path,
+        )
+    )
+    if as_json:
+        click.echo(json.dumps(result.as_dict(), indent=2))
+    else:
+        click.echo(result.format())
+
+
+@main.command()
+@click.argument("source")
+@click.option(
+    "--checkpoint",
+    "checkpoint_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help=(
+        "Checkpoint file. If the file exists, the backfill resumes from the "
+        "position it records."
+    ),
+)
+@click.option(
+    "--max-pending",
+    default=1000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum number of messages awaiting acknowledgement from Kafka.",
+)
+@click.option(
+    "--progress-interval",
+    default=10.0,
+    show_default=True,
+    type=float,
+    help="Seconds between progress reports.",
+)
+@click.pass_context
+def backfill(
+    ctx: click.Context,
+    source: str,
+    checkpoint_path: Optional[str],
+    max_pending: int,
+    progress_interval: float,
+) -> None:
+    """Publish historical LTD Keeper state from SOURCE.
+
+    SOURCE is the path of an NDJSON file with a webhook payload on each
+    line, or the URL of a paginated API whose pages have an "items" array of
+    webhook payloads and the URL of the "next" page.
+    """
+    from ltdevents.backfill import BackfillProgress
+    from ltdevents.backfill import backfill as run_backfill
+
+    def report(progress: BackfillProgress) -> None:
+        click.echo(progress.format(), err=True)
+
+    try:
+        asyncio.run(
+            run_backfill(
+                source,
+                checkpoint_path=(
+                    Path(checkpoint_path) if checkpoint_path else None
+                ),
+                max_pending=max_pending,
+                on_progress=report,
+                progress_interval=progress_interval,
+            )
+        )
+    except ValueError as e:
+        raise click.UsageError(str(e), ctx)
+
+
+@main.command()
+@click.argument("database", type=click.Path(dir_okay=False))
+@click.option(
+    "--topic",
+    default=None,
+    help=(
+        "Topic to consume. The default is the LTD_EVENTS_KAFKA_TOPIC "
+        "configuration."
+    ),
+)
+@click.option(
+    "--batch-size",
+    default=500,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum number of messages applied in one transaction.",
+)
+@click.option(
+    "--progress-interval",
+    default=10.0,
+    show_default=True,
+    type=float,
+    help="Seconds between progress reports.",
+)
+@click.pass_context
+def materialize(
+    ctx: click.Context,
+    database: str,
+    topic: Optional[str],
+    batch_size: int,
+    progress_interval: float,
+) -> None:
+    """Materialize the latest state of each edition into the SQLite
+    DATABASE.
+
+    The events topic is consumed continuously, until the command is
+    interrupted. The consumed offsets are stored in the database, so that a
+    restarted command resumes where it stopped.
+    """
+    from ltdevents.materialize import MaterializeProgress
+    from ltdevents.materialize import materialize as run_materialize
+
+    def report(progress: MaterializeProgress) -> None:
+        click.echo(progress.format(), err=True)
+
+    async def run_until_signal() -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        await run_materialize(
+            Path(database),
+            topic=topic,
+            batch_size=batch_size,
+            stop=stop,
+            on_progress=report,
+            progress_interval=progress_interval,
+        )
+
+    try:
+        asyncio.run(run_until_signal())
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
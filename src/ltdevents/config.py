@@ -11,7 +11,7 @@ __all__ = ["Configuration"]
 
 
 if TYPE_CHECKING:
-    from typing import Optional, Sequence
+    from typing import List, Optional, Sequence
 
 
 @dataclass
@@ -106,6 +106,61 @@ class Configuration:
     Set with the ``SAFIR_KAFKA_BROKER_URL`` environment variable.
     """
 
+    kafka_compression_type: str = field(
+        default_factory=lambda: get_env_str_choices(
+            "SAFIR_KAFKA_COMPRESSION_TYPE",
+            default="none",
+            choices=["none", "gzip", "snappy", "lz4"],
+        )
+    )
+    """The compression codec of the Kafka producer's message batches:
+    "none", "gzip", "snappy", or "lz4".
+
+    Set with the ``SAFIR_KAFKA_COMPRESSION_TYPE`` environment variable.
+    """
+
+    kafka_linger_ms: int = field(
+        default_factory=lambda: get_env_int("SAFIR_KAFKA_LINGER_MS", default=0)
+    )
+    """The time, in milliseconds, that the Kafka producer waits for more
+    messages to fill a batch before sending it.
+
+    Set with the ``SAFIR_KAFKA_LINGER_MS`` environment variable.
+    """
+
+    kafka_max_batch_size: int = field(
+        default_factory=lambda: get_env_int(
+            "SAFIR_KAFKA_MAX_BATCH_SIZE", default=16384
+        )
+    )
+    """The maximum size, in bytes, of a Kafka producer batch (for each
+    partition).
+
+    Set with the ``SAFIR_KAFKA_MAX_BATCH_SIZE`` environment variable.
+    """
+
+    kafka_acks: str = field(
+        default_factory=lambda: get_env_str_choices(
+            "SAFIR_KAFKA_ACKS", default="1", choices=["0", "1", "all"]
+        )
+    )
+    """The acknowledgements that the Kafka producer waits for: "0" (none),
+    "1" (the partition leader), or "all" (all in-sync replicas).
+
+    Set with the ``SAFIR_KAFKA_ACKS`` environment variable.
+    """
+
+    kafka_enable_idempotence: bool = field(
+        default_factory=lambda: get_env_bool(
+            "SAFIR_KAFKA_ENABLE_IDEMPOTENCE", default=False
+        )
+    )
+    """Whether the Kafka producer uses idempotent delivery, so that retries
+    don't write duplicate messages. Requires ``kafka_acks`` to be "all".
+
+    Set with the ``SAFIR_KAFKA_ENABLE_IDEMPOTENCE`` environment variable.
+    """
+
     schema_registry_url: Optional[str] = os.getenv("SAFIR_SCHEMA_REGISTRY_URL")
     """The URL of the Confluence Schema Registry.
 
@@ -140,12 +195,596 @@ class Configuration:
     Set with the ``SAFIR_SCHEMA_SUFFIX`` environment variable.
     """
 
+    schema_registration: str = field(
+        default_factory=lambda: get_env_str_choices(
+            "LTD_EVENTS_SCHEMA_REGISTRATION",
+            default="startup",
+            choices=["startup", "background", "lazy"],
+        )
+    )
+    """When the Avro schemas are registered with the Schema Registry:
+    "startup", "background", or "lazy".
+
+    In ``startup`` mode the application doesn't start serving until the
+    schemas are registered. In ``background`` mode the registration starts
+    when the application starts, but the application serves requests
+    immediately, and a failed registration is retried with a backoff until it
+    succeeds. In ``lazy`` mode the registration starts when the first
+    message is serialized. In the ``background`` and ``lazy`` modes, webhooks
+    wait for the registration to finish.
+
+    Set with the ``LTD_EVENTS_SCHEMA_REGISTRATION`` environment variable.
+    """
+
+    schema_cache_path: Optional[Path] = field(
+        default_factory=lambda: get_env_optional_path(
+            "LTD_EVENTS_SCHEMA_CACHE_PATH"
+        )
+    )
+    """The path of a local file that caches the Schema Registry IDs of
+    registered schemas. Subjects whose schema and compatibility setting are
+    unchanged since they were cached aren't registered again. If not set,
+    every subject is registered on startup.
+
+    Set with the ``LTD_EVENTS_SCHEMA_CACHE_PATH`` environment variable.
+    """
+
+    schema_registration_concurrency: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_SCHEMA_REGISTRATION_CONCURRENCY", default=8
+        )
+    )
+    """The maximum number of subjects that are registered with the Schema
+    Registry at once.
+
+    Set with the ``LTD_EVENTS_SCHEMA_REGISTRATION_CONCURRENCY`` environment
+    variable.
+    """
+
+    spool_dir: Optional[Path] = field(
+        default_factory=lambda: get_env_optional_path("LTD_EVENTS_SPOOL_DIR")
+    )
+    """The directory of the durable message spool (required for the
+    ``spool`` delivery mode). Use a persistent volume so that spooled
+    messages survive pod restarts.
+
+    Set with the ``LTD_EVENTS_SPOOL_DIR`` environment variable.
+    """
+
+    workers: int = 1
+    """The number of worker processes that serve the application (set by
+    `ltdevents.workers.serve_worker` from the ``ltdevents run --workers``
+    option).
+
+    With several workers, each worker has its own spool in a
+    ``worker-<index>`` subdirectory of ``spool_dir``, and adopts the spools
+    that were left over by a different number of workers (see
+    `ltdevents.spool.worker_spool_dirs`). The rest of the application's
+    in-memory state, including its metrics, is also per worker (see
+    `ltdevents.workers`).
+    """
+
+    worker_index: int = 0
+    """The index of the worker process that runs the application (set by
+    `ltdevents.workers.serve_worker`).
+    """
+
+    spool_fsync: str = field(
+        default_factory=lambda: get_env_str_choices(
+            "LTD_EVENTS_SPOOL_FSYNC",
+            default="always",
+            choices=["always", "interval", "never"],
+        )
+    )
+    """When the spool is fsync'd to disk: "always" (before each webhook is
+    acknowledged), "interval" (periodically), or "never" (left to the
+    operating system).
+
+    Set with the ``LTD_EVENTS_SPOOL_FSYNC`` environment variable.
+    """
+
+    spool_fsync_interval_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_SPOOL_FSYNC_INTERVAL_MS", default=200
+        )
+    )
+    """The time, in milliseconds, between fsyncs of the spool with the
+    "interval" fsync policy.
+
+    Set with the ``LTD_EVENTS_SPOOL_FSYNC_INTERVAL_MS`` environment variable.
+    """
+
+    spool_segment_bytes: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_SPOOL_SEGMENT_BYTES", default=16 * 1024 * 1024
+        )
+    )
+    """The size, in bytes, after which the spool starts a new segment file.
+    Segments are deleted once all their messages are forwarded to Kafka.
+
+    Set with the ``LTD_EVENTS_SPOOL_SEGMENT_BYTES`` environment variable.
+    """
+
+    key_cache_size: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_KEY_CACHE_SIZE", default=4096
+        )
+    )
+    """The maximum number of encoded Kafka message keys that are cached
+    (keys are cached per product and edition).
+
+    Set with the ``LTD_EVENTS_KEY_CACHE_SIZE`` environment variable.
+    """
+
     events_kafka_topic: str = os.getenv("LTD_EVENTS_KAFKA_TOPIC", "ltd.events")
     """The name of the Kafka topic for messages produced by LTD Events.
 
     Set with the ``LTD_EVENTS_KAFKA_TOPIC``.
     """
 
+    state_kafka_topic: Optional[str] = os.getenv(
+        "LTD_EVENTS_STATE_KAFKA_TOPIC"
+    )
+    """The name of a log-compacted Kafka topic for the latest state of each
+    edition, or `None` (the default) to not publish the latest state.
+
+    Each ``edition.updated`` event is also published to this topic, keyed by
+    the edition (the ``ltd.edition_key_v1`` schema), and each
+    ``edition.deleted`` event publishes a tombstone for the edition. New
+    consumers can read this topic to bootstrap the state of all editions
+    instead of reading every event. Create the topic with
+    ``cleanup.policy=compact``.
+
+    Set with the ``LTD_EVENTS_STATE_KAFKA_TOPIC`` environment variable.
+    """
+
+    kafka_partitions: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_KAFKA_PARTITIONS", default=0
+        )
+    )
+    """The number of partitions that messages are routed to, by a stable
+    hash of the fields of the message key (such as the product and edition
+    slugs). All messages for an edition go to the same partition, even when
+    the key schema changes. Set this to the number of partitions of the
+    topic (or fewer).
+
+    If 0 (the default), the Kafka producer chooses the partition by hashing
+    the encoded message key.
+
+    Set with the ``LTD_EVENTS_KAFKA_PARTITIONS`` environment variable.
+    """
+
+    delivery_mode: str = field(
+        default_factory=lambda: get_env_str_choices(
+            "LTD_EVENTS_DELIVERY_MODE",
+            default="sync",
+            choices=["sync", "queue", "spool"],
+        )
+    )
+    """How the ``/webhook`` endpoint hands messages to Kafka: "sync",
+    "queue", or "spool".
+
+    In ``sync`` mode the webhook waits for the broker to acknowledge each
+    message before responding with 200. In ``queue`` mode the webhook enqueues
+    the message into an in-process publish queue and immediately responds
+    with 202; a background task drains the queue into batched sends. In
+    ``spool`` mode the webhook appends the message to a durable local spool
+    (see ``spool_dir``) and responds with 202; a background task forwards
+    spooled messages to Kafka in order.
+
+    Set with the ``LTD_EVENTS_DELIVERY_MODE`` environment variable.
+    """
+
+    publish_queue_size: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_PUBLISH_QUEUE_SIZE", default=10000
+        )
+    )
+    """The maximum number of messages held in the publish queue (``queue``
+    delivery mode). Webhooks wait for space once the queue is full.
+
+    Set with the ``LTD_EVENTS_PUBLISH_QUEUE_SIZE`` environment variable.
+    """
+
+    publish_batch_size: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_PUBLISH_BATCH_SIZE", default=100
+        )
+    )
+    """The maximum number of messages sent to the Kafka producer in a single
+    batch (``queue`` delivery mode).
+
+    Set with the ``LTD_EVENTS_PUBLISH_BATCH_SIZE`` environment variable.
+    """
+
+    publish_linger_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_PUBLISH_LINGER_MS", default=10
+        )
+    )
+    """The time, in milliseconds, that the publish queue waits for more
+    messages to fill a batch before sending it (``queue`` delivery mode).
+
+    Set with the ``LTD_EVENTS_PUBLISH_LINGER_MS`` environment variable.
+    """
+
+    webhook_keys_dir: Optional[Path] = field(
+        default_factory=lambda: get_env_optional_path(
+            "LTD_EVENTS_WEBHOOK_KEYS_DIR"
+        )
+    )
+    """The directory of the HMAC-SHA256 keys that webhook bodies are signed
+    with, one key per file (such as a mounted Kubernetes secret). A webhook
+    is accepted if its signature matches any of the keys, so keys can be
+    rotated. If not set, webhook signatures aren't verified.
+
+    Set with the ``LTD_EVENTS_WEBHOOK_KEYS_DIR`` environment variable.
+    """
+
+    webhook_keys_reload_interval_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_WEBHOOK_KEYS_RELOAD_INTERVAL_MS", default=30000
+        )
+    )
+    """The time, in milliseconds, between checks of the webhook key files
+    for changes.
+
+    Set with the ``LTD_EVENTS_WEBHOOK_KEYS_RELOAD_INTERVAL_MS`` environment
+    variable.
+    """
+
+    max_in_flight: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_MAX_IN_FLIGHT", default=0
+        )
+    )
+    """The maximum number of webhook requests that are handled at once.
+    Requests beyond this limit wait in the admission queue (see
+    ``admission_queue_size``). If 0 (the default), requests aren't limited.
+
+    Set with the ``LTD_EVENTS_MAX_IN_FLIGHT`` environment variable.
+    """
+
+    admission_queue_size: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ADMISSION_QUEUE_SIZE", default=100
+        )
+    )
+    """The maximum number of webhook requests that wait to be handled once
+    ``max_in_flight`` requests are in flight. Requests beyond this limit are
+    rejected with a 429 status.
+
+    Set with the ``LTD_EVENTS_ADMISSION_QUEUE_SIZE`` environment variable.
+    """
+
+    admission_queue_timeout_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ADMISSION_QUEUE_TIMEOUT_MS", default=1000
+        )
+    )
+    """The maximum time, in milliseconds, that a webhook request waits in
+    the admission queue before it's rejected with a 503 status.
+
+    Set with the ``LTD_EVENTS_ADMISSION_QUEUE_TIMEOUT_MS`` environment
+    variable.
+    """
+
+    admission_retry_after: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ADMISSION_RETRY_AFTER", default=1
+        )
+    )
+    """The number of seconds in the ``Retry-After`` header of rejected
+    webhook requests.
+
+    Set with the ``LTD_EVENTS_ADMISSION_RETRY_AFTER`` environment variable.
+    """
+
+    dedup_mode: str = field(
+        default_factory=lambda: get_env_str_choices(
+            "LTD_EVENTS_DEDUP_MODE",
+            default="off",
+            choices=["off", "drop", "coalesce"],
+        )
+    )
+    """How repeated webhooks for the same edition are de-duplicated: "off",
+    "drop", or "coalesce".
+
+    In ``drop`` mode, an ``edition.updated`` event is dropped if an event for
+    the same product, edition, and build was received within the
+    de-duplication window. In ``coalesce`` mode, ``edition.updated`` events
+    are held for the window, and a burst of events for the same edition is
+    published as a single message (the latest event).
+
+    Set with the ``LTD_EVENTS_DEDUP_MODE`` environment variable.
+    """
+
+    dedup_window_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_DEDUP_WINDOW_MS", default=5000
+        )
+    )
+    """The de-duplication window, in milliseconds (see ``dedup_mode``).
+
+    Set with the ``LTD_EVENTS_DEDUP_WINDOW_MS`` environment variable.
+    """
+
+    dedup_max_entries: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_DEDUP_MAX_ENTRIES", default=10000
+        )
+    )
+    """The maximum number of events remembered (``drop`` mode) or held
+    (``coalesce`` mode) for de-duplication. Once the limit is reached, the
+    oldest events are forgotten (or published early).
+
+    Set with the ``LTD_EVENTS_DEDUP_MAX_ENTRIES`` environment variable.
+    """
+
+    log_sample_every: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_LOG_SAMPLE_EVERY", default=1
+        )
+    )
+    """Log every Nth high-volume success event of the webhook handlers (such
+    as "Published Kafka message"), at the debug level. The default, 1, logs
+    every event.
+
+    Set with the ``LTD_EVENTS_LOG_SAMPLE_EVERY`` environment variable.
+    """
+
+    error_log_burst: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ERROR_LOG_BURST", default=10
+        )
+    )
+    """The maximum number of webhook errors with the same message that are
+    logged per ``error_log_interval_ms``. Further errors are counted and the
+    count is logged with the next error.
+
+    Set with the ``LTD_EVENTS_ERROR_LOG_BURST`` environment variable.
+    """
+
+    error_log_interval_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ERROR_LOG_INTERVAL_MS", default=1000
+        )
+    )
+    """The rate-limiting interval for webhook error logs, in milliseconds.
+
+    Set with the ``LTD_EVENTS_ERROR_LOG_INTERVAL_MS`` environment variable.
+    """
+
+    sink_urls: List[str] = field(
+        default_factory=lambda: get_env_list("LTD_EVENTS_SINK_URLS")
+    )
+    """HTTP callback URLs that each accepted webhook event is posted to, as
+    JSON, in addition to being published to Kafka.
+
+    Set with the ``LTD_EVENTS_SINK_URLS`` environment variable, as a
+    comma-separated list.
+    """
+
+    sink_file: Optional[Path] = field(
+        default_factory=lambda: get_env_optional_path("LTD_EVENTS_SINK_FILE")
+    )
+    """The path of an NDJSON file that each accepted webhook event is
+    appended to.
+
+    Set with the ``LTD_EVENTS_SINK_FILE`` environment variable.
+    """
+
+    sink_queue_size: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_SINK_QUEUE_SIZE", default=1000
+        )
+    )
+    """The maximum number of events waiting to be delivered to each sink.
+    Once a sink's queue is full, further events are dropped for that sink.
+
+    Set with the ``LTD_EVENTS_SINK_QUEUE_SIZE`` environment variable.
+    """
+
+    sink_batch_size: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_SINK_BATCH_SIZE", default=100
+        )
+    )
+    """The maximum number of events handed to a sink at once. Each event in
+    a batch is delivered, and counted as delivered or failed, on its own.
+
+    Set with the ``LTD_EVENTS_SINK_BATCH_SIZE`` environment variable.
+    """
+
+    sink_retries: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_SINK_RETRIES", default=3
+        )
+    )
+    """The number of times a failed HTTP callback is retried.
+
+    Set with the ``LTD_EVENTS_SINK_RETRIES`` environment variable.
+    """
+
+    sink_retry_backoff_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_SINK_RETRY_BACKOFF_MS", default=500
+        )
+    )
+    """The time, in milliseconds, before the first retry of a failed HTTP
+    callback. The time doubles for each further retry.
+
+    Set with the ``LTD_EVENTS_SINK_RETRY_BACKOFF_MS`` environment variable.
+    """
+
+    sink_timeout_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_SINK_TIMEOUT_MS", default=5000
+        )
+    )
+    """The timeout, in milliseconds, of each HTTP callback, and of draining
+    the sink queues at shutdown.
+
+    Set with the ``LTD_EVENTS_SINK_TIMEOUT_MS`` environment variable.
+    """
+
+    event_store_size: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_EVENT_STORE_SIZE", default=1000
+        )
+    )
+    """The number of recent webhook events that are kept in memory for the
+    ``GET /<app-name>/events`` endpoint. If 0, the event store is disabled.
+
+    Set with the ``LTD_EVENTS_EVENT_STORE_SIZE`` environment variable.
+    """
+
+    enrichment: bool = field(
+        default_factory=lambda: get_env_bool(
+            "LTD_EVENTS_ENRICHMENT", default=False
+        )
+    )
+    """Whether ``edition.updated`` events are enriched with the edition's
+    build and product resources from LTD Keeper, and published with the
+    ``ltd.edition_update_v2`` value schema.
+
+    Set with the ``LTD_EVENTS_ENRICHMENT`` environment variable.
+    """
+
+    enrichment_cache_ttl_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ENRICHMENT_CACHE_TTL_MS", default=300000
+        )
+    )
+    """The time, in milliseconds, that LTD Keeper resources are cached for
+    enrichment.
+
+    Set with the ``LTD_EVENTS_ENRICHMENT_CACHE_TTL_MS`` environment variable.
+    """
+
+    enrichment_cache_size: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ENRICHMENT_CACHE_SIZE", default=1024
+        )
+    )
+    """The maximum number of LTD Keeper resources that are cached for
+    enrichment.
+
+    Set with the ``LTD_EVENTS_ENRICHMENT_CACHE_SIZE`` environment variable.
+    """
+
+    enrichment_concurrency: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ENRICHMENT_CONCURRENCY", default=8
+        )
+    )
+    """The maximum number of LTD Keeper resources that are fetched at once.
+
+    Set with the ``LTD_EVENTS_ENRICHMENT_CONCURRENCY`` environment variable.
+    """
+
+    enrichment_timeout_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_ENRICHMENT_TIMEOUT_MS", default=2000
+        )
+    )
+    """The timeout, in milliseconds, of each LTD Keeper resource fetch.
+
+    Set with the ``LTD_EVENTS_ENRICHMENT_TIMEOUT_MS`` environment variable.
+    """
+
+    enrichment_keeper_url: str = os.getenv(
+        "LTD_EVENTS_ENRICHMENT_KEEPER_URL", "https://keeper.lsst.codes"
+    )
+    """The base URL of the LTD Keeper API. Enrichment only fetches resource
+    URLs under this URL, so that webhook payloads can't make the application
+    request other hosts.
+
+    Set with the ``LTD_EVENTS_ENRICHMENT_KEEPER_URL`` environment variable.
+    """
+
+    kafka_send_retries: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_KAFKA_SEND_RETRIES", default=3
+        )
+    )
+    """The maximum number of times a Kafka send that fails with a retriable
+    error (such as during a partition leader election) is retried.
+
+    Set with the ``LTD_EVENTS_KAFKA_SEND_RETRIES`` environment variable.
+    """
+
+    kafka_retry_backoff_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_KAFKA_RETRY_BACKOFF_MS", default=100
+        )
+    )
+    """The backoff ceiling, in milliseconds, before the first retry of a
+    Kafka send. The ceiling doubles for each retry, and the backoff is a
+    random time up to the ceiling.
+
+    Set with the ``LTD_EVENTS_KAFKA_RETRY_BACKOFF_MS`` environment variable.
+    """
+
+    kafka_retry_max_backoff_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_KAFKA_RETRY_MAX_BACKOFF_MS", default=2000
+        )
+    )
+    """The maximum backoff ceiling, in milliseconds, before a retry of a
+    Kafka send.
+
+    Set with the ``LTD_EVENTS_KAFKA_RETRY_MAX_BACKOFF_MS`` environment
+    variable.
+    """
+
+    kafka_circuit_failure_threshold: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_KAFKA_CIRCUIT_FAILURE_THRESHOLD", default=10
+        )
+    )
+    """The number of consecutive failed Kafka send attempts that open the
+    circuit breaker, after which sends fail immediately until the reset
+    timeout passes. If 0, there's no circuit breaker.
+
+    Set with the ``LTD_EVENTS_KAFKA_CIRCUIT_FAILURE_THRESHOLD`` environment
+    variable.
+    """
+
+    kafka_circuit_reset_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_KAFKA_CIRCUIT_RESET_MS", default=10000
+        )
+    )
+    """The time, in milliseconds, that the circuit breaker stays open before
+    a trial Kafka send is let through.
+
+    Set with the ``LTD_EVENTS_KAFKA_CIRCUIT_RESET_MS`` environment variable.
+    """
+
+    lag_window_ms: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_LAG_WINDOW_MS", default=300000
+        )
+    )
+    """The time, in milliseconds, that ingestion lag samples are kept for
+    the rolling summary of the internal ``GET /lag`` endpoint.
+
+    Set with the ``LTD_EVENTS_LAG_WINDOW_MS`` environment variable.
+    """
+
+    lag_max_samples: int = field(
+        default_factory=lambda: get_env_int(
+            "LTD_EVENTS_LAG_MAX_SAMPLES", default=10000
+        )
+    )
+    """The maximum number of ingestion lag samples that are kept for the
+    rolling summary. If 0, the ingestion lag isn't tracked.
+
+    Set with the ``LTD_EVENTS_LAG_MAX_SAMPLES`` environment variable.
+    """
+
 
 def get_env_optional_path(envvar: str) -> Optional[Path]:
     """Get a path from an environment variable, falling back if it does not
@@ -172,6 +811,99 @@ def get_env_optional_path(envvar: str) -> Optional[Path]:
         return Path(value)
 
 
+def get_env_list(envvar: str) -> List[str]:
+    """Get a list of strings from a comma-separated environment variable.
+
+    Use this function in conjunction with ``default_factory`` for configuration
+    dataclasses.
+
+    Parameters
+    ----------
+    envvar : `str`
+        Name of an environment variable.
+
+    Returns
+    -------
+    values : `list` of `str`
+        The non-empty, whitespace-stripped items of the environment variable,
+        or an empty list if it isn't set.
+    """
+    value = os.getenv(envvar, "")
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def get_env_int(envvar: str, *, default: int) -> int:
+    """Get an integer from an environment variable.
+
+    Use this function in conjunction with ``default_factory`` for configuration
+    dataclasses.
+
+    Parameters
+    ----------
+    envvar : `str`
+        Name of an environment variable.
+    default : `int`
+        The default if the environment variable is not set.
+
+    Returns
+    -------
+    value : `int`
+        The integer value of the environment variable.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if the value is not an integer.
+    """
+    value = os.getenv(envvar)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise RuntimeError(
+            f"Value of environment variable {envvar} is not an integer. "
+            f"Value is {value}"
+        )
+
+
+def get_env_bool(envvar: str, *, default: bool) -> bool:
+    """Get a boolean from an environment variable.
+
+    Use this function in conjunction with ``default_factory`` for configuration
+    dataclasses.
+
+    Parameters
+    ----------
+    envvar : `str`
+        Name of an environment variable.
+    default : `bool`
+        The default if the environment variable is not set.
+
+    Returns
+    -------
+    value : `bool`
+        `True` if the value is ``1``, ``true``, or ``yes``, and `False` if the
+        value is ``0``, ``false``, or ``no`` (case-insensitive).
+
+    Raises
+    ------
+    RuntimeError
+        Raised if the value isn't one of the recognized values.
+    """
+    value = os.getenv(envvar)
+    if value is None:
+        return default
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    elif value.lower() in ("0", "false", "no"):
+        return False
+    raise RuntimeError(
+        f"Value of environment variable {envvar} is not a boolean. "
+        f"Value is {value}"
+    )
+
+
 def get_env_str_choices(
     envvar: str, *, default: str, choices: Sequence[str]
 ) -> str:
@@ -0,0 +1,514 @@
+"""De-duplication of repeated webhook events.
+
+LTD Keeper often sends several ``edition.updated`` events for the same
+edition within a few seconds (for example, for a rebuild followed by
+metadata updates). The `Deduplicator` suppresses these repeats, for event
+types that define a ``dedup_key`` (see `ltdevents.eventregistry.EventType`),
+in one of two modes:
+
+``drop``
+    An event is dropped if an event with the same identity (product,
+    edition, and build) was published within the window. The window is
+    measured from the first published event. Events that fail to publish
+    aren't remembered, so LTD Keeper's retries of their webhooks aren't
+    dropped.
+
+``coalesce``
+    Events are held for the window, starting from the first event for the
+    Kafka message key (the product and edition). Later events for the same
+    key replace the held event, and only the latest event is published when
+    the window closes. An event that isn't coalesced (for example, an
+    ``edition.deleted`` event) first publishes the held event for its
+    message key, so that the events for a key stay in order.
+
+Both modes are bounded by a maximum number of entries: the oldest entries
+are forgotten (``drop``) or published early (``coalesce``) when the limit is
+reached.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Hashable,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import structlog
+from aiohttp import web
+
+if TYPE_CHECKING:
+    from ltdevents.eventregistry import EventType
+    from ltdevents.metrics import WebhookMetrics
+    from ltdevents.publisher import OutboundMessage, Publisher
+
+__all__ = ["DuplicateFilter", "Coalescer", "Deduplicator", "init_deduplicator"]
+
+
+class DuplicateFilter:
+    """A bounded, time-windowed set of recently-seen keys.
+
+    Parameters
+    ----------
+    window : `float`
+        The time, in seconds, that a key is remembered after it's first seen.
+    max_entries : `int`
+        The maximum number of keys that are remembered.
+    clock : callable, optional
+        The clock, which returns the time in seconds. The default is
+        `time.monotonic`.
+    """
+
+    def __init__(
+        self,
+        *,
+        window: float,
+        max_entries: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window = window
+        self.max_entries = max_entries
+        self.suppressed = 0
+        self._clock = clock
+        self._expiries: OrderedDict[Hashable, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    def is_duplicate(self, key: Hashable) -> bool:
+        """Check whether a key was remembered within the window.
+
+        Parameters
+        ----------
+        key
+            The key.
+
+        Returns
+        -------
+        duplicate : `bool`
+            `True` if the key was remembered within the window.
+        """
+        self._expire()
+        if key in self._expiries:
+            self.suppressed += 1
+            return True
+        return False
+
+    def remember(self, key: Hashable) -> None:
+        """Remember a key for the window, unless it's already remembered.
+
+        Parameters
+        ----------
+        key
+            The key.
+        """
+        self._expire()
+        expiries = self._expiries
+        if key in expiries:
+            return
+        expiries[key] = self._clock() + self.window
+        if len(expiries) > self.max_entries:
+            expiries.popitem(last=False)
+
+    def _expire(self) -> None:
+        """Forget the keys whose window has passed."""
+        now = self._clock()
+        expiries = self._expiries
+        # Keys are remembered in the order they were first seen, so the
+        # expired keys are at the front
+        while expiries:
+            oldest_key, expiry = next(iter(expiries.items()))
+            if expiry > now:
+                break
+            del expiries[oldest_key]
+
+
+class Coalescer:
+    """Holds messages for a window and publishes only the latest message for
+    each key.
+
+    Held messages are published before any later message with the same
+    topic and Kafka message key that isn't held (see `release_before`).
+
+    Parameters
+    ----------
+    publisher : `ltdevents.publisher.Publisher`
+        The publisher that messages are handed to when their window closes.
+    window : `float`
+        The time, in seconds, that a message is held after the first message
+        for its key arrives.
+    max_entries : `int`
+        The maximum number of held messages. Once the limit is reached, the
+        oldest held message is published early.
+    logger_name : `str`, optional
+        Name of the logger.
+    """
+
+    def __init__(
+        self,
+        publisher: Publisher,
+        *,
+        window: float,
+        max_entries: int,
+        logger_name: str = "ltdevents",
+    ) -> None:
+        self.window = window
+        self.max_entries = max_entries
+        self.coalesced = 0
+        self.failed = 0
+        self._publisher = publisher
+        self._held: OrderedDict[Hashable, OutboundMessage] = OrderedDict()
+        self._handles: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._on_publish: Dict[Hashable, Callable[[], None]] = {}
+        # Held keys and publish tasks, by the messages' topic and Kafka key
+        self._held_keys: Dict[Tuple[str, bytes], Set[Hashable]] = {}
+        self._publishing: Dict[Tuple[str, bytes], Set[asyncio.Task]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._logger = structlog.get_logger(logger_name)
+
+    def __len__(self) -> int:
+        return len(self._held)
+
+    def hold(
+        self,
+        key: Hashable,
+        message: OutboundMessage,
+        on_publish: Optional[Callable[[], None]] = None,
+    ) -> bool:
+        """Hold a message until the key's window closes.
+
+        Parameters
+        ----------
+        key
+            The key that messages are coalesced by.
+        message : `ltdevents.publisher.OutboundMessage`
+            The message.
+        on_publish : callable, optional
+            A function that's called once the message is published. It isn't
+            called if the message is replaced by a later message, or fails to
+            publish.
+
+        Returns
+        -------
+        coalesced : `bool`
+            `True` if the message replaced a held message.
+        """
+        if on_publish is None:
+            self._on_publish.pop(key, None)
+        else:
+            self._on_publish[key] = on_publish
+        if key in self._held:
+            self._unindex(key, self._held[key])
+            self._held[key] = message
+            self._index(key, message)
+            self.coalesced += 1
+            return True
+
+        self._held[key] = message
+        self._index(key, message)
+        loop = asyncio.get_running_loop()
+        self._handles[key] = loop.call_later(self.window, self._release, key)
+        if len(self._held) > self.max_entries:
+            oldest_key = next(iter(self._held))
+            self._handles[oldest_key].cancel()
+            self._release(oldest_key)
+        return False
+
+    def release_before(self, message: OutboundMessage) -> Set[asyncio.Task]:
+        """Publish the held messages with the same topic and Kafka key as a
+        message that isn't held, so that they're published before it.
+
+        Parameters
+        ----------
+        message : `ltdevents.publisher.OutboundMessage`
+            The message that isn't held.
+
+        Returns
+        -------
+        tasks : `set` of `asyncio.Task`
+            The tasks that publish messages with the same topic and key,
+            including messages that were released earlier and are still being
+            published. Wait for the tasks before publishing ``message``.
+        """
+        slot = (message.topic, message.key)
+        for key in list(self._held_keys.get(slot, ())):
+            self._handles[key].cancel()
+            self._release(key)
+        return set(self._publishing.get(slot, ()))
+
+    async def close(self) -> None:
+        """Publish all held messages and wait for the publishes to finish."""
+        for handle in self._handles.values():
+            handle.cancel()
+        for key in list(self._held.keys()):
+            self._release(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _index(self, key: Hashable, message: OutboundMessage) -> None:
+        slot = (message.topic, message.key)
+        self._held_keys.setdefault(slot, set()).add(key)
+
+    def _unindex(self, key: Hashable, message: OutboundMessage) -> None:
+        slot = (message.topic, message.key)
+        keys = self._held_keys[slot]
+        keys.discard(key)
+        if not keys:
+            del self._held_keys[slot]
+
+    def _release(self, key: Hashable) -> None:
+        message = self._held.pop(key)
+        del self._handles[key]
+        self._unindex(key, message)
+        on_publish = self._on_publish.pop(key, None)
+        task = asyncio.create_task(self._publish(message, on_publish))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        slot = (message.topic, message.key)
+        self._publishing.setdefault(slot, set()).add(task)
+        task.add_done_callback(lambda t: self._discard_task(slot, t))
+
+    def _discard_task(
+        self, slot: Tuple[str, bytes], task: asyncio.Task
+    ) -> None:
+        tasks = self._publishing[slot]
+        tasks.discard(task)
+        if not tasks:
+            del self._publishing[slot]
+
+    async def _publish(
+        self,
+        message: OutboundMessage,
+        on_publish: Optional[Callable[[], None]],
+    ) -> None:
+        try:
+            await self._publisher.publish(message)
+        except Exception:
+            self.failed += 1
+            self._logger.exception(
+                "Failed to publish coalesced message", topic=message.topic
+            )
+            return
+        if on_publish is not None:
+            on_publish()
+
+
+class Deduplicator:
+    """De-duplicates webhook events, available from the
+    ``"ltdevents/deduplicator"`` application key.
+
+    Parameters
+    ----------
+    mode : `str`
+        The de-duplication mode: ``off``, ``drop``, or ``coalesce``.
+    publisher : `ltdevents.publisher.Publisher`
+        The publisher (used by the ``coalesce`` mode).
+    window : `float`
+        The de-duplication window, in seconds.
+    max_entries : `int`
+        The maximum number of remembered or held events.
+    metrics : `ltdevents.metrics.WebhookMetrics`, optional
+        Metrics that suppressed events, and coalesced messages that failed to
+        publish, are counted in.
+    logger_name : `str`, optional
+        Name of the logger.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        publisher: Publisher,
+        *,
+        window: float,
+        max_entries: int,
+        metrics: Optional[WebhookMetrics] = None,
+        logger_name: str = "ltdevents",
+    ) -> None:
+        if mode not in ("off", "drop", "coalesce"):
+            raise ValueError(f"Unknown de-duplication mode {mode!r}")
+        self.mode = mode
+        self._metrics = metrics
+        self._filter: Optional[DuplicateFilter] = None
+        self._coalescer: Optional[Coalescer] = None
+        if mode == "drop":
+            self._filter = DuplicateFilter(
+                window=window, max_entries=max_entries
+            )
+        elif mode == "coalesce":
+            self._coalescer = Coalescer(
+                publisher,
+                window=window,
+                max_entries=max_entries,
+                logger_name=logger_name,
+            )
+            if metrics is not None:
+                metrics.track_coalescer(self._coalescer)
+
+    def is_duplicate(
+        self, event_type: EventType, record: Mapping[str, Any]
+    ) -> bool:
+        """Check whether an event repeats a published event from within the
+        window (``drop`` mode).
+
+        Parameters
+        ----------
+        event_type : `ltdevents.eventregistry.EventType`
+            The event type.
+        record : `dict`
+            The validated record.
+
+        Returns
+        -------
+        duplicate : `bool`
+            `True` if the event should be dropped.
+        """
+        if self._filter is None or event_type.dedup_key is None:
+            return False
+        key = (event_type.name, event_type.dedup_key(record))
+        if self._filter.is_duplicate(key):
+            if self._metrics is not None:
+                self._metrics.count_suppressed(event_type.name, "duplicate")
+            return True
+        return False
+
+    def remember(
+        self, event_type: EventType, record: Mapping[str, Any]
+    ) -> None:
+        """Remember a published event, so that its repeats within the window
+        are dropped (``drop`` mode).
+
+        Call this only once the event is published (or accepted into the
+        publish queue or spool), so that LTD Keeper's retry of a webhook
+        that failed to publish isn't dropped as a duplicate.
+
+        Parameters
+        ----------
+        event_type : `ltdevents.eventregistry.EventType`
+            The event type.
+        record : `dict`
+            The validated record.
+        """
+        if self._filter is None or event_type.dedup_key is None:
+            return
+        self._filter.remember((event_type.name, event_type.dedup_key(record)))
+
+    def hold(
+        self,
+        event_type: EventType,
+        record: Mapping[str, Any],
+        message: OutboundMessage,
+        on_publish: Optional[Callable[[], None]] = None,
+    ) -> bool:
+        """Hold an event's message to coalesce it with later events for the
+        same message key (``coalesce`` mode).
+
+        Parameters
+        ----------
+        event_type : `ltdevents.eventregistry.EventType`
+            The event type.
+        record : `dict`
+            The validated record.
+        message : `ltdevents.publisher.OutboundMessage`
+            The event's message.
+        on_publish : callable, optional
+            A function that's called once the held message is published (for
+            example, to deliver the event to the fan-out sinks). It isn't
+            called if a later event replaces this event.
+
+        Returns
+        -------
+        held : `bool`
+            `True` if the message is held, and will be published by the
+            deduplicator. `False` if the caller should publish the message.
+        """
+        if self._coalescer is None or event_type.dedup_key is None:
+            return False
+        key = (event_type.name, event_type.key(record))
+        coalesced = self._coalescer.hold(key, message, on_publish)
+        if coalesced and self._metrics is not None:
+            self._metrics.count_suppressed(event_type.name, "coalesced")
+        return True
+
+    def release_before(self, message: OutboundMessage) -> Set[asyncio.Task]:
+        """Publish the held messages that must be published before a message
+        that isn't held (``coalesce`` mode).
+
+        Parameters
+        ----------
+        message : `ltdevents.publisher.OutboundMessage`
+            The message that isn't held.
+
+        Returns
+        -------
+        tasks : `set` of `asyncio.Task`
+            The tasks that publish held messages with the same topic and
+            Kafka key as ``message``. Wait for the tasks before publishing
+            ``message``.
+        """
+        if self._coalescer is None:
+            return set()
+        return self._coalescer.release_before(message)
+
+    async def flush(self, message: OutboundMessage) -> None:
+        """Publish the held messages that must be published before a message
+        that isn't held, and wait for them (``coalesce`` mode).
+
+        Parameters
+        ----------
+        message : `ltdevents.publisher.OutboundMessage`
+            The message that isn't held.
+        """
+        tasks = self.release_before(message)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    @property
+    def size(self) -> int:
+        """The number of remembered or held events."""
+        if self._filter is not None:
+            return len(self._filter)
+        elif self._coalescer is not None:
+            return len(self._coalescer)
+        return 0
+
+    async def close(self) -> None:
+        """Publish any held messages."""
+        if self._coalescer is not None:
+            await self._coalescer.close()
+
+
+async def init_deduplicator(app: web.Application) -> AsyncGenerator:
+    """Create the deduplicator selected by the ``dedup_mode`` configuration
+    and make it available as the ``"ltdevents/deduplicator"`` key on the
+    application.
+
+    Notes
+    -----
+    Use this function as a cleanup context after the publisher is
+    initialized so that held messages are published before the publisher
+    closes.
+    """
+    config = app["safir/config"]
+    deduplicator = Deduplicator(
+        config.dedup_mode,
+        app["ltdevents/publisher"],
+        window=config.dedup_window_ms / 1000.0,
+        max_entries=config.dedup_max_entries,
+        metrics=app.get("ltdevents/metrics"),
+        logger_name=config.logger_name,
+    )
+    app["ltdevents/deduplicator"] = deduplicator
+
+    yield
+
+    await deduplicator.close()
@@ -0,0 +1,345 @@
+"""Enrichment of webhook events with resources from the LTD Keeper API.
+
+``edition.updated`` payloads only have the URLs of the edition's build and
+product resources, so consumers would otherwise each fetch those resources
+from LTD Keeper. With enrichment, the `Enricher` (available from the
+``"ltdevents/enricher"`` application key) fetches the resources once, in
+``post_webhook``, and the events are published with the
+``ltd.edition_update_v2`` value schema, which embeds them.
+
+Resources are fetched by a `ResourceFetcher`, through the application's
+shared HTTP session, which:
+
+- Caches resources for a time-to-live, in a least-recently-used cache of
+  bounded size.
+- Coalesces concurrent requests for the same URL into a single fetch.
+- Bounds the number of fetches in flight.
+
+Only resource URLs under the configured LTD Keeper base URL are fetched,
+so that webhook payloads can't make the application request other hosts.
+Fetched resources must be JSON objects, and fields that don't have the
+expected type are ignored. A resource that can't be fetched, isn't allowed,
+or isn't valid is published as `null` (and a build without a valid slug is
+published as `null`), so enrichment never fails a webhook.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+import aiohttp
+import structlog
+from aiohttp import web
+from yarl import URL
+
+__all__ = ["TTLCache", "ResourceFetcher", "Enricher", "init_enricher"]
+
+
+class TTLCache:
+    """A least-recently-used cache whose entries expire.
+
+    Parameters
+    ----------
+    ttl : `float`
+        The time, in seconds, that an entry is kept.
+    max_entries : `int`
+        The maximum number of entries. Once the cache is full, the
+        least-recently-used entry is dropped.
+    clock : callable, optional
+        The clock, which returns the time in seconds. The default is
+        `time.monotonic`.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttl: float,
+        max_entries: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Get an entry.
+
+        Returns
+        -------
+        found : `bool`
+            `True` if the key has an entry that hasn't expired.
+        value
+            The value of the entry, or `None`.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expiry, value = entry
+        if expiry <= self._clock():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: str, value: Any) -> None:
+        """Set an entry."""
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class ResourceFetcher:
+    """Fetches JSON resources with caching, request coalescing, and a
+    concurrency limit.
+
+    Parameters
+    ----------
+    session : `aiohttp.ClientSession`
+        The HTTP session.
+    cache : `TTLCache`
+        The cache of fetched resources.
+    concurrency : `int`
+        The maximum number of fetches in flight.
+    timeout : `float`
+        The timeout, in seconds, of each fetch.
+    logger_name : `str`, optional
+        Name of the logger.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        *,
+        cache: TTLCache,
+        concurrency: int,
+        timeout: float,
+        logger_name: str = "ltdevents",
+    ) -> None:
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._session = session
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._logger = structlog.get_logger(logger_name)
+
+    async def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get a resource.
+
+        Returns
+        -------
+        resource : `dict` or `None`
+            The resource, or `None` if it couldn't be fetched.
+        """
+        found, resource = self.cache.get(url)
+        if found:
+            self.hits += 1
+            return resource
+        future = self._in_flight.get(url)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.ensure_future(self._fetch(url))
+        self._in_flight[url] = future
+        return await asyncio.shield(future)
+
+    async def _fetch(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with self._semaphore:
+                async with self._session.get(
+                    url, timeout=self._timeout
+                ) as response:
+                    response.raise_for_status()
+                    resource = await response.json()
+            if not isinstance(resource, dict):
+                raise ValueError("Resource isn't a JSON object")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.errors += 1
+            self._logger.warning(
+                "Failed to fetch LTD Keeper resource", url=url, error=str(e)
+            )
+            return None
+        finally:
+            self._in_flight.pop(url, None)
+        self.cache.set(url, resource)
+        return resource
+
+
+class Enricher:
+    """Adds the build and product resources from LTD Keeper to
+    ``edition.updated`` records.
+
+    Parameters
+    ----------
+    fetcher : `ResourceFetcher`
+        The resource fetcher.
+    base_url : `str`
+        The base URL of the LTD Keeper API. Resource URLs that aren't under
+        this URL aren't fetched.
+    logger_name : `str`, optional
+        Name of the logger.
+    """
+
+    def __init__(
+        self,
+        fetcher: ResourceFetcher,
+        *,
+        base_url: str,
+        logger_name: str = "ltdevents",
+    ) -> None:
+        self.fetcher = fetcher
+        self.base_url = URL(base_url)
+        self.rejected = 0
+        self._logger = structlog.get_logger(logger_name)
+
+    async def enrich(self, record: Mapping[str, Any]) -> Dict[str, Any]:
+        """Enrich an ``edition.updated`` record.
+
+        Parameters
+        ----------
+        record : `dict`
+            The validated record.
+
+        Returns
+        -------
+        record : `dict`
+            A new record, for the ``ltd.edition_update_v2`` schema.
+        """
+        build_url = str(record["edition"]["build_url"])
+        build, product = await asyncio.gather(
+            self._get(build_url), self._get(str(record["product"]["url"]))
+        )
+        enriched = dict(record)
+        enriched["product"] = {
+            **record["product"],
+            "doc_repo": _str(product.get("doc_repo")) if product else None,
+        }
+        enriched["build"] = (
+            {
+                "url": build_url,
+                "slug": build["slug"],
+                "published_url": _str(build.get("published_url")),
+                "git_refs": _git_refs(build.get("git_refs")),
+                "date_created": _parse_datetime(build.get("date_created")),
+            }
+            if build and isinstance(build.get("slug"), str)
+            else None
+        )
+        return enriched
+
+    def is_allowed(self, url: str) -> bool:
+        """Check whether a resource URL is under the LTD Keeper base URL."""
+        try:
+            parsed = URL(url)
+        except ValueError:
+            return False
+        base = self.base_url
+        if (parsed.scheme, parsed.host, parsed.port) != (
+            base.scheme,
+            base.host,
+            base.port,
+        ):
+            return False
+        prefix = base.path.rstrip("/") + "/"
+        return parsed.path.startswith(prefix)
+
+    async def _get(self, url: str) -> Optional[Dict[str, Any]]:
+        if not self.is_allowed(url):
+            self.rejected += 1
+            self._logger.warning(
+                "Not fetching resource outside of LTD Keeper", url=url
+            )
+            return None
+        return await self.fetcher.get(url)
+
+    def stats(self) -> Dict[str, int]:
+        """The cache and fetch counts of the resource fetcher."""
+        fetcher = self.fetcher
+        return {
+            "cached": len(fetcher.cache),
+            "hits": fetcher.hits,
+            "misses": fetcher.misses,
+            "coalesced": fetcher.coalesced,
+            "errors": fetcher.errors,
+            "rejected": self.rejected,
+        }
+
+
+def _str(value: Any) -> Optional[str]:
+    return value if isinstance(value, str) else None
+
+
+def _git_refs(value: Any) -> List[str]:
+    if not isinstance(value, list):
+        return []
+    return [str(ref) for ref in value]
+
+
+def _parse_datetime(value: Any) -> Optional[datetime.datetime]:
+    if not isinstance(value, str):
+        return None
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        timestamp = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp
+
+
+async def init_enricher(app: web.Application) -> AsyncGenerator:
+    """Create the enricher, if the ``enrichment`` configuration is enabled,
+    and make it available as the ``"ltdevents/enricher"`` key on the
+    application (otherwise the key is `None`).
+
+    Notes
+    -----
+    Use this function as a cleanup context after the HTTP session is
+    initialized.
+    """
+    config = app["safir/config"]
+    enricher: Optional[Enricher] = None
+    if config.enrichment:
+        fetcher = ResourceFetcher(
+            app["safir/http_session"],
+            cache=TTLCache(
+                ttl=config.enrichment_cache_ttl_ms / 1000.0,
+                max_entries=config.enrichment_cache_size,
+            ),
+            concurrency=config.enrichment_concurrency,
+            timeout=config.enrichment_timeout_ms / 1000.0,
+            logger_name=config.logger_name,
+        )
+        enricher = Enricher(
+            fetcher,
+            base_url=config.enrichment_keeper_url,
+            logger_name=config.logger_name,
+        )
+    app["ltdevents/enricher"] = enricher
+
+    yield
@@ -0,0 +1,377 @@
+"""Registry of the webhook event types that the application handles.
+
+Each LTD Keeper event type is described by an `EventType`: its pydantic
+model, the names of its Avro key and value schemas, a function that extracts
+the message key from a record, and (optionally) its Kafka topic. The
+`EventRegistry` collects these descriptions into a dictionary, along with
+each model's compiled fast-path validator, so that handlers dispatch a
+payload to its event type with a single lookup.
+
+To handle a new event type, add a model to `ltdevents.webhookmodels`, its
+schemas to the ``schemas`` directory, and an `EventType` to `EVENT_TYPES`.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+)
+
+from ltdevents.partitioner import KeyPartitioner
+from ltdevents.publisher import OutboundMessage
+from ltdevents.validators import FastValidator, compile_validator
+from ltdevents.webhookmodels import (
+    BaseEvent,
+    BuildUploadedEvent,
+    EditionDeletedEvent,
+    EditionUpdatedEvent,
+    ProductCreatedEvent,
+)
+
+if TYPE_CHECKING:
+    from typing_extensions import Protocol
+
+    from ltdevents.serializers import AvroSerializers
+
+    class KeyFunction(Protocol):
+        """A function that extracts a tuple of key fields from a record.
+
+        (Declared as a protocol so that mypy doesn't treat `EventType`
+        fields of this type as methods.)
+        """
+
+        def __call__(self, record: Mapping[str, Any]) -> Tuple[str, ...]:
+            ...
+
+
+__all__ = ["EventType", "EventRegistry", "EVENT_TYPES"]
+
+
+@dataclass(frozen=True)
+class EventType:
+    """A description of a webhook event type."""
+
+    name: str
+    """Name of the event type, matching the ``event_type`` field of its
+    payloads (for example, ``edition.updated``).
+    """
+
+    model: Type[BaseEvent]
+    """The pydantic model of the event's webhook payloads."""
+
+    key_schema: str
+    """Name of the Avro schema for the Kafka message key."""
+
+    value_schema: str
+    """Name of the Avro schema for the Kafka message value."""
+
+    key: KeyFunction
+    """Function that extracts the values of the key schema's fields, in
+    order, from a validated record.
+    """
+
+    topic: Optional[str] = None
+    """Kafka topic for the event's messages, or `None` to use the default
+    topic (the ``events_kafka_topic`` configuration).
+    """
+
+    dedup_key: Optional[KeyFunction] = None
+    """Function that extracts the identity of an event from a validated
+    record, for de-duplication (see `ltdevents.dedup`), or `None` if events
+    of this type aren't de-duplicated.
+    """
+
+    enriched_value_schema: Optional[str] = None
+    """Name of the Avro schema for the Kafka message value of records that
+    are enriched with LTD Keeper resources (see `ltdevents.enrichment`), or
+    `None` if events of this type aren't enriched.
+    """
+
+    state: Optional[str] = None
+    """How events of this type change the latest-state topic (the
+    ``state_kafka_topic`` configuration): ``"upsert"`` publishes the event's
+    message as the latest state of its key, ``"delete"`` publishes a
+    tombstone for its key, and `None` leaves the topic unchanged.
+    """
+
+
+def _edition_key(record: Mapping[str, Any]) -> Tuple[str, ...]:
+    return (record["product"]["slug"], record["edition"]["slug"])
+
+
+def _edition_build_key(record: Mapping[str, Any]) -> Tuple[str, ...]:
+    return (
+        record["product"]["slug"],
+        record["edition"]["slug"],
+        record["edition"]["build_url"],
+    )
+
+
+def _build_key(record: Mapping[str, Any]) -> Tuple[str, ...]:
+    return (record["product"]["slug"], record["build"]["slug"])
+
+
+def _product_key(record: Mapping[str, Any]) -> Tuple[str, ...]:
+    return (record["product"]["slug"],)
+
+
+EVENT_TYPES: List[EventType] = [
+    EventType(
+        name="edition.updated",
+        model=EditionUpdatedEvent,
+        key_schema="ltd.edition_key_v1",
+        value_schema="ltd.edition_update_v1",
+        key=_edition_key,
+        dedup_key=_edition_build_key,
+        enriched_value_schema="ltd.edition_update_v2",
+        state="upsert",
+    ),
+    EventType(
+        name="edition.deleted",
+        model=EditionDeletedEvent,
+        key_schema="ltd.edition_key_v1",
+        value_schema="ltd.edition_delete_v1",
+        key=_edition_key,
+        state="delete",
+    ),
+    EventType(
+        name="build.uploaded",
+        model=BuildUploadedEvent,
+        key_schema="ltd.build_key_v1",
+        value_schema="ltd.build_upload_v1",
+        key=_build_key,
+    ),
+    EventType(
+        name="product.created",
+        model=ProductCreatedEvent,
+        key_schema="ltd.product_key_v1",
+        value_schema="ltd.product_create_v1",
+        key=_product_key,
+    ),
+]
+"""The event types that LTD Keeper sends."""
+
+
+class EventRegistry:
+    """A registry of webhook event types, available from the
+    ``"ltdevents/event_registry"`` application key.
+
+    Parameters
+    ----------
+    event_types : iterable of `EventType`
+        The event types.
+    default_topic : `str`
+        The Kafka topic for event types that don't set their own topic.
+    partitioner : `ltdevents.partitioner.KeyPartitioner`, optional
+        The partitioner that assigns messages to partitions by their key
+        fields. If `None`, the Kafka producer's partitioner assigns
+        partitions.
+    state_topic : `str`, optional
+        The log-compacted Kafka topic for the latest state of each key (see
+        `EventType.state`), or `None` to not publish the latest state.
+
+    Raises
+    ------
+    ValueError
+        Raised if two event types have the same name.
+    """
+
+    def __init__(
+        self,
+        event_types: Iterable[EventType],
+        *,
+        default_topic: str,
+        partitioner: Optional[KeyPartitioner] = None,
+        state_topic: Optional[str] = None,
+    ) -> None:
+        self.partitioner = partitioner
+        self.state_topic = state_topic
+        self._event_types: Dict[str, EventType] = {}
+        self._validators: Dict[str, Optional[FastValidator]] = {}
+        self._topics: Dict[str, str] = {}
+        for event_type in event_types:
+            if event_type.name in self._event_types:
+                raise ValueError(
+                    f"Event type {event_type.name} is registered twice."
+                )
+            self._event_types[event_type.name] = event_type
+            self._validators[event_type.name] = compile_validator(
+                event_type.model
+            )
+            self._topics[event_type.name] = event_type.topic or default_topic
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._event_types
+
+    def __getitem__(self, name: str) -> EventType:
+        return self._event_types[name]
+
+    @property
+    def names(self) -> List[str]:
+        """The names of the registered event types."""
+        return list(self._event_types.keys())
+
+    def topic(self, name: str) -> str:
+        """Get the Kafka topic of an event type."""
+        return self._topics[name]
+
+    def parse_event(self, payload: Dict[str, Any]) -> BaseEvent:
+        """Parse a webhook payload into the pydantic model of its event type.
+
+        Parameters
+        ----------
+        payload : `dict`
+            The webhook payload body, parsed from JSON.
+
+        Returns
+        -------
+        event : `ltdevents.webhookmodels.BaseEvent`
+            The parsed payload, as an instance of the event type's model.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the payload isn't a JSON object, or doesn't have a
+            known ``event_type``.
+        pydantic.ValidationError
+            Raised if the payload isn't valid for its event type.
+        """
+        return self._lookup(payload).model.parse_obj(payload)
+
+    def parse(
+        self, payload: Dict[str, Any]
+    ) -> Tuple[EventType, Dict[str, Any]]:
+        """Parse a webhook payload directly into an Avro-ready record.
+
+        The record is equivalent to ``parse_event(payload).dict()``, but
+        payloads are validated with the event type's compiled fast-path
+        validator (see `ltdevents.validators`) when possible. Payloads that
+        the fast path can't validate are parsed by the pydantic model, so the
+        models remain the schema of record and errors are identical.
+
+        Parameters
+        ----------
+        payload : `dict`
+            The webhook payload body, parsed from JSON.
+
+        Returns
+        -------
+        event_type : `EventType`
+            The payload's event type.
+        record : `dict`
+            The validated record, with the fields of the event type's model.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the payload isn't a JSON object, or doesn't have a
+            known ``event_type``.
+        pydantic.ValidationError
+            Raised if the payload isn't valid for its event type.
+        """
+        event_type = self._lookup(payload)
+        validator = self._validators[event_type.name]
+        if validator is not None:
+            record = validator(payload)
+            if record is not None:
+                return event_type, record
+        return event_type, event_type.model.parse_obj(payload).dict()
+
+    def serialize(
+        self,
+        event_type: EventType,
+        record: Mapping[str, Any],
+        serializers: AvroSerializers,
+        *,
+        enriched: bool = False,
+    ) -> OutboundMessage:
+        """Serialize a validated record into a Kafka message.
+
+        Parameters
+        ----------
+        event_type : `EventType`
+            The record's event type.
+        record : `dict`
+            The validated record (see `parse`).
+        serializers : `ltdevents.serializers.AvroSerializers`
+            The application's Avro serializers.
+        enriched : `bool`, optional
+            Whether the record is enriched (see `ltdevents.enrichment`), in
+            which case it's serialized with the event type's
+            ``enriched_value_schema``.
+
+        Returns
+        -------
+        message : `ltdevents.publisher.OutboundMessage`
+            The Kafka message.
+        """
+        key = event_type.key(record)
+        value_schema = event_type.value_schema
+        if enriched:
+            if event_type.enriched_value_schema is None:
+                raise ValueError(
+                    f"Event type {event_type.name} can't be enriched."
+                )
+            value_schema = event_type.enriched_value_schema
+        return OutboundMessage(
+            topic=self._topics[event_type.name],
+            key=serializers.serialize_key(key, name=event_type.key_schema),
+            value=serializers.serialize(record, name=value_schema),
+            partition=(
+                self.partitioner(key) if self.partitioner is not None else None
+            ),
+        )
+
+    def state_message(
+        self, event_type: EventType, message: OutboundMessage
+    ) -> Optional[OutboundMessage]:
+        """Derive the latest-state message for an event's message.
+
+        Parameters
+        ----------
+        event_type : `EventType`
+            The event type.
+        message : `ltdevents.publisher.OutboundMessage`
+            The event's message (see `serialize`).
+
+        Returns
+        -------
+        message : `ltdevents.publisher.OutboundMessage` or `None`
+            A message for the state topic with the same key, and the same
+            value or no value (a tombstone). `None` if there's no state
+            topic or the event type doesn't change the state.
+
+        Notes
+        -----
+        State messages are partitioned by the producer's partitioner, which
+        hashes the encoded key, so that all states of a key are in the same
+        partition of the compacted topic whatever its number of partitions.
+        """
+        if self.state_topic is None or event_type.state is None:
+            return None
+        return OutboundMessage(
+            topic=self.state_topic,
+            key=message.key,
+            value=message.value if event_type.state == "upsert" else None,
+        )
+
+    def _lookup(self, payload: Any) -> EventType:
+        if not isinstance(payload, dict):
+            raise RuntimeError("Payload must be a JSON object.")
+        try:
+            name = payload["event_type"]
+        except KeyError:
+            raise RuntimeError("Payload does not contain ``event_type``.")
+        try:
+            return self._event_types[name]
+        except (KeyError, TypeError):
+            raise RuntimeError(f"Payload type ``{name}`` is not known.")
@@ -0,0 +1,202 @@
+"""An in-memory store of recent webhook events.
+
+Dashboards that show recently-updated documentation can query the
+`EventStore` (through the external ``GET /<app-name>/events`` endpoint)
+instead of polling LTD Keeper. The store is a ring buffer of the most recent
+accepted events, available from the ``"ltdevents/event_store"`` application
+key, with indexes by product slug and by product and edition slug. Each
+event is encoded as JSON once, when it's added, so queries only join
+pre-encoded events.
+
+Events are identified by a sequence number that increases as events are
+added. Queries return events newest-first and are paginated with the
+sequence number of the last event of the previous page, which stays valid as
+new events are added.
+"""
+
+from __future__ import annotations
+
+import datetime
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import orjson
+
+__all__ = ["StoredEvent", "EventStore"]
+
+
+@dataclass(frozen=True)
+class StoredEvent:
+    """An event in the `EventStore`."""
+
+    id: int
+    """The sequence number of the event."""
+
+    event_type: str
+    """The event type name."""
+
+    timestamp: datetime.datetime
+    """The ``event_timestamp`` of the event (timezone-aware)."""
+
+    product: Optional[str]
+    """The product slug, if the event is about a product."""
+
+    edition: Optional[str]
+    """The edition slug, if the event is about an edition."""
+
+    body: bytes
+    """The JSON-encoded event: the record, with an ``id`` field."""
+
+
+class EventStore:
+    """A bounded, indexed store of recent events.
+
+    Parameters
+    ----------
+    max_size : `int`
+        The maximum number of events that are kept. Once the store is full,
+        the oldest event is dropped as each event is added.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        if max_size < 1:
+            raise ValueError(
+                f"The event store size must be positive, not {max_size}"
+            )
+        self.max_size = max_size
+        # The sequence number of the most recently added event, which changes
+        # whenever the store's contents change
+        self.last_id = 0
+        self._events: Deque[StoredEvent] = deque()
+        self._by_product: Dict[str, Deque[StoredEvent]] = {}
+        self._by_edition: Dict[Tuple[str, str], Deque[StoredEvent]] = {}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def add(self, event_type: str, record: Dict[str, Any]) -> StoredEvent:
+        """Add an event.
+
+        Parameters
+        ----------
+        event_type : `str`
+            The event type name.
+        record : `dict`
+            The parsed webhook event record (see
+            `ltdevents.eventregistry.EventRegistry.parse`).
+
+        Returns
+        -------
+        event : `StoredEvent`
+            The stored event.
+        """
+        if len(self._events) >= self.max_size:
+            self._evict()
+        self.last_id += 1
+        product = record.get("product", {}).get("slug")
+        edition = record.get("edition", {}).get("slug")
+        event = StoredEvent(
+            id=self.last_id,
+            event_type=event_type,
+            timestamp=_aware(record["event_timestamp"]),
+            product=product,
+            edition=edition,
+            body=orjson.dumps({"id": self.last_id, **record}, default=str),
+        )
+        self._events.append(event)
+        if product is not None:
+            self._by_product.setdefault(product, deque()).append(event)
+            if edition is not None:
+                self._by_edition.setdefault(
+                    (product, edition), deque()
+                ).append(event)
+        return event
+
+    def query(
+        self,
+        *,
+        product: Optional[str] = None,
+        edition: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        before: Optional[int] = None,
+        limit: int = 50,
+    ) -> List[StoredEvent]:
+        """Find events, newest first.
+
+        Parameters
+        ----------
+        product : `str`, optional
+            Only find events for this product slug.
+        edition : `str`, optional
+            Only find events for this edition slug (of the ``product``, which
+            is required with ``edition``).
+        since : `datetime.datetime`, optional
+            Only find events with an ``event_timestamp`` at or after this
+            time. Naive datetimes are in UTC.
+        until : `datetime.datetime`, optional
+            Only find events with an ``event_timestamp`` before this time.
+        before : `int`, optional
+            Only find events added before the event with this sequence
+            number (the ``id`` of the last event of the previous page).
+        limit : `int`, optional
+            The maximum number of events.
+
+        Returns
+        -------
+        events : `list` of `StoredEvent`
+            The events.
+
+        Raises
+        ------
+        ValueError
+            Raised if ``edition`` is given without ``product``.
+        """
+        if edition is not None:
+            if product is None:
+                raise ValueError("Filtering by edition requires a product.")
+            events = self._by_edition.get((product, edition), deque())
+        elif product is not None:
+            events = self._by_product.get(product, deque())
+        else:
+            events = self._events
+        since = _aware(since) if since is not None else None
+        until = _aware(until) if until is not None else None
+
+        results: List[StoredEvent] = []
+        for event in reversed(events):
+            if before is not None and event.id >= before:
+                continue
+            if since is not None and event.timestamp < since:
+                continue
+            if until is not None and event.timestamp >= until:
+                continue
+            results.append(event)
+            if len(results) >= limit:
+                break
+        return results
+
+    def _evict(self) -> None:
+        """Drop the oldest event, which is also the oldest event of its
+        indexes.
+        """
+        event = self._events.popleft()
+        if event.product is None:
+            return
+        _popleft_index(self._by_product, event.product)
+        if event.edition is not None:
+            _popleft_index(self._by_edition, (event.product, event.edition))
+
+
+def _popleft_index(index: Dict[Any, Deque[StoredEvent]], key: Any) -> None:
+    events = index[key]
+    events.popleft()
+    if not events:
+        del index[key]
+
+
+def _aware(timestamp: datetime.datetime) -> datetime.datetime:
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp
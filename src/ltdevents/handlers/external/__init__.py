@@ -2,6 +2,7 @@
 ``/<app-name>/``.
 """
 
-__all__ = ["get_index"]
+__all__ = ["get_index", "get_events"]
 
+from ltdevents.handlers.external.events import get_events
 from ltdevents.handlers.external.index import get_index
@@ -0,0 +1,107 @@
+"""Handlers for the external ``/<app-name>/events`` endpoint."""
+
+__all__ = ["get_events"]
+
+import datetime
+from typing import Optional
+
+import orjson
+from aiohttp import web
+
+from ltdevents.handlers import routes
+
+MAX_LIMIT = 500
+"""The maximum number of events in a page."""
+
+
+@routes.get("/events")
+async def get_events(request: web.Request) -> web.Response:
+    """GET /<app-name>/events.
+
+    This endpoint lists recent webhook events from the in-memory event store
+    (see `ltdevents.eventstore`), newest first. The query parameters are:
+
+    ``product``
+        Only list events for this product slug.
+    ``edition``
+        Only list events for this edition slug (requires ``product``).
+    ``since``, ``until``
+        Only list events with an ``event_timestamp`` in this range (ISO
+        8601 datetimes).
+    ``limit``
+        The number of events in a page (default 50, at most 500).
+    ``before``
+        List events older than the event with this ``id``. The ``next`` URL
+        of a page has this parameter.
+
+    The response is a JSON object with the ``events`` and the ``next`` page
+    URL (or `null`). The ``next`` URL is relative (a path and query), so it
+    doesn't depend on how the request was proxied. The response has an
+    ``ETag`` that changes whenever an event is added, and requests with a
+    matching ``If-None-Match`` header get a 304 response. If the event store
+    is disabled, the response status is 404.
+
+    With several worker processes, each worker has its own event store, so
+    only the events received by the worker that handles the request are
+    listed (see `ltdevents.workers`).
+    """
+    store = request.config_dict["ltdevents/event_store"]
+    if store is None:
+        return web.json_response(
+            {"error": "The event store is disabled."}, status=404
+        )
+
+    etag = f'"{store.last_id}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers=headers)
+
+    query = request.query
+    try:
+        limit = int(query.get("limit", 50))
+        before = _parse_int(query.get("before"))
+        since = _parse_datetime(query.get("since"))
+        until = _parse_datetime(query.get("until"))
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LIMIT}.")
+        events = store.query(
+            product=query.get("product"),
+            edition=query.get("edition"),
+            since=since,
+            until=until,
+            before=before,
+            limit=limit,
+        )
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    next_url = None
+    if len(events) == limit:
+        next_url = str(request.rel_url.update_query(before=events[-1].id))
+    body = b"".join(
+        [
+            b'{"events":[',
+            b",".join(event.body for event in events),
+            b'],"next":',
+            orjson.dumps(next_url),
+            b"}",
+        ]
+    )
+    return web.Response(
+        body=body, content_type="application/json", headers=headers
+    )
+
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value is not None else None
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime.datetime]:
+    if value is None:
+        return None
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid datetime: {value}")
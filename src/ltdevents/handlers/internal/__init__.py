@@ -5,7 +5,18 @@ These handlers aren't externally visible since the app is available at a path,
 the external endpoint handlers.
 """
 
-__all__ = ["get_index", "post_webhook"]
+__all__ = [
+    "get_index",
+    "get_healthz",
+    "get_readyz",
+    "get_lag",
+    "get_metrics",
+    "post_webhook",
+    "get_webhook_queue",
+]
 
+from ltdevents.handlers.internal.health import get_healthz, get_readyz
 from ltdevents.handlers.internal.index import get_index
-from ltdevents.handlers.internal.webhook import post_webhook
+from ltdevents.handlers.internal.lag import get_lag
+from ltdevents.handlers.internal.metrics import get_metrics
+from ltdevents.handlers.internal.webhook import get_webhook_queue, post_webhook
@@ -0,0 +1,35 @@
+"""Handlers for the internal ``/healthz`` and ``/readyz`` endpoints."""
+
+__all__ = ["get_healthz", "get_readyz"]
+
+from aiohttp import web
+
+from ltdevents.handlers import internal_routes
+from ltdevents.health import check_readiness
+
+
+@internal_routes.get("/healthz")
+async def get_healthz(request: web.Request) -> web.Response:
+    """GET /healthz (internal endpoint).
+
+    This is the liveness probe. It responds with 200 as long as the
+    application is serving requests, regardless of the state of Kafka and the
+    Schema Registry, so that an outage of those services doesn't restart the
+    pods.
+    """
+    return web.json_response({"status": "ok"})
+
+
+@internal_routes.get("/readyz")
+async def get_readyz(request: web.Request) -> web.Response:
+    """GET /readyz (internal endpoint).
+
+    This is the readiness probe. It responds with 200 if the application can
+    accept webhook events, or 503 otherwise, with the result of each check
+    (see `ltdevents.health`). The checks only read cached state.
+    """
+    ready, checks = check_readiness(request.config_dict)
+    return web.json_response(
+        {"status": "ready" if ready else "unready", "checks": checks},
+        status=200 if ready else 503,
+    )
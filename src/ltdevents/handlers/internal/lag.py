@@ -0,0 +1,29 @@
+"""Handlers for the internal ``/lag`` endpoint."""
+
+__all__ = ["get_lag"]
+
+from aiohttp import web
+
+from ltdevents.handlers import internal_routes
+
+
+@internal_routes.get("/lag")
+async def get_lag(request: web.Request) -> web.Response:
+    """GET /lag (internal endpoint).
+
+    This endpoint summarizes the ingestion lag of the events acknowledged
+    within the rolling window (see `ltdevents.lag`): the number of events and
+    the median, 90th and 99th percentiles, and maximum of the ``receipt``,
+    ``publish``, and ``end_to_end`` lags, in seconds, for all events and by
+    event type. If lag tracking is disabled, the response status is 404.
+
+    With several worker processes, the summary only covers the events
+    acknowledged by the worker that handles the request (see
+    `ltdevents.workers`).
+    """
+    lag_tracker = request.config_dict["ltdevents/lag_tracker"]
+    if lag_tracker is None:
+        return web.json_response(
+            {"error": "Lag tracking is disabled."}, status=404
+        )
+    return web.json_response(lag_tracker.summary())
@@ -0,0 +1,24 @@
+"""Handlers for the internal ``/metrics`` endpoint."""
+
+__all__ = ["get_metrics"]
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from ltdevents.handlers import internal_routes
+
+
+@internal_routes.get("/metrics")
+async def get_metrics(request: web.Request) -> web.Response:
+    """GET /metrics (internal endpoint).
+
+    This endpoint serves the application's metrics in the Prometheus text
+    format (see `ltdevents.metrics`). With several worker processes, the
+    metrics are those of the worker that handles the request (see
+    `ltdevents.workers`).
+    """
+    metrics = request.config_dict["ltdevents/metrics"]
+    return web.Response(
+        body=generate_latest(metrics.registry),
+        headers={"Content-Type": CONTENT_TYPE_LATEST},
+    )
@@ -1,64 +1,496 @@
 """Handlers for the internal ``/webhook/`` endpoint."""
 
-__all__ = ["post_webhook"]
+__all__ = ["post_webhook", "post_webhook_batch", "get_webhook_queue"]
 
+import asyncio
+import math
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import orjson
 import pydantic
 from aiohttp import web
 
+from ltdevents.admission import admission_controlled
+from ltdevents.eventregistry import EventType
 from ltdevents.handlers import internal_routes
-from ltdevents.webhookmodels import EditionUpdatedEvent, parse_event
+from ltdevents.publisher import OutboundMessage
+from ltdevents.resilience import CircuitOpenError
+from ltdevents.signatures import check_signature
 
 
 @internal_routes.post("/webhook")
+@admission_controlled
 async def post_webhook(request: web.Request) -> web.Response:
     """Handle ``POST /webhook`` (internal endpoint).
 
     This endpoint is the general purpose handler for all webhook payloads from
     LTD Keeper, and converts them into Kafka messages.
 
-    Since this endpoint is only exposed to the internal Kubernetes network,
-    we trust the payloads. The next step will be to add payload verification.
+    If webhook keys are configured, the body must be signed with one of the
+    keys in the ``X-LTD-Signature`` header, or the response status is 401
+    (see `ltdevents.signatures`).
+
+    The response status is 200 if the message was acknowledged by the Kafka
+    broker (``sync`` delivery mode), or 202 if the message was accepted into
+    the publish queue (``queue`` delivery mode).
+
+    Repeated ``edition.updated`` events may be de-duplicated (see
+    `ltdevents.dedup`). A dropped duplicate gets the same response as a
+    published event, and an event that is held for coalescing gets a 202
+    response. Events are only remembered for de-duplication once they're
+    published, so a retry of a webhook that failed isn't dropped.
+
+    When the service is saturated, the response status is 429 or 503, with a
+    ``Retry-After`` header (see `ltdevents.admission`). While the Kafka
+    circuit breaker is open, the response status is 503, with a
+    ``Retry-After`` header (see `ltdevents.resilience`).
+
+    Once published, events are also delivered to the configured fan-out
+    sinks (see `ltdevents.sinks`), without waiting for the delivery, and
+    added to the event store (see `ltdevents.eventstore`). Events that fail
+    to publish aren't delivered, so that LTD Keeper's retry doesn't deliver
+    them twice. A held event is delivered once its coalesced message is
+    published, and isn't delivered if a later event replaces it. An event
+    that isn't held is only published after the held event for the same
+    message key, so that the events for an edition stay in order.
+
+    Success logs are sampled and error logs are rate-limited (see
+    `ltdevents.logsampling`).
+
+    The ingestion lag of accepted events is tracked from their
+    ``event_timestamp`` to their acknowledgement (see `ltdevents.lag`).
+
+    With a latest-state topic (the ``state_kafka_topic`` configuration),
+    edition events are also published to that topic (see
+    `ltdevents.eventregistry.EventRegistry.state_message`). State messages
+    aren't held for coalescing, so that an edition's tombstone is never
+    overtaken by an earlier update.
     """
+    received = time.time()
     logger = request["safir/logger"]
-    logger.debug("New webhook event")
-    payload = await request.json()
+    log = request.config_dict["ltdevents/webhook_logging"]
+    log.debug(logger, "New webhook event")
+    metrics = request.config_dict["ltdevents/metrics"]
+    body = await request.read()
+    rejection = check_signature(request, body)
+    if rejection is not None:
+        return rejection
+    timer = metrics.timer()
     try:
-        event = parse_event(payload=payload, logger=logger)
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        log.error(logger, "Invalid webhook body", info=str(e))
+        metrics.count_event("unknown", "invalid")
+        return web.json_response(
+            {"error": f"Body isn't valid JSON: {e}"}, status=400
+        )
+    timer.lap("decode")
+    event_registry = request.config_dict["ltdevents/event_registry"]
+    try:
+        event_type, record = event_registry.parse(payload)
     except pydantic.ValidationError as e:
-        logger.error("Validation error", info=e.json())
-        return web.json_response({"error": e.json()}, status=400)
+        error = e.json()
+        log.error(logger, "Validation error", info=error)
+        metrics.count_event(payload["event_type"], "invalid")
+        return web.json_response({"error": error}, status=400)
     except RuntimeError as e:
-        logger.error("Validation error", info=str(e))
+        log.error(logger, "Validation error", info=str(e))
+        metrics.count_event("unknown", "invalid")
         return web.json_response({"error": str(e)}, status=400)
+    timer.lap("validate")
 
-    logger.debug("Parsed webhook", webhookevent=event)
+    if log.debug_enabled:
+        logger.debug("Parsed webhook", webhookevent=record)
 
-    producer = request.config_dict["safir/kafka_producer"]
-    schema_manager = request.config_dict["safir/schema_manager"]
-    kafka_topic = request.config_dict["safir/config"].events_kafka_topic
+    publisher = request.config_dict["ltdevents/publisher"]
+    deduplicator = request.config_dict["ltdevents/deduplicator"]
 
-    if event.event_type == "edition.updated":
-        assert isinstance(event, EditionUpdatedEvent)
+    if deduplicator.is_duplicate(event_type, record):
+        log.success(
+            logger, "Dropped duplicate webhook", event_type=event_type.name
+        )
+        metrics.count_event(event_type.name, "duplicate")
+        return web.Response(status=publisher.accepted_status)
 
-        key_bytes = await schema_manager.serialize(
-            data={
-                "product_slug": event.product.slug,
-                "edition_slug": event.edition.slug,
-            },
-            name="ltd.edition_key_v1",
+    message = await serialize_event(event_type, record, request)
+    state_message = event_registry.state_message(event_type, message)
+    lag_tracker = request.config_dict["ltdevents/lag_tracker"]
+    if lag_tracker is not None:
+        message.on_ack = lag_tracker.track(event_type.name, record, received)
+    timer.lap("serialize")
+    held = deduplicator.hold(
+        event_type,
+        record,
+        message,
+        on_publish=partial(deliver_event, request, event_type, record),
+    )
+    try:
+        if held:
+            if state_message is not None:
+                await publisher.publish(state_message)
+        else:
+            await deduplicator.flush(message)
+            if state_message is None:
+                await publisher.publish(message)
+            else:
+                errors: List[Optional[BaseException]] = (
+                    await publisher.publish_batch([message, state_message])
+                )
+                for publish_error in errors:
+                    if publish_error is not None:
+                        raise publish_error
+    except CircuitOpenError as e:
+        metrics.count_event(event_type.name, "failed")
+        log.error(logger, "Kafka circuit breaker is open", level="warning")
+        return web.json_response(
+            {"error": str(e)},
+            status=503,
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
         )
-        value_bytes = await schema_manager.serialize(
-            data=event.dict(), name="ltd.edition_update_v1"
+    except Exception:
+        metrics.count_event(event_type.name, "failed")
+        raise
+    if held:
+        log.success(
+            logger, "Holding webhook to coalesce", event_type=event_type.name
+        )
+        metrics.count_event(event_type.name, "accepted")
+        return web.Response(status=202)
+    timer.lap("publish")
+    deduplicator.remember(event_type, record)
+    deliver_event(request, event_type, record)
+    metrics.count_event(event_type.name, "accepted")
+    log.success(
+        logger,
+        "Published Kafka message",
+        event_type=event_type.name,
+        topic=message.topic,
+    )
+
+    return web.Response(status=publisher.accepted_status)
+
+
+@internal_routes.post("/webhook/batch")
+@admission_controlled
+async def post_webhook_batch(request: web.Request) -> web.Response:
+    """Handle ``POST /webhook/batch`` (internal endpoint).
+
+    This endpoint accepts many webhook payloads in one request, either as a
+    JSON array or as newline-delimited JSON (with an
+    ``application/x-ndjson`` content type). All valid payloads are published
+    as a single producer batch.
+
+    The valid payloads are serialized (and enriched, see
+    `ltdevents.enrichment`) concurrently. In the stage metrics, decoding,
+    serialization, and publishing are timed for the whole batch, while
+    validation is timed for each payload.
+
+    The response is a JSON object with a ``results`` array that has a status
+    for each payload, in order:
+
+    - ``status``: 200 (acknowledged by Kafka), 202 (accepted into the publish
+      queue), 400 (invalid payload), 500 (failed to publish), or 503 (not
+      published because the Kafka circuit breaker is open).
+    - ``error``: a description of the error, if any.
+
+    The whole body is signed, as for ``POST /webhook``.
+
+    Latest-state messages are published in the same producer batch, after
+    the event messages. A payload whose state message fails has a 500
+    status.
+
+    As for ``POST /webhook``, only the published payloads are delivered to
+    the fan-out sinks and added to the event store, in order (held payloads
+    are delivered once their coalesced message is published), and held
+    messages are published before later messages for the same key.
+    """
+    received = time.time()
+    logger = request["safir/logger"]
+    log = request.config_dict["ltdevents/webhook_logging"]
+    metrics = request.config_dict["ltdevents/metrics"]
+    body = await request.read()
+    rejection = check_signature(request, body)
+    if rejection is not None:
+        return rejection
+    timer = metrics.timer()
+    try:
+        payloads = parse_batch_body(body, content_type=request.content_type)
+    except ValueError as e:
+        log.error(logger, "Invalid webhook batch", info=str(e))
+        return web.json_response({"error": str(e)}, status=400)
+    timer.lap("decode")
+    log.debug(logger, "New webhook batch", size=len(payloads))
+
+    event_registry = request.config_dict["ltdevents/event_registry"]
+    publisher = request.config_dict["ltdevents/publisher"]
+    deduplicator = request.config_dict["ltdevents/deduplicator"]
+    lag_tracker = request.config_dict["ltdevents/lag_tracker"]
+
+    results: List[Dict[str, Any]] = []
+    parsed: List[Tuple[int, EventType, Dict[str, Any]]] = []
+    messages: List[OutboundMessage] = []
+    message_indices: List[int] = []
+    message_events: List[Tuple[EventType, Dict[str, Any]]] = []
+    state_messages: List[OutboundMessage] = []
+    state_indices: List[int] = []
+    accepted: List[Tuple[int, EventType, Dict[str, Any]]] = []
+    releasing: Set[asyncio.Task] = set()
+    for index, payload in enumerate(payloads):
+        if isinstance(payload, ValueError):
+            results.append({"status": 400, "error": str(payload)})
+            metrics.count_event("unknown", "invalid")
+            continue
+        if not isinstance(payload, dict):
+            results.append(
+                {"status": 400, "error": "Payload must be a JSON object."}
+            )
+            metrics.count_event("unknown", "invalid")
+            continue
+        timer.reset()
+        try:
+            event_type, record = event_registry.parse(payload)
+        except pydantic.ValidationError as e:
+            results.append({"status": 400, "error": e.json()})
+            metrics.count_event(payload["event_type"], "invalid")
+            continue
+        except RuntimeError as e:
+            results.append({"status": 400, "error": str(e)})
+            metrics.count_event("unknown", "invalid")
+            continue
+        timer.lap("validate")
+
+        if deduplicator.is_duplicate(event_type, record):
+            results.append({"status": publisher.accepted_status})
+            metrics.count_event(event_type.name, "duplicate")
+            continue
+        results.append({"status": publisher.accepted_status})
+        parsed.append((index, event_type, record))
+
+    timer.reset()
+    serialized = await asyncio.gather(
+        *(
+            serialize_event(event_type, record, request)
+            for _, event_type, record in parsed
         )
+    )
+    timer.lap("serialize")
+    for (index, event_type, record), message in zip(parsed, serialized):
+        state_message = event_registry.state_message(event_type, message)
+        if state_message is not None:
+            state_messages.append(state_message)
+            state_indices.append(index)
+        if lag_tracker is not None:
+            message.on_ack = lag_tracker.track(
+                event_type.name, record, received
+            )
+        if deduplicator.hold(
+            event_type,
+            record,
+            message,
+            on_publish=partial(deliver_event, request, event_type, record),
+        ):
+            results[index] = {"status": 202}
+            metrics.count_event(event_type.name, "accepted")
+            continue
+        releasing |= deduplicator.release_before(message)
+        messages.append(message)
+        message_indices.append(index)
+        message_events.append((event_type, record))
 
-        await producer.send_and_wait(
-            kafka_topic, key=key_bytes, value=value_bytes
+    timer.reset()
+    if releasing:
+        await asyncio.wait(releasing)
+    errors = await publisher.publish_batch(messages + state_messages)
+    timer.lap("publish")
+    for index, error in zip(state_indices, errors[len(messages) :]):
+        if error is not None:
+            results[index] = _error_result(error)
+    for index, (event_type, record), error in zip(
+        message_indices, message_events, errors
+    ):
+        if error is not None:
+            results[index] = _error_result(error)
+        if results[index]["status"] >= 500:
+            metrics.count_event(event_type.name, "failed")
+        else:
+            deduplicator.remember(event_type, record)
+            accepted.append((index, event_type, record))
+            metrics.count_event(event_type.name, "accepted")
+    for _, event_type, record in sorted(accepted, key=lambda a: a[0]):
+        deliver_event(request, event_type, record)
+
+    rejected = sum(1 for r in results if r["status"] >= 400)
+    if rejected:
+        log.error(
+            logger,
+            "Webhook batch had failures",
+            size=len(results),
+            failed=rejected,
         )
-        logger.debug(
-            "Sent Kafka message",
-            event_type="edition.updated",
-            product=event.product.slug,
-            edition=event.edition.slug,
+    log.success(
+        logger,
+        "Published Kafka message batch",
+        size=len(results),
+        sent=len(messages) + len(state_messages),
+    )
+
+    return web.json_response({"results": results})
+
+
+@internal_routes.get("/webhook/queue")
+async def get_webhook_queue(request: web.Request) -> web.Response:
+    """Handle ``GET /webhook/queue`` (internal endpoint).
+
+    This endpoint reports the delivery mode and the number of messages
+    waiting in the publish queue. With admission control, it also reports
+    the number of webhook requests in flight and queued, and the number of
+    rejected requests by reason. With fan-out sinks, it reports the queue
+    depth and delivery counts of each sink. With the Kafka circuit breaker,
+    it reports the breaker's state.
+
+    With several worker processes, the state is that of the worker that
+    handles the request, identified by the ``worker`` field (see
+    `ltdevents.workers`).
+    """
+    config = request.config_dict["safir/config"]
+    publisher = request.config_dict["ltdevents/publisher"]
+    data: Dict[str, Any] = {
+        "worker": config.worker_index,
+        "delivery_mode": config.delivery_mode,
+        "depth": publisher.depth,
+        "max_size": publisher.max_size,
+    }
+    admission = request.config_dict["ltdevents/admission"]
+    if admission is not None:
+        data["admission"] = {
+            "in_flight": admission.in_flight,
+            "max_in_flight": admission.max_in_flight,
+            "queued": admission.queued,
+            "max_queued": admission.max_queued,
+            "rejected": dict(admission.rejected),
+        }
+    fanout = request.config_dict["ltdevents/fanout"]
+    if fanout is not None:
+        data["sinks"] = fanout.stats()
+    breaker = request.config_dict["ltdevents/circuit_breaker"]
+    if breaker is not None:
+        data["circuit_breaker"] = breaker.stats()
+    return web.json_response(data)
+
+
+def deliver_event(
+    request: web.Request, event_type: EventType, record: Dict[str, Any]
+) -> None:
+    """Deliver an accepted event to the fan-out sinks (see `ltdevents.sinks`)
+    and add it to the event store (see `ltdevents.eventstore`), if they're
+    configured.
+
+    Parameters
+    ----------
+    request : `aiohttp.web.Request`
+        The request, which provides access to the application's fan-out and
+        event store.
+    event_type : `ltdevents.eventregistry.EventType`
+        The event type of the record.
+    record : `dict`
+        The parsed webhook event record.
+    """
+    fanout = request.config_dict["ltdevents/fanout"]
+    if fanout is not None:
+        fanout.offer(record)
+    event_store = request.config_dict["ltdevents/event_store"]
+    if event_store is not None:
+        event_store.add(event_type.name, record)
+
+
+def _error_result(error: BaseException) -> Dict[str, Any]:
+    status = 503 if isinstance(error, CircuitOpenError) else 500
+    return {"status": status, "error": str(error)}
+
+
+async def serialize_event(
+    event_type: EventType, record: Dict[str, Any], request: web.Request
+) -> OutboundMessage:
+    """Serialize a parsed webhook event into a Kafka message.
+
+    Parameters
+    ----------
+    event_type : `ltdevents.eventregistry.EventType`
+        The event type of the record.
+    record : `dict`
+        The parsed webhook event record (see
+        `ltdevents.eventregistry.EventRegistry.parse`).
+    request : `aiohttp.web.Request`
+        The request, which provides access to the application's event
+        registry and serializers.
+
+    Returns
+    -------
+    message : `ltdevents.publisher.OutboundMessage`
+        The Kafka message.
+
+    Notes
+    -----
+    If the schemas aren't registered yet (with the ``background`` or
+    ``lazy`` schema registration modes), this waits for the registration.
+
+    With enrichment, records of event types that have an enriched value
+    schema are enriched with resources from LTD Keeper first (see
+    `ltdevents.enrichment`).
+    """
+    registration = request.config_dict["ltdevents/schema_registration"]
+    serializers = await registration.get_serializers()
+    event_registry = request.config_dict["ltdevents/event_registry"]
+    enricher = request.config_dict["ltdevents/enricher"]
+    if enricher is not None and event_type.enriched_value_schema is not None:
+        enriched = await enricher.enrich(record)
+        return event_registry.serialize(
+            event_type, enriched, serializers, enriched=True
         )
+    return event_registry.serialize(event_type, record, serializers)
 
-    return web.Response(status=200)
+
+def parse_batch_body(body: bytes, *, content_type: str) -> List[Any]:
+    """Parse the body of a ``POST /webhook/batch`` request.
+
+    Parameters
+    ----------
+    body : `bytes`
+        The request body.
+    content_type : `str`
+        The request's content type. ``application/x-ndjson`` bodies are
+        parsed as newline-delimited JSON, and other bodies are parsed as a
+        JSON array.
+
+    Returns
+    -------
+    payloads : `list`
+        The payloads. For newline-delimited JSON, lines that can't be decoded
+        are represented by a `ValueError` so that the other payloads can
+        still be processed.
+
+    Raises
+    ------
+    ValueError
+        Raised if a JSON body can't be decoded, or isn't an array.
+    """
+    if content_type == "application/x-ndjson":
+        payloads: List[Any] = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                payloads.append(orjson.loads(line))
+            except ValueError as e:
+                payloads.append(ValueError(f"Invalid JSON: {e}"))
+        return payloads
+
+    try:
+        data = orjson.loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(data, list):
+        raise ValueError("Batch payload must be a JSON array.")
+    return data
@@ -0,0 +1,150 @@
+"""Readiness checks of the application's dependencies.
+
+The ``/readyz`` endpoint reports whether the application can accept
+webhook events, so that Kubernetes only routes traffic to pods that can. The
+checks only read state that the application already keeps, and never make
+network requests, so that probes stay cheap:
+
+``kafka_producer``
+    The producer has cluster metadata from a broker (the producer's cached
+    metadata, which aiokafka refreshes in the background), and the Kafka
+    circuit breaker (see `ltdevents.resilience`) isn't open. In the
+    ``queue`` and ``spool`` delivery modes, webhook events are buffered
+    while Kafka is unavailable, so these problems are reported but don't
+    fail the check (they would otherwise take every pod out of service at
+    once, and defeat the buffering).
+
+``publisher``
+    The publish queue isn't full.
+
+``schema_registration``
+    The Avro schemas are registered. With the ``lazy`` registration mode,
+    a registration that hasn't started yet doesn't make the application
+    unready, but a failed registration does.
+
+Dependencies that aren't configured (no Kafka broker or Schema Registry)
+pass their checks.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional, Tuple
+
+__all__ = [
+    "check_kafka_producer",
+    "check_publisher",
+    "check_schema_registration",
+    "check_readiness",
+]
+
+if TYPE_CHECKING:
+    from aiokafka import AIOKafkaProducer
+
+    from ltdevents.publisher import Publisher
+    from ltdevents.resilience import CircuitBreaker
+    from ltdevents.schemaregistration import SchemaRegistration
+
+    CheckResult = Dict[str, Any]
+
+
+def check_kafka_producer(
+    producer: Optional[AIOKafkaProducer],
+    breaker: Optional[CircuitBreaker] = None,
+    *,
+    buffered: bool = False,
+) -> CheckResult:
+    """Check that the Kafka producer knows of at least one broker and that
+    the Kafka circuit breaker isn't open.
+
+    Parameters
+    ----------
+    producer : `aiokafka.AIOKafkaProducer`, optional
+        The Kafka producer, or `None` if Kafka isn't configured.
+    breaker : `ltdevents.resilience.CircuitBreaker`, optional
+        The circuit breaker of the Kafka producer, if it's enabled.
+    buffered : `bool`, optional
+        `True` if the delivery mode buffers webhook events while Kafka is
+        unavailable, in which case the check passes with a ``buffering``
+        field that reports the problem.
+    """
+    if producer is None:
+        return {"ok": True, "status": "not configured"}
+    brokers = len(producer.client.cluster.brokers())
+    result: CheckResult = {"brokers": brokers}
+    if breaker is not None and breaker.state == "open":
+        result["status"] = "circuit open"
+        result["retry_after"] = round(breaker.retry_after, 3)
+    elif brokers == 0:
+        result["status"] = "no brokers"
+    else:
+        result["ok"] = True
+        result["status"] = "connected"
+        return result
+    result["ok"] = buffered
+    if buffered:
+        result["buffering"] = True
+    return result
+
+
+def check_publisher(publisher: Publisher) -> CheckResult:
+    """Check that the publish queue isn't full."""
+    full = publisher.max_size > 0 and publisher.depth >= publisher.max_size
+    return {
+        "ok": not full,
+        "status": "full" if full else "accepting",
+        "depth": publisher.depth,
+        "max_size": publisher.max_size,
+    }
+
+
+def check_schema_registration(
+    registration: Optional[SchemaRegistration], *, mode: str
+) -> CheckResult:
+    """Check that the Avro schemas are registered, or (in the ``lazy``
+    registration mode) that the registration hasn't failed.
+    """
+    if registration is None:
+        return {"ok": True, "status": "not configured"}
+    if registration.ready:
+        return {"ok": True, "status": "registered"}
+    if registration.last_error is not None:
+        return {
+            "ok": False,
+            "status": "failed",
+            "error": registration.last_error,
+        }
+    return {"ok": mode == "lazy", "status": "pending"}
+
+
+def check_readiness(
+    config_dict: Mapping[str, Any]
+) -> Tuple[bool, Dict[str, Any]]:
+    """Run the readiness checks.
+
+    Parameters
+    ----------
+    config_dict : mapping
+        The application's state, such as the ``config_dict`` of a request.
+
+    Returns
+    -------
+    ready : `bool`
+        `True` if every check passes.
+    checks : `dict`
+        The result of each check, by name. Each result has an ``ok`` boolean
+        and a ``status`` string.
+    """
+    config = config_dict["safir/config"]
+    checks = {
+        "kafka_producer": check_kafka_producer(
+            config_dict["safir/kafka_producer"],
+            config_dict["ltdevents/circuit_breaker"],
+            buffered=config.delivery_mode in ("queue", "spool"),
+        ),
+        "publisher": check_publisher(config_dict["ltdevents/publisher"]),
+        "schema_registration": check_schema_registration(
+            config_dict["ltdevents/schema_registration"],
+            mode=config.schema_registration,
+        ),
+    }
+    return all(check["ok"] for check in checks.values()), checks
@@ -0,0 +1,204 @@
+"""Tracking of the ingestion lag of webhook events.
+
+Each webhook payload has an ``event_timestamp``: the time when LTD Keeper
+generated the event. The `LagTracker` (available from the
+``"ltdevents/lag_tracker"`` application key) measures how long each accepted
+event takes to reach Kafka, in three segments:
+
+``receipt``
+    From the ``event_timestamp`` to the time the webhook request was
+    received.
+``publish``
+    From the receipt of the webhook to the broker's acknowledgement of the
+    message (including any time spent in the publish queue, the spool, or
+    held for coalescing).
+``end_to_end``
+    From the ``event_timestamp`` to the broker's acknowledgement.
+
+The lags are observed in the ``ltdevents_event_lag_seconds`` histogram, by
+segment, event type, and product, and kept in a rolling window of recent
+samples whose quantiles are served by the internal ``GET /lag`` endpoint.
+
+Lags are measured with the wall clock, since the ``event_timestamp`` is a
+wall-clock time. A lag that is negative because of clock skew between LTD
+Keeper and this service is recorded as 0.
+"""
+
+from __future__ import annotations
+
+import datetime
+import functools
+import math
+import time
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Sequence,
+)
+
+__all__ = ["LAG_SEGMENTS", "LagSample", "LagTracker"]
+
+if TYPE_CHECKING:
+    from ltdevents.metrics import WebhookMetrics
+
+LAG_SEGMENTS = ("receipt", "publish", "end_to_end")
+"""The segments of the ingestion lag."""
+
+_QUANTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+
+class LagSample(NamedTuple):
+    """The lags of an acknowledged event."""
+
+    acknowledged: float
+    """The wall-clock time when the message was acknowledged."""
+
+    event_type: str
+    """The event type name."""
+
+    receipt: float
+    """The lag, in seconds, from the ``event_timestamp`` to receipt."""
+
+    publish: float
+    """The time, in seconds, from receipt to acknowledgement."""
+
+    end_to_end: float
+    """The lag, in seconds, from the ``event_timestamp`` to
+    acknowledgement.
+    """
+
+
+class LagTracker:
+    """Measures the ingestion lag of events.
+
+    Parameters
+    ----------
+    metrics : `ltdevents.metrics.WebhookMetrics`
+        The metrics that lags are observed in.
+    window : `float`
+        The time, in seconds, that samples are kept for the rolling summary.
+    max_samples : `int`
+        The maximum number of samples kept for the rolling summary.
+    clock : callable, optional
+        The wall clock, which returns the time in seconds since the epoch.
+        The default is `time.time`.
+    """
+
+    def __init__(
+        self,
+        metrics: WebhookMetrics,
+        *,
+        window: float,
+        max_samples: int,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.window = window
+        self.max_samples = max_samples
+        self._metrics = metrics
+        self._clock = clock
+        self._samples: Deque[LagSample] = deque(maxlen=max_samples)
+
+    def track(
+        self, event_type: str, record: Mapping[str, Any], received: float
+    ) -> Callable[[], None]:
+        """Start tracking an accepted event.
+
+        The receipt lag is observed immediately.
+
+        Parameters
+        ----------
+        event_type : `str`
+            The event type name.
+        record : `dict`
+            The validated record.
+        received : `float`
+            The wall-clock time when the webhook was received.
+
+        Returns
+        -------
+        acknowledged : callable
+            The function to call once the event's message is acknowledged by
+            the broker (see `ltdevents.publisher.OutboundMessage.on_ack`).
+        """
+        product = record.get("product", {}).get("slug", "")
+        event_time = _epoch_seconds(record["event_timestamp"])
+        receipt = max(0.0, received - event_time)
+        self._metrics.observe_lag("receipt", event_type, product, receipt)
+        return functools.partial(
+            self._acknowledged, event_type, product, received, receipt
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarize the lags of the events acknowledged within the window.
+
+        Returns
+        -------
+        summary : `dict`
+            The window length, and the number of samples and the quantiles
+            and maximum of each lag segment, for all events
+            (``"all"``) and by event type (``"event_types"``).
+        """
+        self._expire()
+        by_type: Dict[str, List[LagSample]] = {}
+        for sample in self._samples:
+            by_type.setdefault(sample.event_type, []).append(sample)
+        return {
+            "window_seconds": self.window,
+            "all": _summarize(list(self._samples)),
+            "event_types": {
+                name: _summarize(samples)
+                for name, samples in sorted(by_type.items())
+            },
+        }
+
+    def _acknowledged(
+        self, event_type: str, product: str, received: float, receipt: float
+    ) -> None:
+        now = self._clock()
+        publish = max(0.0, now - received)
+        end_to_end = receipt + publish
+        metrics = self._metrics
+        metrics.observe_lag("publish", event_type, product, publish)
+        metrics.observe_lag("end_to_end", event_type, product, end_to_end)
+        self._samples.append(
+            LagSample(now, event_type, receipt, publish, end_to_end)
+        )
+
+    def _expire(self) -> None:
+        """Drop the samples that are older than the window."""
+        horizon = self._clock() - self.window
+        samples = self._samples
+        while samples and samples[0].acknowledged < horizon:
+            samples.popleft()
+
+
+def _summarize(samples: Sequence[LagSample]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"count": len(samples)}
+    for segment in LAG_SEGMENTS:
+        values = sorted(getattr(sample, segment) for sample in samples)
+        stats: Dict[str, Any] = {}
+        for name, quantile in _QUANTILES:
+            stats[name] = _nearest_rank(values, quantile)
+        stats["max"] = values[-1] if values else None
+        summary[segment] = stats
+    return summary
+
+
+def _nearest_rank(values: Sequence[float], quantile: float) -> Any:
+    if not values:
+        return None
+    rank = max(1, math.ceil(quantile * len(values)))
+    return values[rank - 1]
+
+
+def _epoch_seconds(timestamp: datetime.datetime) -> float:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.timestamp()
@@ -0,0 +1,124 @@
+"""Logging helpers for the webhook hot path.
+
+The cost of logging shouldn't grow with the webhook volume. The
+`WebhookLogging` helper, available from the ``"ltdevents/webhook_logging"``
+application key, provides:
+
+- A check of whether debug logging is enabled (which the standard library
+  caches), so that handlers skip building debug events, and rendering event
+  payloads, unless the events are output.
+- Sampling of the high-volume success logs: only every Nth success event is
+  logged, with a ``sampled`` field that has the sampling interval.
+- Rate limiting of error logs: at most a burst of errors for each event name
+  is logged per interval, and the number of suppressed errors is reported
+  with the next logged error.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Callable, Dict, List
+
+__all__ = ["WebhookLogging"]
+
+
+class WebhookLogging:
+    """Level-aware, sampled, and rate-limited logging for webhook handlers.
+
+    The methods take the logger to log with, so that request-bound loggers
+    (the ``"safir/logger"`` request key) keep their context.
+
+    Parameters
+    ----------
+    logger_name : `str`
+        Name of the application's logger, whose level decides whether debug
+        logging is enabled.
+    sample_every : `int`, optional
+        Log every Nth success event.
+    error_burst : `int`, optional
+        The maximum number of errors with the same event name that are
+        logged per interval.
+    error_interval : `float`, optional
+        The rate-limiting interval for errors, in seconds.
+    clock : callable, optional
+        The clock, which returns the time in seconds. The default is
+        `time.monotonic`.
+    """
+
+    def __init__(
+        self,
+        logger_name: str,
+        *,
+        sample_every: int = 1,
+        error_burst: int = 10,
+        error_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.sample_every = max(1, sample_every)
+        self.error_burst = max(1, error_burst)
+        self.error_interval = error_interval
+        self._stdlib_logger = logging.getLogger(logger_name)
+        self._clock = clock
+        self._success_counts: Dict[str, int] = {}
+        # For each error event: [window start, errors logged, suppressed]
+        self._error_windows: Dict[str, List[Any]] = {}
+
+    @property
+    def debug_enabled(self) -> bool:
+        """Whether debug logging is enabled.
+
+        Check this before building an expensive debug event.
+        """
+        return self._stdlib_logger.isEnabledFor(logging.DEBUG)
+
+    def debug(self, logger: Any, event: str, **kwargs: Any) -> None:
+        """Log a debug event, if debug logging is enabled."""
+        if self._stdlib_logger.isEnabledFor(logging.DEBUG):
+            logger.debug(event, **kwargs)
+
+    def success(self, logger: Any, event: str, **kwargs: Any) -> None:
+        """Log a sample of a high-volume success event, at the debug level.
+
+        Only every ``sample_every``-th event with the same name is logged.
+        """
+        if not self._stdlib_logger.isEnabledFor(logging.DEBUG):
+            return
+        if self.sample_every > 1:
+            count = self._success_counts.get(event, 0) + 1
+            if count < self.sample_every:
+                self._success_counts[event] = count
+                return
+            self._success_counts[event] = 0
+            kwargs["sampled"] = self.sample_every
+        logger.debug(event, **kwargs)
+
+    def error(
+        self, logger: Any, event: str, *, level: str = "error", **kwargs: Any
+    ) -> None:
+        """Log an error event, unless errors with the same name exceed the
+        rate limit.
+
+        Parameters
+        ----------
+        logger
+            The structlog logger.
+        event : `str`
+            The event name, which is also the rate-limiting key.
+        level : `str`, optional
+            The log level method: ``error`` or ``warning``.
+        **kwargs
+            The event's fields.
+        """
+        now = self._clock()
+        window = self._error_windows.get(event)
+        if window is None or now - window[0] >= self.error_interval:
+            suppressed = window[2] if window is not None else 0
+            window = self._error_windows[event] = [now, 0, 0]
+            if suppressed:
+                kwargs["suppressed"] = suppressed
+        if window[1] >= self.error_burst:
+            window[2] += 1
+            return
+        window[1] += 1
+        getattr(logger, level)(event, **kwargs)
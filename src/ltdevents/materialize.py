@@ -0,0 +1,702 @@
+"""Materialization of the current state of each edition from Kafka.
+
+The ``ltdevents materialize`` command consumes the events topic and keeps
+the latest ``edition.updated`` (or ``edition.deleted``) record of each
+edition in a local SQLite database, so that consumers can look up the
+current state of editions without replaying the topic.
+
+The database (`EditionStore`) uses write-ahead logging, and each batch of
+consumed messages is applied in a single transaction that also records the
+next offset of each partition. Since the offsets are committed atomically
+with the data, a restarted materializer resumes from where the database
+left off, and no message is applied twice.
+
+Messages are decoded with the application's Avro schemas
+(`MessageDecoder`), so that no Schema Registry requests are needed for
+the schemas that this application publishes. The materializer only reads
+from the Schema Registry, and never registers schemas. Messages that can't
+be decoded (`MessageDecodeError`), and edition records that are malformed,
+are skipped, but if the Schema Registry fails (a Schema Registry or HTTP
+error), the batch is retried with exponential backoff instead, so that the
+materializer never commits offsets past messages that it could decode later.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+import aiohttp
+import fastavro
+import structlog
+from aiohttp import web
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from kafkit.registry.aiohttp import RegistryApi
+from kafkit.registry.errors import RegistryBadRequestError, RegistryError
+from kafkit.registry.manager import RecordNameSchemaManager
+from kafkit.registry.serializer import unpack_wire_format_data
+from safir.events import configure_kafka_ssl
+from safir.http import init_http_session
+
+from ltdevents.config import Configuration
+
+__all__ = [
+    "EditionState",
+    "EditionStore",
+    "MessageDecodeError",
+    "MessageDecoder",
+    "MaterializeProgress",
+    "run_materializer",
+    "materialize",
+]
+
+if TYPE_CHECKING:
+    from kafkit.registry.sansio import RegistryApi as SansioRegistryApi
+
+    PartitionKey = Tuple[str, int]
+
+
+@dataclass(frozen=True)
+class EditionState:
+    """The latest state of an edition."""
+
+    product: str
+    """The product slug."""
+
+    edition: str
+    """The edition slug."""
+
+    event_type: str
+    """The type of the latest event: ``edition.updated`` or
+    ``edition.deleted``.
+    """
+
+    event_timestamp: int
+    """The ``event_timestamp`` of the latest event, in milliseconds since the
+    epoch.
+    """
+
+    record: Dict[str, Any]
+    """The latest record."""
+
+    @property
+    def deleted(self) -> bool:
+        """Whether the edition is deleted."""
+        return self.event_type == "edition.deleted"
+
+    @classmethod
+    def from_record(cls, record: Mapping[str, Any]) -> EditionState:
+        """Create the state from an ``edition.updated`` or
+        ``edition.deleted`` record.
+        """
+        timestamp = record["event_timestamp"]
+        if isinstance(timestamp, datetime.datetime):
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+            timestamp = int(timestamp.timestamp() * 1000)
+        return cls(
+            product=record["product"]["slug"],
+            edition=record["edition"]["slug"],
+            event_type=record["event_type"],
+            event_timestamp=timestamp,
+            record=dict(record),
+        )
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS editions (
+    product TEXT NOT NULL,
+    edition TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    event_timestamp INTEGER NOT NULL,
+    deleted INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (product, edition)
+);
+CREATE INDEX IF NOT EXISTS editions_event_timestamp
+    ON editions (event_timestamp);
+CREATE TABLE IF NOT EXISTS offsets (
+    topic TEXT NOT NULL,
+    partition INTEGER NOT NULL,
+    next_offset INTEGER NOT NULL,
+    PRIMARY KEY (topic, partition)
+);
+"""
+
+_UPSERT = """
+INSERT INTO editions
+    (product, edition, event_type, event_timestamp, deleted, record)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (product, edition) DO UPDATE SET
+    event_type = excluded.event_type,
+    event_timestamp = excluded.event_timestamp,
+    deleted = excluded.deleted,
+    record = excluded.record
+WHERE excluded.event_timestamp >= editions.event_timestamp
+"""
+
+_SAVE_OFFSET = """
+INSERT INTO offsets (topic, partition, next_offset) VALUES (?, ?, ?)
+ON CONFLICT (topic, partition) DO UPDATE SET
+    next_offset = excluded.next_offset
+"""
+
+
+class EditionStore:
+    """A SQLite database of the latest state of each edition.
+
+    Parameters
+    ----------
+    path : `pathlib.Path`
+        The path of the database file, which is created if it doesn't exist.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._connection = sqlite3.connect(str(path), isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the latest transactions on power loss,
+        # which are then consumed again from their stored offsets
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+    def offsets(self, topic: str) -> Dict[int, int]:
+        """Get the next offset of each partition of a topic."""
+        rows = self._connection.execute(
+            "SELECT partition, next_offset FROM offsets WHERE topic = ?",
+            (topic,),
+        )
+        return {partition: offset for partition, offset in rows}
+
+    def apply(
+        self,
+        states: Iterable[EditionState],
+        offsets: Mapping[PartitionKey, int],
+    ) -> None:
+        """Upsert edition states and save the next offsets, in one
+        transaction.
+
+        An edition's state is only replaced by a state with the same or a
+        later ``event_timestamp``.
+
+        Parameters
+        ----------
+        states : iterable of `EditionState`
+            The edition states, in the order they were consumed.
+        offsets : `dict`
+            The next offset of each consumed partition, by topic and
+            partition.
+        """
+        connection = self._connection
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(
+                _UPSERT,
+                (
+                    (
+                        state.product,
+                        state.edition,
+                        state.event_type,
+                        state.event_timestamp,
+                        int(state.deleted),
+                        json.dumps(state.record, default=str),
+                    )
+                    for state in states
+                ),
+            )
+            connection.executemany(
+                _SAVE_OFFSET,
+                (
+                    (topic, partition, offset)
+                    for (topic, partition), offset in offsets.items()
+                ),
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def get(self, product: str, edition: str) -> Optional[EditionState]:
+        """Get the state of an edition."""
+        row = self._connection.execute(
+            "SELECT event_type, event_timestamp, record FROM editions "
+            "WHERE product = ? AND edition = ?",
+            (product, edition),
+        ).fetchone()
+        if row is None:
+            return None
+        return EditionState(
+            product=product,
+            edition=edition,
+            event_type=row[0],
+            event_timestamp=row[1],
+            record=json.loads(row[2]),
+        )
+
+    def editions(
+        self, product: str, *, include_deleted: bool = False
+    ) -> List[EditionState]:
+        """Get the states of a product's editions, by edition slug."""
+        query = (
+            "SELECT edition, event_type, event_timestamp, record "
+            "FROM editions WHERE product = ?"
+        )
+        if not include_deleted:
+            query += " AND deleted = 0"
+        query += " ORDER BY edition"
+        return [
+            EditionState(
+                product=product,
+                edition=edition,
+                event_type=event_type,
+                event_timestamp=event_timestamp,
+                record=json.loads(record),
+            )
+            for edition, event_type, event_timestamp, record in (
+                self._connection.execute(query, (product,))
+            )
+        ]
+
+
+class MessageDecodeError(Exception):
+    """Raised when a message isn't in the Confluent Wire Format, its schema
+    doesn't exist, or its body doesn't match its schema.
+    """
+
+
+class MessageDecoder:
+    """Decodes Avro messages in the Confluent Wire Format.
+
+    Messages with the application's schemas are decoded without Schema
+    Registry requests. Other schemas are fetched from the Schema Registry by
+    ID, once.
+
+    Parameters
+    ----------
+    registry : `kafkit.registry.sansio.RegistryApi`
+        The Schema Registry client.
+    schemas : `dict`
+        Known schemas, by Schema Registry ID.
+    """
+
+    def __init__(
+        self,
+        registry: SansioRegistryApi,
+        schemas: Mapping[int, Mapping[str, Any]],
+    ) -> None:
+        self._registry = registry
+        self._parsed: Dict[int, Tuple[str, Any]] = {
+            schema_id: (schema["name"], fastavro.parse_schema(dict(schema)))
+            for schema_id, schema in schemas.items()
+        }
+
+    @classmethod
+    async def from_manager(
+        cls, manager: RecordNameSchemaManager, registry: SansioRegistryApi
+    ) -> MessageDecoder:
+        """Create a decoder for a schema manager's schemas.
+
+        The IDs of the schemas are looked up in the client's cache, or else
+        with the Schema Registry's ``POST /subjects/(subject)`` endpoint,
+        which finds a registered schema without registering it. Schemas that
+        aren't registered are left out, since no message can have them.
+        """
+        schemas = {}
+        for name, schema in manager.schemas.items():
+            schema_id = await _lookup_schema_id(registry, schema, name)
+            if schema_id is not None:
+                schemas[schema_id] = schema
+        return cls(registry, schemas)
+
+    async def decode(self, data: bytes) -> Tuple[str, Dict[str, Any]]:
+        """Decode a message.
+
+        Returns
+        -------
+        name : `str`
+            The name of the message's schema.
+        record : `dict`
+            The decoded record.
+
+        Raises
+        ------
+        MessageDecodeError
+            Raised if the message can't be decoded.
+        kafkit.registry.errors.RegistryError
+            Raised if the Schema Registry fails (other errors of the HTTP
+            session, such as `aiohttp.ClientError`, are also raised). The
+            message may be decoded once the Schema Registry is available.
+        """
+        try:
+            schema_id, body = unpack_wire_format_data(data)
+        except RuntimeError as e:
+            raise MessageDecodeError(str(e)) from e
+        parsed = self._parsed.get(schema_id)
+        if parsed is None:
+            try:
+                schema = await self._registry.get_schema_by_id(schema_id)
+            except RegistryBadRequestError as e:
+                if e.status_code == 404:
+                    raise MessageDecodeError(
+                        f"Unknown schema ID {schema_id}"
+                    ) from e
+                raise
+            try:
+                parsed = (schema["name"], fastavro.parse_schema(schema))
+            except Exception as e:
+                raise MessageDecodeError(
+                    f"Invalid schema {schema_id}: {e}"
+                ) from e
+            self._parsed[schema_id] = parsed
+        name, parsed_schema = parsed
+        try:
+            record = fastavro.schemaless_reader(BytesIO(body), parsed_schema)
+        except Exception as e:
+            # The body is arbitrary bytes, so the reader can fail in many ways
+            raise MessageDecodeError(
+                f"Invalid message body for schema {name}: {e!r}"
+            ) from e
+        return name, record
+
+
+async def _lookup_schema_id(
+    registry: SansioRegistryApi, schema: Mapping[str, Any], subject: str
+) -> Optional[int]:
+    """Look up the ID of a registered schema, or `None` if the schema isn't
+    registered under the subject.
+    """
+    try:
+        return registry.schema_cache[schema]
+    except KeyError:
+        pass
+    try:
+        result = await registry.post(
+            "/subjects{/subject}",
+            url_vars={"subject": subject},
+            data={"schema": json.dumps(dict(schema), sort_keys=True)},
+        )
+    except RegistryBadRequestError as e:
+        if e.status_code == 404:
+            return None
+        raise
+    registry.schema_cache.insert(schema, result["id"])
+    return result["id"]
+
+
+@dataclass
+class MaterializeProgress:
+    """Counts of the messages consumed by the materializer."""
+
+    consumed: int = 0
+    """The number of messages consumed."""
+
+    applied: int = 0
+    """The number of edition states upserted."""
+
+    skipped: int = 0
+    """The number of messages that aren't about editions, or couldn't be
+    decoded.
+    """
+
+    retries: int = 0
+    """The number of times a batch was retried because the Schema Registry
+    failed.
+    """
+
+    def format(self) -> str:
+        """Format a one-line progress report."""
+        return (
+            f"Consumed {self.consumed} messages: {self.applied} edition "
+            f"states applied, {self.skipped} skipped"
+        )
+
+
+EDITION_EVENT_TYPES = ("edition.updated", "edition.deleted")
+
+
+async def run_materializer(
+    consumer: AIOKafkaConsumer,
+    store: EditionStore,
+    decoder: MessageDecoder,
+    *,
+    topic: str,
+    batch_size: int = 500,
+    batch_timeout: float = 1.0,
+    stop: Optional[asyncio.Event] = None,
+    on_progress: Optional[Callable[[MaterializeProgress], None]] = None,
+    progress_interval: float = 10.0,
+    retry_delay: float = 1.0,
+    max_retry_delay: float = 60.0,
+    logger_name: str = "ltdevents",
+) -> MaterializeProgress:
+    """Consume a topic into the edition store.
+
+    The consumer is assigned all partitions of the topic, starting from the
+    offsets saved in the store (or the beginning of each partition).
+
+    Messages that can't be decoded are skipped. If the Schema Registry fails
+    while a batch is decoded, the batch is decoded again after a delay that
+    doubles with each failure. If the materializer is stopped meanwhile, the
+    batch isn't applied, so it's consumed again once the materializer
+    restarts.
+
+    Parameters
+    ----------
+    consumer : `aiokafka.AIOKafkaConsumer`
+        The started consumer, without a group and with automatic offset
+        commits disabled.
+    store : `EditionStore`
+        The edition store.
+    decoder : `MessageDecoder`
+        The message decoder.
+    topic : `str`
+        The topic.
+    batch_size : `int`, optional
+        The maximum number of messages applied in one transaction.
+    batch_timeout : `float`, optional
+        The maximum time, in seconds, to wait for a batch.
+    stop : `asyncio.Event`, optional
+        The materializer stops, after applying the current batch, once this
+        event is set. If `None`, it runs until cancelled.
+    on_progress : callable, optional
+        Called with the progress periodically and at the end.
+    progress_interval : `float`, optional
+        The time, in seconds, between calls of ``on_progress``.
+    retry_delay : `float`, optional
+        The initial delay, in seconds, before a batch is decoded again after
+        a Schema Registry failure.
+    max_retry_delay : `float`, optional
+        The maximum delay, in seconds, between retries.
+    logger_name : `str`, optional
+        Name of the logger.
+
+    Returns
+    -------
+    progress : `MaterializeProgress`
+        The final counts.
+    """
+    logger = structlog.get_logger(logger_name)
+    partitions = [
+        TopicPartition(topic, partition)
+        for partition in sorted(consumer.partitions_for_topic(topic) or ())
+    ]
+    if not partitions:
+        raise RuntimeError(f"Topic {topic} doesn't exist.")
+    consumer.assign(partitions)
+    saved_offsets = store.offsets(topic)
+    for tp in partitions:
+        if tp.partition in saved_offsets:
+            consumer.seek(tp, saved_offsets[tp.partition])
+        else:
+            await consumer.seek_to_beginning(tp)
+
+    progress = MaterializeProgress()
+    last_progress = time.monotonic()
+    while stop is None or not stop.is_set():
+        batches = await consumer.getmany(
+            timeout_ms=int(batch_timeout * 1000), max_records=batch_size
+        )
+        if not batches:
+            continue
+        decoded = await _decode_batch(
+            decoder,
+            batches,
+            progress,
+            stop=stop,
+            retry_delay=retry_delay,
+            max_retry_delay=max_retry_delay,
+            logger=logger,
+        )
+        if decoded is None:
+            # Stopped while the Schema Registry was failing
+            break
+        states, skipped = decoded
+        offsets: Dict[PartitionKey, int] = {
+            (tp.topic, tp.partition): messages[-1].offset + 1
+            for tp, messages in batches.items()
+        }
+        store.apply(states, offsets)
+        progress.consumed += sum(len(m) for m in batches.values())
+        progress.skipped += skipped
+        progress.applied += len(states)
+
+        now = time.monotonic()
+        if on_progress is not None and (
+            now - last_progress >= progress_interval
+        ):
+            on_progress(progress)
+            last_progress = now
+
+    if on_progress is not None:
+        on_progress(progress)
+    return progress
+
+
+async def _decode_batch(
+    decoder: MessageDecoder,
+    batches: Mapping[TopicPartition, List[Any]],
+    progress: MaterializeProgress,
+    *,
+    stop: Optional[asyncio.Event],
+    retry_delay: float,
+    max_retry_delay: float,
+    logger: Any,
+) -> Optional[Tuple[List[EditionState], int]]:
+    delay = retry_delay
+    while True:
+        states: List[EditionState] = []
+        skipped = 0
+        try:
+            for messages in batches.values():
+                for message in messages:
+                    state = await _decode_state(decoder, message.value, logger)
+                    if state is None:
+                        skipped += 1
+                    else:
+                        states.append(state)
+            return states, skipped
+        except (
+            RegistryError,
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ) as e:
+            progress.retries += 1
+            logger.warning(
+                "Retrying batch after Schema Registry failure",
+                error=str(e),
+                delay=delay,
+            )
+        if stop is None:
+            await asyncio.sleep(delay)
+        else:
+            try:
+                await asyncio.wait_for(stop.wait(), delay)
+                return None
+            except asyncio.TimeoutError:
+                pass
+        delay = min(delay * 2, max_retry_delay)
+
+
+async def _decode_state(
+    decoder: MessageDecoder, value: Optional[bytes], logger: Any
+) -> Optional[EditionState]:
+    if value is None:
+        return None
+    try:
+        _, record = await decoder.decode(value)
+    except MessageDecodeError as e:
+        logger.warning("Skipped undecodable message", error=str(e))
+        return None
+    if record.get("event_type") not in EDITION_EVENT_TYPES:
+        return None
+    try:
+        return EditionState.from_record(record)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning("Skipped malformed edition record", error=repr(e))
+        return None
+
+
+async def materialize(
+    database: Path,
+    *,
+    topic: Optional[str] = None,
+    batch_size: int = 500,
+    stop: Optional[asyncio.Event] = None,
+    on_progress: Optional[Callable[[MaterializeProgress], None]] = None,
+    progress_interval: float = 10.0,
+) -> MaterializeProgress:
+    """Consume the events topic into an edition store, with the Kafka and
+    Schema Registry configuration of the application.
+
+    Parameters
+    ----------
+    database : `pathlib.Path`
+        The path of the SQLite database.
+    topic : `str`, optional
+        The topic. The default is the ``events_kafka_topic``
+        configuration.
+    batch_size : `int`, optional
+        The maximum number of messages applied in one transaction.
+    stop : `asyncio.Event`, optional
+        The materializer stops once this event is set.
+    on_progress : callable, optional
+        Called with the progress periodically and at the end.
+    progress_interval : `float`, optional
+        The time, in seconds, between calls of ``on_progress``.
+
+    Returns
+    -------
+    progress : `MaterializeProgress`
+        The final counts.
+    """
+    config = Configuration()
+    if config.kafka_broker_url is None or config.schema_registry_url is None:
+        raise RuntimeError(
+            "Materializing requires the SAFIR_KAFKA_BROKER_URL and "
+            "SAFIR_SCHEMA_REGISTRY_URL environment variables."
+        )
+
+    # Run the HTTP session and Kafka SSL cleanup contexts, without serving
+    app = web.Application()
+    app["safir/config"] = config
+    app.cleanup_ctx.append(init_http_session)
+    app.cleanup_ctx.append(configure_kafka_ssl)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    store = EditionStore(database)
+    try:
+        registry = RegistryApi(
+            session=app["safir/http_session"], url=config.schema_registry_url
+        )
+        manager = RecordNameSchemaManager(
+            root=Path(__file__).parent / "schemas",
+            suffix=config.schema_suffix,
+            registry=registry,
+        )
+        decoder = await MessageDecoder.from_manager(manager, registry)
+        consumer = AIOKafkaConsumer(
+            loop=asyncio.get_running_loop(),
+            bootstrap_servers=config.kafka_broker_url,
+            ssl_context=app["safir/kafka_ssl_context"],
+            security_protocol=config.kafka_protocol,
+            enable_auto_commit=False,
+        )
+        await consumer.start()
+        try:
+            return await run_materializer(
+                consumer,
+                store,
+                decoder,
+                topic=topic or config.events_kafka_topic,
+                batch_size=batch_size,
+                stop=stop,
+                on_progress=on_progress,
+                progress_interval=progress_interval,
+                logger_name=config.logger_name,
+            )
+        finally:
+            await consumer.stop()
+    finally:
+        store.close()
+        await runner.cleanup()
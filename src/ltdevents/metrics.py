@@ -0,0 +1,412 @@
+"""Prometheus metrics for the webhook pipeline.
+
+The metrics are collected in a `prometheus_client.CollectorRegistry` that
+belongs to the application (rather than the global default registry), and
+are served by the internal ``GET /metrics`` endpoint.
+
+Recording is designed for the hot path: labelled metric children are
+created once and cached, and handlers time their stages with a
+`StageTimer`, which takes a single `time.perf_counter` reading per stage.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+from aiohttp import web
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from ltdevents.resilience import CIRCUIT_STATES
+
+if TYPE_CHECKING:
+    from ltdevents.admission import AdmissionController
+    from ltdevents.dedup import Coalescer
+    from ltdevents.publisher import QueuedPublisher
+    from ltdevents.resilience import CircuitBreaker
+
+__all__ = [
+    "STAGES",
+    "WebhookMetrics",
+    "StageTimer",
+    "setup_metrics",
+    "metrics_middleware",
+]
+
+STAGES = ("decode", "validate", "serialize", "publish")
+"""The stages of the webhook pipeline that are timed."""
+
+_STAGE_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+"""Histogram buckets, in seconds, for the pipeline stages (which are
+typically in the tens of microseconds, except for the Kafka send).
+"""
+
+_LAG_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+    600.0,
+)
+"""Histogram buckets, in seconds, for the ingestion lag of events (see
+`ltdevents.lag`), which spans network latency to minutes of queueing.
+"""
+
+
+class WebhookMetrics:
+    """Metrics for the webhook pipeline, available from the
+    ``"ltdevents/metrics"`` application key.
+
+    Parameters
+    ----------
+    registry : `prometheus_client.CollectorRegistry`, optional
+        The registry to collect metrics in. A new registry is created by
+        default.
+    """
+
+    def __init__(self, registry: Optional[CollectorRegistry] = None) -> None:
+        self.registry = registry or CollectorRegistry(auto_describe=True)
+
+        self.events = Counter(
+            "ltdevents_webhook_events",
+            "Webhook events received, by event type and outcome.",
+            ["event_type", "outcome"],
+            registry=self.registry,
+        )
+        self.stage_seconds = Histogram(
+            "ltdevents_webhook_stage_seconds",
+            "Time spent in each stage of the webhook pipeline.",
+            ["stage"],
+            buckets=_STAGE_BUCKETS,
+            registry=self.registry,
+        )
+        self.suppressed = Counter(
+            "ltdevents_webhook_suppressed",
+            "Webhook events suppressed by de-duplication, by event type and "
+            "reason.",
+            ["event_type", "reason"],
+            registry=self.registry,
+        )
+        self.lag_seconds = Histogram(
+            "ltdevents_event_lag_seconds",
+            "Ingestion lag of events, by segment (receipt, publish, or "
+            "end_to_end), event type, and product.",
+            ["segment", "event_type", "product"],
+            buckets=_LAG_BUCKETS,
+            registry=self.registry,
+        )
+        self.request_seconds = Histogram(
+            "ltdevents_http_request_seconds",
+            "Time spent handling HTTP requests.",
+            ["method", "route", "status"],
+            registry=self.registry,
+        )
+
+        self._stages = {
+            stage: self.stage_seconds.labels(stage) for stage in STAGES
+        }
+        self._events: Dict[Tuple[str, str], Any] = {}
+        self._requests: Dict[Tuple[str, str, int], Any] = {}
+        self._lags: Dict[Tuple[str, str, str], Any] = {}
+
+    def timer(self) -> StageTimer:
+        """Start timing the stages of a webhook."""
+        return StageTimer(self._stages)
+
+    def count_event(self, event_type: str, outcome: str) -> None:
+        """Count a webhook event.
+
+        Parameters
+        ----------
+        event_type : `str`
+            The event type, or ``unknown`` if the payload doesn't have a known
+            event type.
+        outcome : `str`
+            The outcome: ``accepted``, ``invalid``, ``unauthorized`` (the
+            signature isn't valid), ``duplicate`` (dropped by
+            de-duplication), or ``failed`` (if the message couldn't be
+            published).
+        """
+        key = (event_type, outcome)
+        try:
+            child = self._events[key]
+        except KeyError:
+            child = self._events[key] = self.events.labels(*key)
+        child.inc()
+
+    def count_suppressed(self, event_type: str, reason: str) -> None:
+        """Count a webhook event that was suppressed by de-duplication.
+
+        Parameters
+        ----------
+        event_type : `str`
+            The event type.
+        reason : `str`
+            The reason: ``duplicate`` (dropped as a repeat of a recent event)
+            or ``coalesced`` (replaced by a later event).
+        """
+        self.suppressed.labels(event_type, reason).inc()
+
+    def observe_lag(
+        self, segment: str, event_type: str, product: str, seconds: float
+    ) -> None:
+        """Record a segment of the ingestion lag of an event (see
+        `ltdevents.lag`).
+        """
+        key = (segment, event_type, product)
+        try:
+            child = self._lags[key]
+        except KeyError:
+            child = self._lags[key] = self.lag_seconds.labels(*key)
+        child.observe(seconds)
+
+    def observe_request(
+        self, method: str, route: str, status: int, seconds: float
+    ) -> None:
+        """Record the duration of an HTTP request."""
+        key = (method, route, status)
+        try:
+            child = self._requests[key]
+        except KeyError:
+            child = self._requests[key] = self.request_seconds.labels(
+                method, route, str(status)
+            )
+        child.observe(seconds)
+
+    def track_admission(self, controller: AdmissionController) -> None:
+        """Report the state of the webhook admission controller (see
+        `ltdevents.admission`).
+
+        The number of requests in flight and queued, and the number of
+        rejected requests by reason, are read from the controller when the
+        metrics are collected.
+        """
+        self.registry.register(_AdmissionCollector(controller))
+
+    def track_circuit_breaker(self, breaker: CircuitBreaker) -> None:
+        """Report the state of the Kafka circuit breaker (see
+        `ltdevents.resilience`).
+
+        The state, and the number of trips and rejected sends, are read from
+        the breaker when the metrics are collected.
+        """
+        self.registry.register(_CircuitBreakerCollector(breaker))
+
+    def track_publish_queue(self, publisher: QueuedPublisher) -> None:
+        """Report the number of messages that the ``queue`` delivery mode
+        dropped (see `ltdevents.publisher.QueuedPublisher`).
+
+        The count is read from the publisher when the metrics are collected.
+        """
+        self.registry.register(_PublishQueueCollector(publisher))
+
+    def track_coalescer(self, coalescer: Coalescer) -> None:
+        """Report the number of coalesced messages that failed to publish
+        (see `ltdevents.dedup.Coalescer`).
+
+        The count is read from the coalescer when the metrics are collected.
+        """
+        self.registry.register(_CoalescerCollector(coalescer))
+
+
+class _AdmissionCollector:
+    """A Prometheus collector for the state of an admission controller."""
+
+    def __init__(self, controller: AdmissionController) -> None:
+        self._controller = controller
+
+    def collect(self) -> Iterator[Any]:
+        controller = self._controller
+        yield GaugeMetricFamily(
+            "ltdevents_webhook_in_flight",
+            "Webhook requests being handled.",
+            value=controller.in_flight,
+        )
+        yield GaugeMetricFamily(
+            "ltdevents_webhook_in_flight_limit",
+            "Maximum number of webhook requests handled at once.",
+            value=controller.max_in_flight,
+        )
+        yield GaugeMetricFamily(
+            "ltdevents_webhook_queued",
+            "Webhook requests waiting to be handled.",
+            value=controller.queued,
+        )
+        rejected = CounterMetricFamily(
+            "ltdevents_webhook_rejected",
+            "Webhook requests rejected by admission control, by reason.",
+            labels=["reason"],
+        )
+        for reason, count in controller.rejected.items():
+            rejected.add_metric([reason], count)
+        yield rejected
+
+
+class _CircuitBreakerCollector:
+    """A Prometheus collector for the state of a circuit breaker."""
+
+    def __init__(self, breaker: CircuitBreaker) -> None:
+        self._breaker = breaker
+
+    def collect(self) -> Iterator[Any]:
+        breaker = self._breaker
+        state = GaugeMetricFamily(
+            "ltdevents_kafka_circuit_state",
+            "State of the Kafka circuit breaker (1 for the current state).",
+            labels=["state"],
+        )
+        current = breaker.state
+        for name in CIRCUIT_STATES:
+            state.add_metric([name], 1 if name == current else 0)
+        yield state
+        yield CounterMetricFamily(
+            "ltdevents_kafka_circuit_trips",
+            "Number of times the Kafka circuit breaker opened.",
+            value=breaker.trips,
+        )
+        yield CounterMetricFamily(
+            "ltdevents_kafka_circuit_rejected",
+            "Kafka sends rejected while the circuit breaker was open.",
+            value=breaker.rejected,
+        )
+
+
+class _PublishQueueCollector:
+    """A Prometheus collector for the messages dropped by a publish
+    queue.
+    """
+
+    def __init__(self, publisher: QueuedPublisher) -> None:
+        self._publisher = publisher
+
+    def collect(self) -> Iterator[Any]:
+        yield CounterMetricFamily(
+            "ltdevents_publish_dropped",
+            "Enqueued messages that failed to send to Kafka, or weren't "
+            "sent before shutdown.",
+            value=self._publisher.dropped,
+        )
+
+
+class _CoalescerCollector:
+    """A Prometheus collector for the coalesced messages that failed to
+    publish.
+    """
+
+    def __init__(self, coalescer: Coalescer) -> None:
+        self._coalescer = coalescer
+
+    def collect(self) -> Iterator[Any]:
+        yield CounterMetricFamily(
+            "ltdevents_coalesce_failed",
+            "Coalesced messages that failed to publish once released.",
+            value=self._coalescer.failed,
+        )
+
+
+class StageTimer:
+    """A timer for the stages of the webhook pipeline.
+
+    Each call to `lap` records the time since the previous lap (or since the
+    timer was created) in the stage's histogram.
+
+    Parameters
+    ----------
+    stages : `dict`
+        Mapping of stage names to labelled histogram children.
+    """
+
+    __slots__ = ("_stages", "_last")
+
+    def __init__(self, stages: Dict[str, Any]) -> None:
+        self._stages = stages
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        """Record the time spent in a stage.
+
+        Parameters
+        ----------
+        stage : `str`
+            The stage, one of `STAGES`.
+        """
+        now = time.perf_counter()
+        self._stages[stage].observe(now - self._last)
+        self._last = now
+
+    def reset(self) -> None:
+        """Restart the timer without recording a stage."""
+        self._last = time.perf_counter()
+
+
+def setup_metrics(app: web.Application) -> None:
+    """Set up the application's metrics and the middleware that records
+    request durations.
+
+    This should only be called for the root application, since the root
+    application's middleware also handles requests for sub-applications.
+    """
+    app["ltdevents/metrics"] = WebhookMetrics()
+    app.middlewares.append(metrics_middleware)
+
+
+@web.middleware
+async def metrics_middleware(
+    request: web.Request,
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    """Record the duration of each request by method, route, and status."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else "unmatched"
+        request.config_dict["ltdevents/metrics"].observe_request(
+            request.method, route, status, time.perf_counter() - start
+        )
@@ -0,0 +1,103 @@
+"""Creation of the Kafka producer.
+
+`init_kafka_producer` replaces `safir.events.init_kafka_producer` so that the
+producer's compression, batching, acknowledgement, and idempotence settings
+can be tuned through the `ltdevents.config.Configuration` (see
+`producer_settings`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, Union
+
+import structlog
+from aiokafka import AIOKafkaProducer
+
+__all__ = ["producer_settings", "init_kafka_producer"]
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+    from ltdevents.config import Configuration
+
+
+def producer_settings(config: Configuration) -> Dict[str, Any]:
+    """Get the tuning keyword arguments of `aiokafka.AIOKafkaProducer` from
+    the configuration.
+
+    Parameters
+    ----------
+    config : `ltdevents.config.Configuration`
+        The application configuration.
+
+    Returns
+    -------
+    settings : `dict`
+        The ``compression_type``, ``linger_ms``, ``max_batch_size``,
+        ``acks``, and ``enable_idempotence`` arguments.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if idempotent delivery is enabled without ``acks="all"``.
+    """
+    acks: Union[int, str] = config.kafka_acks
+    if acks != "all":
+        acks = int(acks)
+    if config.kafka_enable_idempotence and acks != "all":
+        raise RuntimeError(
+            "Idempotent delivery (SAFIR_KAFKA_ENABLE_IDEMPOTENCE) requires "
+            f"SAFIR_KAFKA_ACKS to be 'all'. Value is {config.kafka_acks}"
+        )
+    compression_type = config.kafka_compression_type
+    return {
+        "compression_type": (
+            None if compression_type == "none" else compression_type
+        ),
+        "linger_ms": config.kafka_linger_ms,
+        "max_batch_size": config.kafka_max_batch_size,
+        "acks": acks,
+        "enable_idempotence": config.kafka_enable_idempotence,
+    }
+
+
+async def init_kafka_producer(app: web.Application) -> AsyncGenerator:
+    """Create and start the Kafka producer, and make it available as the
+    ``"safir/kafka_producer"`` key on the application.
+
+    If the Kafka broker isn't configured, the key is `None`.
+
+    Notes
+    -----
+    Use this function as a cleanup context after
+    `safir.events.configure_kafka_ssl`.
+    """
+    config = app["safir/config"]
+    logger = structlog.get_logger(config.logger_name)
+
+    if config.kafka_broker_url is None:
+        logger.info(
+            "Kafka broker is not configured, skipping producer creation"
+        )
+        app["safir/kafka_producer"] = None
+        yield
+        return
+
+    settings = producer_settings(config)
+    logger.info("Starting Kafka producer", **settings)
+    producer = AIOKafkaProducer(
+        loop=asyncio.get_running_loop(),
+        bootstrap_servers=config.kafka_broker_url,
+        ssl_context=app["safir/kafka_ssl_context"],
+        security_protocol=config.kafka_protocol,
+        **settings,
+    )
+    await producer.start()
+    app["safir/kafka_producer"] = producer
+    logger.info("Finished starting Kafka producer")
+
+    yield
+
+    logger.info("Shutting down Kafka producer")
+    await producer.stop()
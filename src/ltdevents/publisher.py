@@ -0,0 +1,675 @@
+"""Delivery of serialized messages to Kafka.
+
+The ``/webhook`` handlers hand serialized messages to a publisher, which is
+available from the ``"ltdevents/publisher"`` application key. The
+``delivery_mode`` configuration selects the publisher:
+
+``sync``
+    `DirectPublisher` waits for the broker to acknowledge each message.
+
+``queue``
+    `QueuedPublisher` enqueues messages into an in-process queue and returns
+    immediately. A background task drains the queue into batched sends.
+    Messages that fail to send, or that are still queued when the drain
+    timeout passes on shutdown, are dropped and counted.
+
+``spool``
+    `SpooledPublisher` appends messages to a durable local spool
+    (`ltdevents.spool.Spool`) and returns once the message is on disk. A
+    background task forwards spooled messages to Kafka in order.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
+
+import structlog
+
+from ltdevents.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientProducer,
+    RetryPolicy,
+)
+from ltdevents.spool import Spool, worker_spool_dirs
+
+__all__ = [
+    "OutboundMessage",
+    "DirectPublisher",
+    "QueuedPublisher",
+    "SpooledPublisher",
+    "Publisher",
+    "send_batch",
+    "init_publisher",
+]
+
+if TYPE_CHECKING:
+    from aiohttp import web
+    from aiokafka import AIOKafkaProducer
+
+
+@dataclass
+class OutboundMessage:
+    """A serialized message that is ready to be sent to Kafka."""
+
+    topic: str
+    """The name of the Kafka topic."""
+
+    key: bytes
+    """The Avro-encoded message key (Confluent Wire Format)."""
+
+    value: Optional[bytes]
+    """The Avro-encoded message value (Confluent Wire Format), or `None` for
+    a tombstone, which deletes the key from a compacted topic.
+    """
+
+    partition: Optional[int] = None
+    """The Kafka partition, or `None` to let the producer's partitioner
+    choose the partition from the key.
+    """
+
+    on_ack: Optional[Callable[[], None]] = None
+    """A function that's called once the broker acknowledges the message
+    (for example, to measure its lag with `ltdevents.lag.LagTracker`).
+    """
+
+
+class DirectPublisher:
+    """A publisher that sends each message and waits for the broker's
+    acknowledgement.
+
+    Parameters
+    ----------
+    producer : `aiokafka.AIOKafkaProducer`
+        The Kafka producer.
+    """
+
+    accepted_status = 200
+    """The HTTP status that a webhook responds with once a message is
+    published.
+    """
+
+    max_size = 0
+    """The capacity of the publish queue (this publisher has no queue)."""
+
+    def __init__(self, producer: AIOKafkaProducer) -> None:
+        self._producer = producer
+
+    @property
+    def depth(self) -> int:
+        """The number of messages waiting to be sent (always 0)."""
+        return 0
+
+    async def start(self) -> None:
+        """Start the publisher (no-op)."""
+        pass
+
+    async def publish(self, message: OutboundMessage) -> None:
+        """Send a message and wait for the broker's acknowledgement."""
+        await self._producer.send_and_wait(
+            message.topic,
+            key=message.key,
+            value=message.value,
+            partition=message.partition,
+        )
+        if message.on_ack is not None:
+            message.on_ack()
+
+    async def publish_batch(
+        self, messages: Sequence[OutboundMessage]
+    ) -> List[Optional[BaseException]]:
+        """Send several messages as one producer batch and wait for the
+        broker's acknowledgements.
+
+        Returns
+        -------
+        errors : `list`
+            For each message, `None` if the message was acknowledged, or the
+            exception raised while sending it.
+        """
+        return await send_batch(self._producer, messages)
+
+    async def close(self) -> None:
+        """Close the publisher (no-op)."""
+        pass
+
+
+class QueuedPublisher:
+    """A publisher that enqueues messages and sends them in batches from a
+    background task.
+
+    Parameters
+    ----------
+    producer : `aiokafka.AIOKafkaProducer`
+        The Kafka producer.
+    max_size : `int`
+        The maximum number of messages in the queue. `publish` waits for
+        space once the queue is full, which applies backpressure to the
+        webhook handlers.
+    batch_size : `int`
+        The maximum number of messages sent in one batch.
+    linger : `float`
+        The time, in seconds, to wait for more messages to fill a batch.
+    breaker : `ltdevents.resilience.CircuitBreaker`, optional
+        The circuit breaker of the producer. While the circuit is open,
+        messages are rejected with `ltdevents.resilience.CircuitOpenError`
+        instead of being enqueued, since they would fail to send.
+    drain_timeout : `float`
+        The maximum time, in seconds, that `close` waits for enqueued
+        messages to be sent. Messages that aren't sent are dropped.
+    logger_name : `str`
+        Name of the structlog logger.
+    """
+
+    accepted_status = 202
+    """The HTTP status that a webhook responds with once a message is
+    enqueued.
+    """
+
+    def __init__(
+        self,
+        producer: AIOKafkaProducer,
+        *,
+        max_size: int,
+        batch_size: int,
+        linger: float,
+        breaker: Optional[CircuitBreaker] = None,
+        drain_timeout: float = 5.0,
+        logger_name: str = "ltdevents",
+    ) -> None:
+        self._producer = producer
+        self._breaker = breaker
+        self.drain_timeout = drain_timeout
+        self.dropped = 0
+        """The number of enqueued messages that failed to send, or weren't
+        sent before the drain timeout.
+        """
+
+        self._queue: asyncio.Queue[OutboundMessage] = asyncio.Queue(
+            maxsize=max_size
+        )
+        self.max_size = max_size
+        self.batch_size = max(1, batch_size)
+        self.linger = max(0.0, linger)
+        self._logger = structlog.get_logger(logger_name)
+        self._task: Union[asyncio.Task[None], None] = None
+
+    @property
+    def depth(self) -> int:
+        """The number of messages waiting in the queue."""
+        return self._queue.qsize()
+
+    async def start(self) -> None:
+        """Start the background task that drains the queue."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def publish(self, message: OutboundMessage) -> None:
+        """Enqueue a message, waiting for space if the queue is full.
+
+        Raises
+        ------
+        ltdevents.resilience.CircuitOpenError
+            Raised if the producer's circuit breaker is open.
+        """
+        if self._breaker is not None:
+            self._breaker.check_closed()
+        await self._queue.put(message)
+
+    async def publish_batch(
+        self, messages: Sequence[OutboundMessage]
+    ) -> List[Optional[BaseException]]:
+        """Enqueue several messages, waiting for space if the queue is full.
+
+        Returns
+        -------
+        errors : `list`
+            `None` for each message, or, if the producer's circuit breaker is
+            open, a `ltdevents.resilience.CircuitOpenError` for each message.
+        """
+        if self._breaker is not None:
+            try:
+                self._breaker.check_closed()
+            except CircuitOpenError as e:
+                return [e] * len(messages)
+        for message in messages:
+            await self._queue.put(message)
+        return [None] * len(messages)
+
+    async def close(self) -> None:
+        """Wait (up to the drain timeout) for enqueued messages to be sent
+        to Kafka, then stop the background task.
+        """
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        unsent = self.depth
+        if unsent:
+            self.dropped += unsent
+            self._logger.error(
+                "Dropped messages left in publish queue", count=unsent
+            )
+        else:
+            self._logger.info("Flushed publish queue")
+
+    async def _run(self) -> None:
+        """Drain the queue into batched sends until cancelled."""
+        while True:
+            batch = await self._collect_batch()
+            try:
+                self.dropped += await self._send_batch(batch)
+            except asyncio.CancelledError:
+                # Closed before the drain timeout passed
+                self.dropped += len(batch)
+                raise
+            except Exception as e:
+                # Keep draining, so that the queue doesn't fill up for good
+                self.dropped += len(batch)
+                self._logger.exception(
+                    "Failed to send queued Kafka messages",
+                    batch_size=len(batch),
+                    error=str(e),
+                )
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _collect_batch(self) -> List[OutboundMessage]:
+        """Wait for a message and gather more messages into a batch until
+        the batch is full or the linger time has passed.
+        """
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(
+                    await asyncio.wait_for(self._queue.get(), timeout)
+                )
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _send_batch(self, batch: List[OutboundMessage]) -> int:
+        """Hand a batch of messages to the producer and wait for the
+        broker's acknowledgements.
+
+        Returns
+        -------
+        failed : `int`
+            The number of messages that failed to send.
+        """
+        errors = await send_batch(self._producer, batch)
+        failures = [e for e in errors if e is not None]
+        if failures:
+            self._logger.error(
+                "Failed to send queued Kafka messages",
+                failed=len(failures),
+                batch_size=len(batch),
+                error=str(failures[0]),
+            )
+        else:
+            self._logger.debug("Sent queued Kafka messages", count=len(batch))
+        return len(failures)
+
+
+class SpooledPublisher:
+    """A publisher that appends messages to a durable local spool and
+    forwards them to Kafka from a background task.
+
+    Messages are forwarded in spool order. If sending a batch fails, the
+    batch is retried from the spool's committed offset, so messages are
+    delivered at least once.
+
+    Parameters
+    ----------
+    producer : `aiokafka.AIOKafkaProducer`
+        The Kafka producer.
+    spool : `ltdevents.spool.Spool`
+        The opened spool.
+    batch_size : `int`
+        The maximum number of messages forwarded in one batch.
+    retry_interval : `float`
+        The time, in seconds, to wait before retrying a failed batch.
+    drain_timeout : `float`
+        The maximum time, in seconds, that `close` waits for spooled messages
+        to be forwarded. Messages that aren't forwarded stay in the spool and
+        are forwarded once the application restarts.
+    adopted : sequence of `ltdevents.spool.Spool`, optional
+        Opened spools that were left over by a different number of worker
+        processes (see `ltdevents.spool.worker_spool_dirs`). Their messages
+        are forwarded before the messages of ``spool``, and nothing is
+        appended to them.
+    logger_name : `str`
+        Name of the structlog logger.
+    """
+
+    accepted_status = 202
+    """The HTTP status that a webhook responds with once a message is
+    spooled.
+    """
+
+    max_size = 0
+    """The capacity of the publish queue (the spool is only limited by disk
+    space).
+    """
+
+    def __init__(
+        self,
+        producer: AIOKafkaProducer,
+        spool: Spool,
+        *,
+        batch_size: int,
+        retry_interval: float = 1.0,
+        drain_timeout: float = 5.0,
+        adopted: Sequence[Spool] = (),
+        logger_name: str = "ltdevents",
+    ) -> None:
+        self._producer = producer
+        self.spool = spool
+        self.adopted = list(adopted)
+        """The adopted spools that haven't been forwarded yet."""
+
+        self.batch_size = max(1, batch_size)
+        self.retry_interval = retry_interval
+        self.drain_timeout = drain_timeout
+        self._logger = structlog.get_logger(logger_name)
+        self._task: Union[asyncio.Task[None], None] = None
+        # Acknowledgement callbacks of spooled messages, by spool offset
+        # (callbacks aren't spooled, so they're lost on restart)
+        self._acks: Dict[int, Callable[[], None]] = {}
+
+    @property
+    def depth(self) -> int:
+        """The number of spooled messages that haven't been forwarded."""
+        return self.spool.depth + sum(spool.depth for spool in self.adopted)
+
+    async def start(self) -> None:
+        """Start the background task that forwards spooled messages."""
+        self.spool.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._forward())
+        if self.depth:
+            self._logger.info(
+                "Forwarding previously spooled messages",
+                count=self.depth,
+                adopted_spools=[
+                    str(spool.directory) for spool in self.adopted
+                ],
+            )
+
+    async def publish(self, message: OutboundMessage) -> None:
+        """Append a message to the spool."""
+        offset = await self.spool.append(
+            message.topic,
+            message.key,
+            message.value,
+            partition=message.partition,
+        )
+        if message.on_ack is not None:
+            self._acks[offset] = message.on_ack
+
+    async def publish_batch(
+        self, messages: Sequence[OutboundMessage]
+    ) -> List[Optional[BaseException]]:
+        """Append several messages to the spool.
+
+        Returns
+        -------
+        errors : `list`
+            `None` for each message.
+        """
+        for message in messages:
+            await self.publish(message)
+        return [None] * len(messages)
+
+    async def close(self) -> None:
+        """Wait (up to the drain timeout) for spooled messages to be
+        forwarded, then stop forwarding and close the spool.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        while self.depth and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        unforwarded = self.depth
+        for spool in self.adopted:
+            await spool.close()
+        await self.spool.close()
+        self._logger.info("Closed spool", unforwarded=unforwarded)
+
+    async def _forward(self) -> None:
+        """Forward the adopted spools, then forward spooled messages to
+        Kafka until cancelled.
+        """
+        while self.adopted:
+            spool = self.adopted[0]
+            while await self._forward_batch(spool):
+                pass
+            await spool.close()
+            self.adopted.pop(0)
+            self._logger.info(
+                "Forwarded adopted spool", directory=str(spool.directory)
+            )
+        while True:
+            await self.spool.wait_for_records()
+            await self._forward_batch(self.spool)
+
+    async def _forward_batch(self, spool: Spool) -> bool:
+        """Forward a batch of messages from a spool, rewinding the spool if
+        sending fails.
+
+        Returns
+        -------
+        read : `bool`
+            `True` if any records were read from the spool.
+        """
+        skipped = spool.skipped_records
+        records = spool.read(self.batch_size)
+        if spool.skipped_records != skipped:
+            self._logger.error(
+                "Skipped corrupt spool records",
+                count=spool.skipped_records - skipped,
+            )
+        if not records:
+            return False
+        messages = [
+            OutboundMessage(
+                topic=r.topic, key=r.key, value=r.value, partition=r.partition
+            )
+            for r in records
+        ]
+        errors = await send_batch(self._producer, messages)
+        failures = [e for e in errors if e is not None]
+        if failures:
+            self._logger.error(
+                "Failed to forward spooled Kafka messages",
+                failed=len(failures),
+                batch_size=len(messages),
+                error=str(failures[0]),
+            )
+            spool.rewind()
+            await asyncio.sleep(self.retry_interval)
+            return True
+        await spool.commit(records[-1].offset + 1)
+        if spool is self.spool and self._acks:
+            for record in records:
+                on_ack = self._acks.pop(record.offset, None)
+                if on_ack is not None:
+                    on_ack()
+        self._logger.debug(
+            "Forwarded spooled Kafka messages", count=len(messages)
+        )
+        return True
+
+
+async def send_batch(
+    producer: AIOKafkaProducer, messages: Sequence[OutboundMessage]
+) -> List[Optional[BaseException]]:
+    """Hand several messages to the producer, so that they're accumulated
+    into the same producer batch, and wait for the broker's
+    acknowledgements.
+
+    Returns
+    -------
+    errors : `list`
+        For each message, `None` if the message was acknowledged, or the
+        exception raised while sending it (including an exception raised
+        by the producer before the message was accumulated, such as a
+        timeout while the producer's buffer is full).
+    """
+    loop = asyncio.get_running_loop()
+    futures: List[asyncio.Future] = []
+    for message in messages:
+        try:
+            future = await producer.send(
+                message.topic,
+                key=message.key,
+                value=message.value,
+                partition=message.partition,
+            )
+        except Exception as e:
+            # Still wait for the messages that were already handed to the
+            # producer, and report this message's error
+            future = loop.create_future()
+            future.set_exception(e)
+        futures.append(future)
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    errors: List[Optional[BaseException]] = []
+    for message, result in zip(messages, results):
+        if isinstance(result, BaseException):
+            errors.append(result)
+            continue
+        if message.on_ack is not None:
+            message.on_ack()
+        errors.append(None)
+    return errors
+
+
+Publisher = Union[DirectPublisher, QueuedPublisher, SpooledPublisher]
+"""Type of the publisher available from the ``"ltdevents/publisher"``
+application key.
+"""
+
+
+async def init_publisher(app: web.Application) -> AsyncGenerator:
+    """Create the publisher selected by the ``delivery_mode`` configuration
+    and make it available as the ``"ltdevents/publisher"`` key on the
+    application.
+
+    The publishers send through a `ltdevents.resilience.ResilientProducer`
+    that retries sends and has a circuit breaker, which is available as the
+    ``"ltdevents/circuit_breaker"`` key (`None` if the breaker is disabled).
+
+    Notes
+    -----
+    Use this function as a cleanup context after the Kafka producer is
+    initialized so that the publish queue is flushed before the producer
+    stops.
+    """
+    config = app["safir/config"]
+    producer = app["safir/kafka_producer"]
+
+    breaker: Optional[CircuitBreaker] = None
+    if config.kafka_circuit_failure_threshold > 0:
+        breaker = CircuitBreaker(
+            failure_threshold=config.kafka_circuit_failure_threshold,
+            reset_timeout=config.kafka_circuit_reset_ms / 1000.0,
+        )
+        app["ltdevents/metrics"].track_circuit_breaker(breaker)
+    app["ltdevents/circuit_breaker"] = breaker
+    if producer is not None:
+        producer = ResilientProducer(
+            producer,
+            policy=RetryPolicy(
+                retries=config.kafka_send_retries,
+                base_delay=config.kafka_retry_backoff_ms / 1000.0,
+                max_delay=config.kafka_retry_max_backoff_ms / 1000.0,
+            ),
+            breaker=breaker,
+            logger_name=config.logger_name,
+        )
+
+    publisher: Publisher
+    if config.delivery_mode == "spool":
+        if config.spool_dir is None:
+            raise RuntimeError(
+                "The spool delivery mode requires the LTD_EVENTS_SPOOL_DIR "
+                "environment variable."
+            )
+        directory, adopted_dirs = worker_spool_dirs(
+            config.spool_dir, config.worker_index, config.workers
+        )
+        spool_kwargs = {
+            "fsync": config.spool_fsync,
+            "fsync_interval": config.spool_fsync_interval_ms / 1000.0,
+            "segment_bytes": config.spool_segment_bytes,
+        }
+        spool = Spool.open(directory, **spool_kwargs)
+        adopted: List[Spool] = []
+        for adopted_dir in adopted_dirs:
+            adopted_spool = Spool.open(adopted_dir, **spool_kwargs)
+            if adopted_spool.depth:
+                adopted.append(adopted_spool)
+            else:
+                await adopted_spool.close()
+        publisher = SpooledPublisher(
+            producer,
+            spool,
+            batch_size=config.publish_batch_size,
+            adopted=adopted,
+            logger_name=config.logger_name,
+        )
+    elif config.delivery_mode == "queue":
+        publisher = QueuedPublisher(
+            producer,
+            max_size=config.publish_queue_size,
+            batch_size=config.publish_batch_size,
+            linger=config.publish_linger_ms / 1000.0,
+            breaker=breaker,
+            logger_name=config.logger_name,
+        )
+        app["ltdevents/metrics"].track_publish_queue(publisher)
+    else:
+        publisher = DirectPublisher(producer)
+
+    await publisher.start()
+    app["ltdevents/publisher"] = publisher
+
+    yield
+
+    await publisher.close()
@@ -0,0 +1,519 @@
+"""Retries and a circuit breaker for Kafka sends.
+
+A partition leader election or a broker restart makes sends fail for a few
+seconds with retriable errors (such as ``NotLeaderForPartitionError`` or a
+request timeout). The `ResilientProducer` wraps the Kafka producer, for all
+delivery modes, so that:
+
+- A send that fails with a retriable error is retried a bounded number of
+  times, after an exponential backoff with full jitter (`RetryPolicy`), so
+  that the retries of many concurrent sends are spread out. Retries keep
+  the order of the messages of each key.
+- After repeated consecutive failures, the `CircuitBreaker` opens and sends
+  fail immediately with `CircuitOpenError`, instead of each waiting out its
+  retries while webhook requests pile up. Once the reset timeout has passed,
+  a single trial send is let through (the circuit is half-open), and the
+  circuit closes if it succeeds.
+
+While the circuit is open, the ``POST /webhook`` endpoints respond with a 503
+status and a ``Retry-After`` header, so that LTD Keeper retries the webhook
+later (with the ``spool`` delivery mode, messages stay in the spool until the
+circuit closes). The breaker is available from the
+``"ltdevents/circuit_breaker"`` application key, and its state is reported by
+the internal ``GET /webhook/queue`` and ``GET /metrics`` endpoints.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+)
+
+import structlog
+
+__all__ = [
+    "CIRCUIT_STATES",
+    "CircuitOpenError",
+    "CircuitBreaker",
+    "RetryPolicy",
+    "is_retriable",
+    "ResilientProducer",
+]
+
+if TYPE_CHECKING:
+    from aiokafka import AIOKafkaProducer
+
+CIRCUIT_STATES = ("closed", "open", "half_open")
+"""The states of a `CircuitBreaker`."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when a send is rejected because the circuit is open.
+
+    Parameters
+    ----------
+    retry_after : `float`
+        The time, in seconds, until the circuit lets a trial send through.
+    """
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(
+            f"Kafka circuit breaker is open (retry after {retry_after:.1f}s)"
+        )
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """A circuit breaker that opens after consecutive failures.
+
+    Parameters
+    ----------
+    failure_threshold : `int`
+        The number of consecutive failures that open the circuit.
+    reset_timeout : `float`
+        The time, in seconds, that the circuit stays open before a trial
+        call is let through.
+    clock : callable, optional
+        The clock, which returns the time in seconds. The default is
+        `time.monotonic`.
+    """
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if failure_threshold < 1:
+            raise ValueError(
+                "The circuit breaker failure threshold must be positive, not "
+                f"{failure_threshold}"
+            )
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        """The number of consecutive failures."""
+
+        self.trips = 0
+        """The number of times the circuit opened."""
+
+        self.rejected = 0
+        """The number of calls rejected while the circuit was open."""
+
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._clock = clock
+
+    @property
+    def state(self) -> str:
+        """The state of the circuit: ``closed``, ``open``, or
+        ``half_open`` (once the reset timeout has passed).
+        """
+        if self._state == "open" and self.retry_after == 0:
+            return "half_open"
+        return self._state
+
+    @property
+    def retry_after(self) -> float:
+        """The time, in seconds, until an open circuit lets a trial call
+        through (0 if the circuit isn't open).
+        """
+        if self._state != "open":
+            return 0.0
+        elapsed = self._clock() - self._opened_at
+        return max(0.0, self.reset_timeout - elapsed)
+
+    def before_call(self) -> None:
+        """Check that a call may proceed.
+
+        Once the reset timeout has passed, a single trial call proceeds.
+        Each call that proceeds must be followed by `record_success`,
+        `record_failure`, or `release`.
+
+        Raises
+        ------
+        CircuitOpenError
+            Raised if the circuit is open, or half-open with a trial call
+            in flight.
+        """
+        if self._state == "closed":
+            return
+        if self._state == "open":
+            retry_after = self.retry_after
+            if retry_after > 0:
+                self.rejected += 1
+                raise CircuitOpenError(retry_after)
+            self._state = "half_open"
+        if self._trial_in_flight:
+            self.rejected += 1
+            raise CircuitOpenError(0.0)
+        self._trial_in_flight = True
+
+    def check_closed(self) -> None:
+        """Check, without starting a call, that the circuit isn't open.
+
+        This is for work that's accepted now and sent later, such as
+        messages in the publish queue, so that it's rejected while sends
+        would be. Once the reset timeout has passed, work is accepted again.
+
+        Raises
+        ------
+        CircuitOpenError
+            Raised if the circuit is open.
+        """
+        if self.state == "open":
+            self.rejected += 1
+            raise CircuitOpenError(self.retry_after)
+
+    def record_success(self) -> None:
+        """Record a successful call, which closes the circuit."""
+        self.failures = 0
+        self._trial_in_flight = False
+        self._state = "closed"
+
+    def record_failure(self) -> None:
+        """Record a failed call, which opens the circuit once the failure
+        threshold is reached, or if the call was the trial call.
+        """
+        self.failures += 1
+        self._trial_in_flight = False
+        if (
+            self._state == "half_open"
+            or self.failures >= self.failure_threshold
+        ):
+            if self._state != "open":
+                self.trips += 1
+            self._state = "open"
+            self._opened_at = self._clock()
+
+    def release(self) -> None:
+        """Record a call that neither succeeded nor failed (for example,
+        because it was cancelled or failed for a reason that isn't about the
+        broker's health).
+        """
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        """The state and counts of the circuit breaker."""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after, 3),
+        }
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """A bounded retry policy with exponential backoff and full jitter."""
+
+    retries: int = 3
+    """The maximum number of retries of a send (0 disables retries)."""
+
+    base_delay: float = 0.1
+    """The backoff ceiling, in seconds, before the first retry. The ceiling
+    doubles for each retry.
+    """
+
+    max_delay: float = 2.0
+    """The maximum backoff ceiling, in seconds."""
+
+    def backoff(
+        self, retry: int, rng: Callable[[], float] = random.random
+    ) -> float:
+        """Get the delay before a retry.
+
+        Parameters
+        ----------
+        retry : `int`
+            The number of retries so far.
+        rng : callable, optional
+            Returns a random number between 0 and 1.
+
+        Returns
+        -------
+        delay : `float`
+            A random delay, in seconds, between 0 and the retry's ceiling.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** retry))
+        return rng() * ceiling
+
+
+def is_retriable(error: BaseException) -> bool:
+    """Check whether a send error is transient.
+
+    Kafka errors have a ``retriable`` attribute (see `aiokafka.errors`),
+    and timeouts are retriable.
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    return bool(getattr(error, "retriable", False))
+
+
+class ResilientProducer:
+    """A wrapper of `aiokafka.AIOKafkaProducer` that retries retriable send
+    errors and fails fast while a circuit breaker is open.
+
+    Parameters
+    ----------
+    producer : `aiokafka.AIOKafkaProducer`
+        The Kafka producer.
+    policy : `RetryPolicy`
+        The retry policy.
+    breaker : `CircuitBreaker`, optional
+        The circuit breaker. If `None`, sends are only retried.
+    logger_name : `str`, optional
+        Name of the logger.
+    sleep : callable, optional
+        The function that waits between retries. The default is
+        `asyncio.sleep`.
+    rng : callable, optional
+        Returns a random number between 0 and 1, for the backoff jitter.
+
+    Notes
+    -----
+    Retries don't reorder the messages of a key (a topic and message key).
+    Once a message fails, the later messages of its key aren't handed to the
+    producer until the earlier messages of the key are settled (acknowledged
+    or failed for good), and failed messages are retried one at a time, in
+    the order they were sent. Messages of a key that isn't failing are
+    handed to the producer straight away, so that they're batched. Messages
+    without a key aren't ordered.
+    """
+
+    def __init__(
+        self,
+        producer: AIOKafkaProducer,
+        *,
+        policy: RetryPolicy,
+        breaker: Optional[CircuitBreaker] = None,
+        logger_name: str = "ltdevents",
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        self.producer = producer
+        self.policy = policy
+        self.breaker = breaker
+        self.retries = 0
+        """The number of retried sends."""
+
+        self._sleep = sleep
+        self._rng = rng
+        self._logger = structlog.get_logger(logger_name)
+        self._lanes: Dict[Tuple[str, bytes], _Lane] = {}
+
+    async def start(self) -> None:
+        """Start the wrapped producer."""
+        await self.producer.start()
+
+    async def stop(self) -> None:
+        """Stop the wrapped producer."""
+        await self.producer.stop()
+
+    async def send(
+        self,
+        topic: str,
+        value: Optional[bytes] = None,
+        key: Optional[bytes] = None,
+        partition: Optional[int] = None,
+    ) -> asyncio.Future:
+        """Send a message, returning a future that resolves once the message
+        is acknowledged, after any retries.
+
+        The first attempt is handed to the producer before this returns, so
+        messages that are sent one after the other are batched in order,
+        unless an earlier message with the same key is being retried, in
+        which case the message is sent once the earlier messages are
+        settled. If the circuit is open, the future fails immediately with
+        `CircuitOpenError`.
+        """
+        lane: Optional[_Lane] = None
+        previous: Optional[asyncio.Future] = None
+        done: Optional[asyncio.Future] = None
+        if key is not None:
+            lane = self._lanes.get((topic, key))
+            if lane is None:
+                lane = _Lane()
+                self._lanes[(topic, key)] = lane
+            previous = lane.tail
+            done = lane.tail = asyncio.get_running_loop().create_future()
+        future: Optional[asyncio.Future] = None
+        deferred = False
+        try:
+            if lane is not None and lane.blocked:
+                # Wait for the message of the key that's being retried
+                lane.blocked += 1
+                deferred = True
+            else:
+                future = await self._attempt(topic, value, key, partition)
+        except BaseException:
+            self._settled(topic, key, lane, done, blocked=deferred)
+            raise
+        return asyncio.ensure_future(
+            self._settle(
+                future, topic, value, key, partition, lane, previous, done
+            )
+        )
+
+    async def send_and_wait(
+        self,
+        topic: str,
+        value: Optional[bytes] = None,
+        key: Optional[bytes] = None,
+        partition: Optional[int] = None,
+    ) -> Any:
+        """Send a message and wait for it to be acknowledged, after any
+        retries.
+
+        Raises
+        ------
+        CircuitOpenError
+            Raised if the circuit is open.
+        """
+        future = await self.send(
+            topic, value=value, key=key, partition=partition
+        )
+        return await future
+
+    async def _attempt(
+        self,
+        topic: str,
+        value: Optional[bytes],
+        key: Optional[bytes],
+        partition: Optional[int],
+    ) -> asyncio.Future:
+        """Hand a message to the producer, returning the future of its
+        acknowledgement (which has the exception if the circuit is open or
+        the producer raised).
+        """
+        try:
+            if self.breaker is not None:
+                self.breaker.before_call()
+            return await self.producer.send(
+                topic, value=value, key=key, partition=partition
+            )
+        except Exception as e:
+            future = asyncio.get_running_loop().create_future()
+            future.set_exception(e)
+            return future
+
+    async def _settle(
+        self,
+        future: Optional[asyncio.Future],
+        topic: str,
+        value: Optional[bytes],
+        key: Optional[bytes],
+        partition: Optional[int],
+        lane: Optional[_Lane],
+        previous: Optional[asyncio.Future],
+        done: Optional[asyncio.Future],
+    ) -> Any:
+        """Wait for a message to be acknowledged, retrying it after the
+        earlier messages of its key are settled.
+
+        If ``future`` is `None`, the message waits for the earlier messages
+        of its key before its first attempt.
+        """
+        breaker = self.breaker
+        retry = 0
+        blocked = future is None
+        try:
+            if future is None:
+                await _wait_settled(previous)
+                future = await self._attempt(topic, value, key, partition)
+            while True:
+                try:
+                    result = await future
+                except CircuitOpenError:
+                    raise
+                except asyncio.CancelledError:
+                    if breaker is not None:
+                        breaker.release()
+                    raise
+                except Exception as e:
+                    if not is_retriable(e):
+                        if breaker is not None:
+                            breaker.release()
+                        raise
+                    if breaker is not None:
+                        breaker.record_failure()
+                    if retry >= self.policy.retries:
+                        raise
+                    if lane is not None and not blocked:
+                        # Later messages of the key wait for this message
+                        lane.blocked += 1
+                        blocked = True
+                    delay = self.policy.backoff(retry, self._rng)
+                    retry += 1
+                    self.retries += 1
+                    self._logger.warning(
+                        "Retrying Kafka send",
+                        topic=topic,
+                        retry=retry,
+                        delay=round(delay, 3),
+                        error=str(e),
+                    )
+                    await self._sleep(delay)
+                    await _wait_settled(previous)
+                    future = await self._attempt(topic, value, key, partition)
+                    continue
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+        finally:
+            self._settled(topic, key, lane, done, blocked=blocked)
+
+    def _settled(
+        self,
+        topic: str,
+        key: Optional[bytes],
+        lane: Optional[_Lane],
+        done: Optional[asyncio.Future],
+        *,
+        blocked: bool,
+    ) -> None:
+        """Let the later messages of a settled message's key go ahead."""
+        if lane is None or done is None or key is None:
+            return
+        if blocked:
+            lane.blocked -= 1
+        if not done.done():
+            done.set_result(None)
+        if lane.tail is done:
+            del self._lanes[(topic, key)]
+
+
+class _Lane:
+    """The order of the unsettled messages of a key (see
+    `ResilientProducer`).
+    """
+
+    def __init__(self) -> None:
+        self.tail: Optional[asyncio.Future] = None
+        """Resolves once the key's most recently sent message is settled."""
+
+        self.blocked = 0
+        """The number of the key's messages that are being retried, or that
+        wait for a message that's being retried.
+        """
+
+
+async def _wait_settled(previous: Optional[asyncio.Future]) -> None:
+    """Wait for the previous message of a key to be settled, without
+    cancelling it if the wait is cancelled.
+    """
+    if previous is not None and not previous.done():
+        await asyncio.wait({previous})
@@ -0,0 +1,399 @@
+"""Concurrent, cached registration of the application's Avro schemas.
+
+`RecordNameSchemaManager.register_schemas` registers each schema, and
+configures each subject's compatibility, one HTTP request at a time, on every
+start of every pod. `register_schemas` instead registers the schemas
+concurrently and skips the subjects whose schema, compatibility, and Schema
+Registry are unchanged since they were last registered, according to a local
+`RegistrationCache` file.
+
+The `SchemaRegistration`, available from the
+``"ltdevents/schema_registration"`` application key, runs the registration
+at startup (``startup``), in the background once the application starts
+(``background``, retrying with a backoff until the registration succeeds), or
+when the first message is serialized (``lazy``), according to the
+``schema_registration`` configuration.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, Mapping, Optional
+
+import structlog
+from kafkit.registry.aiohttp import RegistryApi
+from kafkit.registry.manager import RecordNameSchemaManager
+
+from ltdevents.serializers import AvroSerializers
+
+__all__ = [
+    "RegistrationCache",
+    "SchemaRegistration",
+    "register_schemas",
+    "init_schema_registration",
+]
+
+if TYPE_CHECKING:
+    from aiohttp import web
+    from kafkit.registry.sansio import RegistryApi as SansioRegistryApi
+
+
+class RegistrationCache:
+    """A local file of the Schema Registry IDs of registered schemas.
+
+    Each subject's entry records the schema ID and a fingerprint of the
+    Schema Registry URL, the schema, and the compatibility setting, so that a
+    subject is registered again if any of them changes.
+
+    Parameters
+    ----------
+    path : `pathlib.Path`, optional
+        The path of the cache file. If `None`, nothing is cached.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._changed = False
+        if path is not None and path.exists():
+            try:
+                data = json.loads(path.read_text())
+            except ValueError:
+                data = {}
+            if isinstance(data, dict):
+                self._entries = data
+
+    @staticmethod
+    def fingerprint(
+        *,
+        registry_url: str,
+        subject: str,
+        schema: Mapping[str, Any],
+        compatibility: Optional[str],
+    ) -> str:
+        """Compute the fingerprint of a subject's registration."""
+        data = json.dumps(
+            {
+                "registry_url": registry_url,
+                "subject": subject,
+                "schema": schema,
+                "compatibility": compatibility,
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def get(self, subject: str, fingerprint: str) -> Optional[int]:
+        """Get the cached schema ID of a subject, or `None` if the subject
+        isn't cached with the same fingerprint.
+        """
+        entry = self._entries.get(subject)
+        if entry is None or entry.get("fingerprint") != fingerprint:
+            return None
+        return entry.get("id")
+
+    def set(self, subject: str, fingerprint: str, schema_id: int) -> None:
+        """Cache the schema ID of a subject."""
+        self._entries[subject] = {"fingerprint": fingerprint, "id": schema_id}
+        self._changed = True
+
+    def save(self) -> None:
+        """Write the cache file, if there are new entries.
+
+        The file is replaced atomically, so that several processes can share
+        a cache file.
+        """
+        if self.path is None or not self._changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(self._entries, indent=2))
+        os.replace(temp_path, self.path)
+        self._changed = False
+
+
+async def register_schemas(
+    schemas: Mapping[str, Mapping[str, Any]],
+    registry: SansioRegistryApi,
+    *,
+    compatibility: Optional[str] = None,
+    cache: Optional[RegistrationCache] = None,
+    concurrency: int = 8,
+) -> Dict[str, int]:
+    """Register schemas with the Schema Registry concurrently.
+
+    Parameters
+    ----------
+    schemas : `dict`
+        Mapping of subject names to Avro schemas (such as
+        `RecordNameSchemaManager.schemas`).
+    registry : `kafkit.registry.sansio.RegistryApi`
+        The Schema Registry client. Schema IDs that are found in the cache
+        are inserted into the client's schema cache.
+    compatibility : `str`, optional
+        The compatibility setting of each subject.
+    cache : `RegistrationCache`, optional
+        The cache of registered schema IDs. Subjects that are cached with the
+        same fingerprint aren't registered again.
+    concurrency : `int`, optional
+        The maximum number of subjects that are registered at once.
+
+    Returns
+    -------
+    schema_ids : `dict`
+        Mapping of subject names to schema IDs.
+    """
+    registration_cache = cache if cache is not None else RegistrationCache()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def register(subject: str, schema: Mapping[str, Any]) -> int:
+        fingerprint = registration_cache.fingerprint(
+            registry_url=registry.url,
+            subject=subject,
+            schema=schema,
+            compatibility=compatibility,
+        )
+        schema_id = registration_cache.get(subject, fingerprint)
+        if schema_id is not None:
+            registry.schema_cache.insert(schema, schema_id)
+            return schema_id
+
+        async with semaphore:
+            schema_id = await registry.register_schema(schema, subject=subject)
+            if compatibility is not None:
+                await registry.put(
+                    "/config{/subject}",
+                    url_vars={"subject": subject},
+                    data={"compatibility": compatibility},
+                )
+        registration_cache.set(subject, fingerprint, schema_id)
+        return schema_id
+
+    subjects = list(schemas.keys())
+    schema_ids = await asyncio.gather(
+        *(register(subject, schemas[subject]) for subject in subjects)
+    )
+    registration_cache.save()
+    return dict(zip(subjects, schema_ids))
+
+
+class SchemaRegistration:
+    """Registers the application's schemas and provides the Avro
+    serializers once the schemas are registered.
+
+    Parameters
+    ----------
+    manager : `kafkit.registry.manager.RecordNameSchemaManager`
+        The schema manager, which loads the application's schemas.
+    registry : `kafkit.registry.sansio.RegistryApi`
+        The Schema Registry client.
+    compatibility : `str`, optional
+        The compatibility setting of each subject.
+    cache : `RegistrationCache`, optional
+        The cache of registered schema IDs.
+    concurrency : `int`, optional
+        The maximum number of subjects that are registered at once.
+    key_cache_size : `int`, optional
+        The maximum number of encoded keys that are cached by the
+        serializers.
+    logger_name : `str`, optional
+        Name of the logger.
+    """
+
+    def __init__(
+        self,
+        manager: RecordNameSchemaManager,
+        registry: SansioRegistryApi,
+        *,
+        compatibility: Optional[str] = None,
+        cache: Optional[RegistrationCache] = None,
+        concurrency: int = 8,
+        key_cache_size: int = 4096,
+        logger_name: str = "ltdevents",
+    ) -> None:
+        self.manager = manager
+        self.registry = registry
+        self.compatibility = compatibility
+        self.cache = cache
+        self.concurrency = concurrency
+        self.key_cache_size = key_cache_size
+        self._serializers: Optional[AvroSerializers] = None
+        self._task: Optional[asyncio.Future] = None
+        self._retry_task: Optional[asyncio.Future] = None
+        self.last_error: Optional[str] = None
+        """The error of the last failed registration, if the schemas aren't
+        registered yet.
+        """
+        self._logger = structlog.get_logger(logger_name)
+
+    @property
+    def ready(self) -> bool:
+        """`True` once the schemas are registered."""
+        return self._serializers is not None
+
+    def start(self) -> None:
+        """Start registering the schemas in the background, if the
+        registration isn't already started.
+        """
+        if self._serializers is None and self._task is None:
+            self._task = asyncio.ensure_future(self._register())
+            self._task.add_done_callback(self._on_done)
+
+    def start_background(
+        self, *, retry_delay: float = 1.0, max_retry_delay: float = 60.0
+    ) -> None:
+        """Register the schemas in the background, retrying failed
+        registrations until the schemas are registered.
+
+        Parameters
+        ----------
+        retry_delay : `float`, optional
+            The time, in seconds, before the first retry. The delay doubles
+            after each failed retry.
+        max_retry_delay : `float`, optional
+            The maximum time, in seconds, between retries.
+        """
+        if self._serializers is None and self._retry_task is None:
+            self._retry_task = asyncio.ensure_future(
+                self._register_until_ready(retry_delay, max_retry_delay)
+            )
+
+    async def get_serializers(self) -> AvroSerializers:
+        """Get the serializers, registering the schemas first if needed.
+
+        Concurrent callers share a single registration. If the registration
+        fails, the next call tries again.
+
+        Returns
+        -------
+        serializers : `ltdevents.serializers.AvroSerializers`
+            The serializers.
+        """
+        if self._serializers is not None:
+            return self._serializers
+        self.start()
+        assert self._task is not None
+        return await asyncio.shield(self._task)
+
+    async def close(self) -> None:
+        """Cancel a registration that is still running."""
+        for task in (self._retry_task, self._task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+    async def _register_until_ready(
+        self, delay: float, max_delay: float
+    ) -> None:
+        while True:
+            try:
+                await self.get_serializers()
+            except Exception:
+                # The failure is logged by _on_done
+                self._logger.info(
+                    "Retrying Avro schema registration", delay=delay
+                )
+            else:
+                return
+            await asyncio.sleep(delay)
+            delay = min(max_delay, delay * 2)
+
+    async def _register(self) -> AvroSerializers:
+        schema_ids = await register_schemas(
+            self.manager.schemas,
+            self.registry,
+            compatibility=self.compatibility,
+            cache=self.cache,
+            concurrency=self.concurrency,
+        )
+        serializers = await AvroSerializers.from_manager(
+            self.manager, self.registry, key_cache_size=self.key_cache_size
+        )
+        self._serializers = serializers
+        self.last_error = None
+        self._logger.info(
+            "Finished registering Avro schemas", subjects=len(schema_ids)
+        )
+        return serializers
+
+    def _on_done(self, task: asyncio.Future) -> None:
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            self.last_error = str(error)
+            self._logger.error(
+                "Failed to register Avro schemas", error=str(error)
+            )
+            if self._task is task:
+                self._task = None
+
+
+async def init_schema_registration(app: web.Application) -> AsyncGenerator:
+    """Set up the registration of the Avro schemas.
+
+    The `SchemaRegistration` is available from the
+    ``"ltdevents/schema_registration"`` application key. With the
+    ``startup`` registration mode, the serializers are also available from
+    the ``"ltdevents/serializers"`` key.
+
+    A Schema Registry client that is already set on the
+    ``"safir/schema_registry"`` key (such as a fake for benchmarks) is used
+    instead of creating one.
+    """
+    config = app["safir/config"]
+    logger = structlog.get_logger(config.logger_name)
+
+    if config.schema_registry_url is None:
+        logger.info(
+            "Schema Registry is not configured, skipping schema "
+            "registration"
+        )
+        app["safir/schema_registry"] = None
+        app["safir/schema_manager"] = None
+        app["ltdevents/schema_registration"] = None
+        app["ltdevents/serializers"] = None
+        yield
+        return
+
+    registry = app.get("safir/schema_registry")
+    if registry is None:
+        registry = RegistryApi(
+            session=app["safir/http_session"], url=config.schema_registry_url
+        )
+    manager = RecordNameSchemaManager(
+        root=Path(__file__).parent / "schemas",
+        suffix=config.schema_suffix,
+        registry=registry,
+    )
+    registration = SchemaRegistration(
+        manager,
+        registry,
+        compatibility=config.schema_compatibility,
+        cache=RegistrationCache(config.schema_cache_path),
+        concurrency=config.schema_registration_concurrency,
+        key_cache_size=config.key_cache_size,
+        logger_name=config.logger_name,
+    )
+    app["safir/schema_registry"] = registry
+    app["safir/schema_manager"] = manager
+    app["ltdevents/schema_registration"] = registration
+
+    if config.schema_registration == "startup":
+        app["ltdevents/serializers"] = await registration.get_serializers()
+    else:
+        app["ltdevents/serializers"] = None
+        if config.schema_registration == "background":
+            registration.start_background()
+
+    yield
+
+    await registration.close()
@@ -0,0 +1,180 @@
+"""Precompiled Avro serializers for the application's schemas.
+
+`RecordNameSchemaManager.serialize` resolves the schema by name and
+re-parses it on every call. The `AvroSerializers` collection instead looks up
+each schema's ID and compiles it with fastavro once, at startup, and caches
+the encoded bytes of recently-seen message keys.
+"""
+
+from __future__ import annotations
+
+import functools
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Tuple
+
+import fastavro
+from kafkit.registry.serializer import pack_wire_format_prefix
+
+__all__ = ["SchemaSerializer", "AvroSerializers"]
+
+if TYPE_CHECKING:
+    from kafkit.registry.manager import RecordNameSchemaManager
+    from kafkit.registry.sansio import RegistryApi
+
+
+class SchemaSerializer:
+    """A serializer for a single Avro schema that writes messages in the
+    Confluent Wire Format.
+
+    Parameters
+    ----------
+    name : `str`
+        The fully-qualified name of the schema (also the Schema Registry
+        subject name).
+    schema : `dict`
+        The Avro schema.
+    schema_id : `int`
+        The ID of the schema in the Schema Registry.
+    """
+
+    def __init__(
+        self, *, name: str, schema: Mapping[str, Any], schema_id: int
+    ) -> None:
+        self.name = name
+        self.id = schema_id
+        self.field_names = tuple(f["name"] for f in schema["fields"])
+        self._parsed_schema = fastavro.parse_schema(dict(schema))
+        self._prefix = pack_wire_format_prefix(schema_id)
+
+    def __call__(self, data: Mapping[str, Any]) -> bytes:
+        """Serialize a record.
+
+        Parameters
+        ----------
+        data : `dict`
+            An Avro-serializable record. Keys that aren't fields of the schema
+            are ignored.
+
+        Returns
+        -------
+        message : `bytes`
+            The message in the Confluent Wire Format.
+        """
+        buffer = BytesIO()
+        buffer.write(self._prefix)
+        fastavro.schemaless_writer(buffer, self._parsed_schema, data)
+        return buffer.getvalue()
+
+
+class AvroSerializers:
+    """A collection of precompiled serializers, available from the
+    ``"ltdevents/serializers"`` application key.
+
+    Use the `AvroSerializers.from_manager` class method to create an instance
+    once the schemas are registered.
+
+    Parameters
+    ----------
+    serializers : `dict`
+        Mapping of schema names to `SchemaSerializer` instances.
+    key_cache_size : `int`
+        The maximum number of encoded keys that are cached by
+        `serialize_key`.
+    """
+
+    def __init__(
+        self, serializers: Mapping[str, SchemaSerializer], key_cache_size: int
+    ) -> None:
+        self._serializers: Dict[str, SchemaSerializer] = dict(serializers)
+        self._cached_key = functools.lru_cache(maxsize=key_cache_size)(
+            self._encode_key
+        )
+
+    @classmethod
+    async def from_manager(
+        cls,
+        manager: RecordNameSchemaManager,
+        registry: RegistryApi,
+        *,
+        key_cache_size: int = 4096,
+    ) -> AvroSerializers:
+        """Create serializers for all of a schema manager's schemas.
+
+        Parameters
+        ----------
+        manager : `kafkit.registry.manager.RecordNameSchemaManager`
+            The schema manager, whose schemas are already registered.
+        registry : `kafkit.registry.sansio.RegistryApi`
+            The Schema Registry client. Since the schemas are already
+            registered, their IDs are obtained from the client's cache.
+        key_cache_size : `int`, optional
+            The maximum number of encoded keys that are cached.
+
+        Returns
+        -------
+        serializers : `AvroSerializers`
+            The serializers.
+        """
+        serializers = {}
+        for name, schema in manager.schemas.items():
+            schema_id = await registry.register_schema(schema, subject=name)
+            serializers[name] = SchemaSerializer(
+                name=name, schema=schema, schema_id=schema_id
+            )
+        return cls(serializers, key_cache_size=key_cache_size)
+
+    def __getitem__(self, name: str) -> SchemaSerializer:
+        try:
+            return self._serializers[name]
+        except KeyError:
+            raise ValueError(
+                f"Schema named '{name}' not among the locally-registered "
+                f"schemas. Available schemas are: {self._serializers.keys()}"
+            )
+
+    def serialize(self, data: Mapping[str, Any], *, name: str) -> bytes:
+        """Serialize a record with the named schema.
+
+        Parameters
+        ----------
+        data : `dict`
+            An Avro-serializable record.
+        name : `str`
+            The name of the schema.
+
+        Returns
+        -------
+        message : `bytes`
+            The message in the Confluent Wire Format.
+        """
+        return self[name](data)
+
+    def serialize_key(self, key: Tuple[str, ...], *, name: str) -> bytes:
+        """Serialize a message key, reusing the encoded bytes of recently
+        serialized keys.
+
+        Parameters
+        ----------
+        key : `tuple`
+            The values of the key's fields, in the order of the fields in the
+            schema. For example, ``(product_slug, edition_slug)`` for the
+            ``ltd.edition_key_v1`` schema.
+        name : `str`
+            The name of the key schema.
+
+        Returns
+        -------
+        message : `bytes`
+            The message key in the Confluent Wire Format.
+        """
+        return self._cached_key(name, key)
+
+    def key_cache_info(self) -> Any:
+        """Get the hit, miss, and size statistics of the key cache (see
+        `functools.lru_cache`).
+        """
+        return self._cached_key.cache_info()
+
+    def _encode_key(self, name: str, key: Tuple[str, ...]) -> bytes:
+        serializer = self[name]
+        return serializer(dict(zip(serializer.field_names, key)))
@@ -0,0 +1,251 @@
+"""Verification of webhook payload signatures.
+
+LTD Keeper signs each webhook body with HMAC-SHA256 and sends the signature
+in the ``X-LTD-Signature`` header as ``sha256=<hex digest>``. The
+`SignatureVerifier` checks the signature of the raw request body against
+each active key with a constant-time comparison, so that keys can be rotated
+by adding the new key before LTD Keeper switches to it.
+
+The keys are the files of a directory (such as a mounted Kubernetes secret,
+with one key per file). They're loaded once into HMAC objects that have
+already absorbed the key, which are copied for each request, and the
+directory is polled so that the keys are reloaded when the secret changes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Dict,
+    FrozenSet,
+    Optional,
+    Tuple,
+)
+
+import structlog
+from aiohttp import web
+
+__all__ = [
+    "SIGNATURE_HEADER",
+    "SignatureVerifier",
+    "sign",
+    "check_signature",
+    "init_signature_verifier",
+]
+
+if TYPE_CHECKING:
+    from hmac import HMAC
+
+SIGNATURE_HEADER = "X-LTD-Signature"
+"""The HTTP header that has the signature of a webhook body."""
+
+_SIGNATURE_PREFIX = "sha256="
+
+
+def sign(key: bytes, body: bytes) -> str:
+    """Compute the signature header value of a webhook body.
+
+    Parameters
+    ----------
+    key : `bytes`
+        The HMAC key.
+    body : `bytes`
+        The request body.
+
+    Returns
+    -------
+    signature : `str`
+        The value of the ``X-LTD-Signature`` header.
+    """
+    digest = hmac.new(key, body, hashlib.sha256).hexdigest()
+    return f"{_SIGNATURE_PREFIX}{digest}"
+
+
+class SignatureVerifier:
+    """Verifies webhook signatures with the keys in a directory, available
+    from the ``"ltdevents/signature_verifier"`` application key.
+
+    Parameters
+    ----------
+    keys_dir : `pathlib.Path`
+        The directory of key files. Hidden files (such as the ``..data``
+        links of a Kubernetes secret mount) are ignored.
+    logger_name : `str`, optional
+        Name of the logger.
+    """
+
+    def __init__(
+        self, keys_dir: Path, *, logger_name: str = "ltdevents"
+    ) -> None:
+        self.keys_dir = keys_dir
+        self._logger = structlog.get_logger(logger_name)
+        self._hmacs: Tuple[HMAC, ...] = ()
+        self._state: FrozenSet[Tuple[Any, ...]] = frozenset()
+        self.reload()
+
+    @property
+    def key_count(self) -> int:
+        """The number of active keys."""
+        return len(self._hmacs)
+
+    def verify(self, body: bytes, signature: Optional[str]) -> bool:
+        """Verify the signature of a webhook body.
+
+        Parameters
+        ----------
+        body : `bytes`
+            The raw request body.
+        signature : `str`, optional
+            The value of the ``X-LTD-Signature`` header.
+
+        Returns
+        -------
+        valid : `bool`
+            `True` if the signature matches the body for any active key.
+        """
+        if not signature or not signature.startswith(_SIGNATURE_PREFIX):
+            return False
+        expected = signature[len(_SIGNATURE_PREFIX) :].lower().encode()
+        valid = False
+        # Check every key so that the time doesn't depend on which key matches
+        for key_hmac in self._hmacs:
+            digest = key_hmac.copy()
+            digest.update(body)
+            if hmac.compare_digest(digest.hexdigest().encode(), expected):
+                valid = True
+        return valid
+
+    def reload(self) -> bool:
+        """Reload the keys if the key files changed.
+
+        Returns
+        -------
+        reloaded : `bool`
+            `True` if the keys were reloaded.
+        """
+        state = self._stat_keys()
+        if state == self._state:
+            return False
+        hmacs = []
+        for _, path in sorted(self._key_paths().items()):
+            key = path.read_bytes().strip()
+            if key:
+                hmacs.append(hmac.new(key, digestmod=hashlib.sha256))
+        self._hmacs = tuple(hmacs)
+        self._state = state
+        if self._hmacs:
+            self._logger.info("Loaded webhook keys", count=len(self._hmacs))
+        else:
+            self._logger.error(
+                "No webhook keys found, all webhooks will be rejected",
+                keys_dir=str(self.keys_dir),
+            )
+        return True
+
+    async def watch(self, interval: float) -> None:
+        """Reload the keys when the key files change, until cancelled.
+
+        Parameters
+        ----------
+        interval : `float`
+            The time, in seconds, between checks of the key files.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.reload()
+            except OSError as e:
+                self._logger.error(
+                    "Failed to reload webhook keys", error=str(e)
+                )
+
+    def _key_paths(self) -> Dict[str, Path]:
+        if not self.keys_dir.is_dir():
+            return {}
+        return {
+            path.name: path
+            for path in self.keys_dir.iterdir()
+            if not path.name.startswith(".") and path.is_file()
+        }
+
+    def _stat_keys(self) -> FrozenSet[Tuple[Any, ...]]:
+        state = set()
+        for name, path in self._key_paths().items():
+            stat = path.stat()
+            state.add((name, stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return frozenset(state)
+
+
+def check_signature(
+    request: web.Request, body: bytes
+) -> Optional[web.Response]:
+    """Check the signature of a webhook request, if signature verification
+    is configured.
+
+    Parameters
+    ----------
+    request : `aiohttp.web.Request`
+        The request.
+    body : `bytes`
+        The raw request body, which was already read by the handler.
+
+    Returns
+    -------
+    response : `aiohttp.web.Response` or `None`
+        A 401 response if the signature isn't valid, or `None` if the request
+        should be handled.
+    """
+    verifier = request.config_dict["ltdevents/signature_verifier"]
+    if verifier is None:
+        return None
+    if verifier.verify(body, request.headers.get(SIGNATURE_HEADER)):
+        return None
+    request.config_dict["ltdevents/webhook_logging"].error(
+        request["safir/logger"],
+        "Rejected webhook with invalid signature",
+        level="warning",
+    )
+    request.config_dict["ltdevents/metrics"].count_event(
+        "unknown", "unauthorized"
+    )
+    return web.json_response(
+        {"error": f"Missing or invalid {SIGNATURE_HEADER} header."},
+        status=401,
+    )
+
+
+async def init_signature_verifier(app: web.Application) -> AsyncGenerator:
+    """Create the signature verifier for the ``webhook_keys_dir``
+    configuration, and make it available as the
+    ``"ltdevents/signature_verifier"`` key on the application.
+
+    If ``webhook_keys_dir`` isn't set, the key is `None` and signatures
+    aren't verified.
+    """
+    config = app["safir/config"]
+    if config.webhook_keys_dir is None:
+        app["ltdevents/signature_verifier"] = None
+        yield
+        return
+
+    verifier = SignatureVerifier(
+        config.webhook_keys_dir, logger_name=config.logger_name
+    )
+    app["ltdevents/signature_verifier"] = verifier
+    task = asyncio.create_task(
+        verifier.watch(config.webhook_keys_reload_interval_ms / 1000.0)
+    )
+
+    yield
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,441 @@
+"""Fan-out of webhook events to sinks other than Kafka.
+
+Some consumers can't read Kafka. The `FanOut`, available from the
+``"ltdevents/fanout"`` application key, delivers each accepted webhook event,
+encoded once as JSON, to additional sinks:
+
+- `HttpCallbackSink` posts each event to an HTTP callback URL with the
+  application's shared HTTP session (``"safir/http_session"``), whose
+  connector pools connections, retrying failed posts with exponential
+  backoff.
+- `FileSink` appends events to a local NDJSON file.
+- `MemorySink` keeps the most recent events in memory, as a stand-in for a
+  Redis list.
+
+Each sink has its own bounded queue and delivery task (`SinkQueue`), so a
+slow or unavailable sink doesn't delay the webhook responses or the other
+sinks. Events that arrive while a sink's queue is full are dropped for that
+sink and counted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from pathlib import Path
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
+
+import aiohttp
+import orjson
+import structlog
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+__all__ = [
+    "HttpCallbackSink",
+    "FileSink",
+    "MemorySink",
+    "Sink",
+    "SinkQueue",
+    "FanOut",
+    "init_fanout",
+]
+
+
+class HttpCallbackSink:
+    """A sink that posts each event to an HTTP callback URL.
+
+    Parameters
+    ----------
+    url : `str`
+        The callback URL.
+    session : `aiohttp.ClientSession`
+        The HTTP session.
+    retries : `int`, optional
+        The number of times a failed post is retried.
+    backoff : `float`, optional
+        The time, in seconds, before the first retry. The time doubles for
+        each further retry.
+    timeout : `float`, optional
+        The timeout, in seconds, of each post.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        session: aiohttp.ClientSession,
+        *,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 5.0,
+    ) -> None:
+        self.url = url
+        self.name = url
+        self._session = session
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def start(self) -> None:
+        """Start the sink (no-op)."""
+        pass
+
+    async def deliver(
+        self, bodies: Sequence[bytes]
+    ) -> List[Optional[BaseException]]:
+        """Post each event body, in order.
+
+        A body that fails to post doesn't stop the delivery of the following
+        bodies.
+
+        Returns
+        -------
+        errors : `list`
+            For each body, `None` if it was posted, or the exception raised
+            by its last post attempt. Client errors (4xx statuses other than
+            429) aren't retried.
+        """
+        errors: List[Optional[BaseException]] = []
+        for body in bodies:
+            try:
+                await self._post(body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+        return errors
+
+    async def close(self) -> None:
+        """Close the sink (no-op, the session is shared)."""
+        pass
+
+    async def _post(self, body: bytes) -> None:
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._session.post(
+                    self.url,
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                    timeout=self._timeout,
+                ) as response:
+                    response.raise_for_status()
+                    return
+            except aiohttp.ClientResponseError as e:
+                if e.status < 500 and e.status != 429:
+                    raise
+                if attempt == self.retries:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(delay)
+            delay *= 2
+
+
+class FileSink:
+    """A sink that appends events to a local NDJSON file.
+
+    Parameters
+    ----------
+    path : `pathlib.Path`
+        The path of the file, which is created if it doesn't exist.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.name = str(path)
+        self._file: Optional[IO[bytes]] = None
+
+    async def start(self) -> None:
+        """Open the file."""
+        if self._file is None:
+            self._file = open(self.path, "ab")
+
+    async def deliver(
+        self, bodies: Sequence[bytes]
+    ) -> List[Optional[BaseException]]:
+        """Append the event bodies to the file, one per line.
+
+        Returns
+        -------
+        errors : `list`
+            `None` for each body (the bodies are written together, so a
+            failed write raises instead).
+
+        Raises
+        ------
+        OSError
+            Raised if the bodies couldn't be written.
+        """
+        if self._file is None:
+            raise RuntimeError(f"File sink {self.path} isn't started")
+        data = b"".join(body + b"\n" for body in bodies)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, data)
+        return [None] * len(bodies)
+
+    async def close(self) -> None:
+        """Close the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, data: bytes) -> None:
+        assert self._file is not None
+        self._file.write(data)
+        self._file.flush()
+
+
+class MemorySink:
+    """A sink that keeps the most recent events in memory.
+
+    This is a stand-in for a Redis list, for tests and benchmarks.
+
+    Parameters
+    ----------
+    max_size : `int`, optional
+        The number of events that are kept.
+    """
+
+    def __init__(self, max_size: int = 1000) -> None:
+        self.name = "memory"
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max_size)
+
+    async def start(self) -> None:
+        """Start the sink (no-op)."""
+        pass
+
+    async def deliver(
+        self, bodies: Sequence[bytes]
+    ) -> List[Optional[BaseException]]:
+        """Keep the decoded events.
+
+        Returns
+        -------
+        errors : `list`
+            `None` for each body.
+        """
+        self.events.extend(orjson.loads(body) for body in bodies)
+        return [None] * len(bodies)
+
+    async def close(self) -> None:
+        """Close the sink (no-op)."""
+        pass
+
+
+Sink = Union[HttpCallbackSink, FileSink, MemorySink]
+"""Type of a fan-out sink."""
+
+
+class SinkQueue:
+    """A bounded queue of events for a sink and the task that delivers them.
+
+    Parameters
+    ----------
+    sink : `Sink`
+        The sink.
+    max_size : `int`
+        The maximum number of events in the queue.
+    batch_size : `int`
+        The maximum number of events handed to the sink at once.
+    logger_name : `str`
+        Name of the structlog logger.
+    """
+
+    def __init__(
+        self,
+        sink: Sink,
+        *,
+        max_size: int,
+        batch_size: int,
+        logger_name: str = "ltdevents",
+    ) -> None:
+        self.sink = sink
+        self.max_size = max_size
+        self.batch_size = max(1, batch_size)
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=max_size)
+        self._logger = structlog.get_logger(logger_name)
+        self._task: Union[asyncio.Task[None], None] = None
+
+    @property
+    def depth(self) -> int:
+        """The number of events waiting in the queue."""
+        return self._queue.qsize()
+
+    def offer(self, body: bytes) -> bool:
+        """Enqueue an event without waiting.
+
+        Returns
+        -------
+        enqueued : `bool`
+            `False` if the queue is full and the event was dropped.
+        """
+        try:
+            self._queue.put_nowait(body)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    async def start(self) -> None:
+        """Start the sink and the delivery task."""
+        await self.sink.start()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float) -> None:
+        """Wait (up to the timeout) for the queued events to be delivered,
+        then stop the delivery task and close the sink.
+        """
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                self._logger.warning(
+                    "Closing sink with undelivered events",
+                    sink=self.sink.name,
+                    count=self.depth,
+                )
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sink.close()
+
+    async def _run(self) -> None:
+        """Deliver queued events until cancelled."""
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                errors = await self.sink.deliver(batch)
+            except Exception as e:
+                errors = [e] * len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            failures = [e for e in errors if e is not None]
+            self.delivered += len(batch) - len(failures)
+            if failures:
+                self.failed += len(failures)
+                self._logger.error(
+                    "Failed to deliver events to sink",
+                    sink=self.sink.name,
+                    count=len(failures),
+                    error=str(failures[0]),
+                )
+
+
+class FanOut:
+    """Delivers events to several sinks through their own queues.
+
+    Parameters
+    ----------
+    queues : sequence of `SinkQueue`
+        The queues of the sinks.
+    """
+
+    def __init__(self, queues: Sequence[SinkQueue]) -> None:
+        self.queues: List[SinkQueue] = list(queues)
+
+    def offer(self, record: Dict[str, Any]) -> None:
+        """Encode an event record as JSON and enqueue it for each sink,
+        without waiting.
+        """
+        body = orjson.dumps(record, default=str)
+        for queue in self.queues:
+            queue.offer(body)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """The queue depth and delivery counts of each sink."""
+        return [
+            {
+                "sink": queue.sink.name,
+                "depth": queue.depth,
+                "max_size": queue.max_size,
+                "delivered": queue.delivered,
+                "failed": queue.failed,
+                "dropped": queue.dropped,
+            }
+            for queue in self.queues
+        ]
+
+    async def start(self) -> None:
+        """Start every sink's delivery task."""
+        for queue in self.queues:
+            await queue.start()
+
+    async def close(self, timeout: float) -> None:
+        """Drain and close every sink, concurrently."""
+        await asyncio.gather(*(queue.close(timeout) for queue in self.queues))
+
+
+async def init_fanout(app: web.Application) -> AsyncGenerator:
+    """Create the fan-out for the ``sink_urls`` and ``sink_file``
+    configuration and make it available as the ``"ltdevents/fanout"`` key on
+    the application.
+
+    If no sinks are configured, the key is `None`.
+
+    Notes
+    -----
+    Use this function as a cleanup context after the HTTP session is
+    initialized.
+    """
+    config = app["safir/config"]
+    sinks: List[Sink] = [
+        HttpCallbackSink(
+            url,
+            app["safir/http_session"],
+            retries=config.sink_retries,
+            backoff=config.sink_retry_backoff_ms / 1000.0,
+            timeout=config.sink_timeout_ms / 1000.0,
+        )
+        for url in config.sink_urls
+    ]
+    if config.sink_file is not None:
+        sinks.append(FileSink(config.sink_file))
+    if not sinks:
+        app["ltdevents/fanout"] = None
+        yield
+        return
+
+    fanout = FanOut(
+        [
+            SinkQueue(
+                sink,
+                max_size=config.sink_queue_size,
+                batch_size=config.sink_batch_size,
+                logger_name=config.logger_name,
+            )
+            for sink in sinks
+        ]
+    )
+    await fanout.start()
+    app["ltdevents/fanout"] = fanout
+
+    yield
+
+    await fanout.close(config.sink_timeout_ms / 1000.0)
@@ -0,0 +1,607 @@
+"""A durable, append-only local spool for Kafka messages.
+
+The spool is a write-ahead log that lets the ``/webhook`` endpoint
+acknowledge a webhook as soon as the message is on local disk, independently
+of the Kafka broker's health (see `ltdevents.publisher.SpooledPublisher`).
+
+Storage layout
+--------------
+The spool directory contains:
+
+``<base offset>.log``
+    Segment files. Each record in a segment is assigned the next sequential
+    offset, starting with the segment's base offset (the file name, zero
+    padded). A new segment is started once the active segment exceeds the
+    configured size.
+
+``commit``
+    The offset of the next record that needs to be forwarded to Kafka.
+    Segments whose records are all before this offset are deleted
+    (compacted).
+
+Each record is framed as a 4-byte big-endian length and a CRC-32 of the
+record body, so that a record torn by a crash is detected and truncated when
+the spool is reopened. The record body holds the topic, the key, and the
+value, and, if the high bit of the topic length is set, the Kafka partition.
+If the next bit of the topic length is set, the record is a tombstone, which
+has no value.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+__all__ = ["Spool", "SpoolRecord", "FSYNC_POLICIES", "worker_spool_dirs"]
+
+if TYPE_CHECKING:
+    from typing import Any
+
+FSYNC_POLICIES = ("always", "interval", "never")
+"""The allowed fsync policies.
+
+``always``
+    `Spool.append` returns once the record is fsync'd to disk. Concurrent
+    appends share an fsync (group commit).
+``interval``
+    The spool is fsync'd periodically, so a crash of the host can lose the
+    most recent records.
+``never``
+    The operating system decides when to write records to disk.
+"""
+
+_FRAME = struct.Struct(">II")
+"""Record frame: body length and CRC-32 of the body."""
+
+_SEGMENT_SUFFIX = ".log"
+
+_PARTITION_FLAG = 0x8000
+"""Flag in the topic length of a record body that has a partition."""
+
+_TOMBSTONE_FLAG = 0x4000
+"""Flag in the topic length of a record body that has no value."""
+
+
+class SpoolRecord(NamedTuple):
+    """A record read from the spool."""
+
+    offset: int
+    """The offset of the record in the spool."""
+
+    topic: str
+    """The Kafka topic."""
+
+    key: bytes
+    """The encoded message key."""
+
+    value: Optional[bytes]
+    """The encoded message value, or `None` for a tombstone."""
+
+    partition: Optional[int] = None
+    """The Kafka partition, or `None` if the producer chooses the
+    partition.
+    """
+
+
+class Spool:
+    """An append-only spool of Kafka messages stored in segment files.
+
+    Use the `Spool.open` class method to create a spool.
+
+    Parameters
+    ----------
+    directory : `pathlib.Path`
+        The spool directory.
+    fsync : `str`
+        The fsync policy. See `FSYNC_POLICIES`.
+    fsync_interval : `float`
+        The time, in seconds, between fsyncs with the ``interval`` policy.
+    segment_bytes : `int`
+        The size, in bytes, after which a new segment is started.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        fsync: str = "always",
+        fsync_interval: float = 0.2,
+        segment_bytes: int = 16 * 1024 * 1024,
+    ) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(
+                f"fsync policy {fsync!r} is not in {FSYNC_POLICIES}"
+            )
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+
+        self.committed_offset = 0
+        """The offset of the next record that needs to be forwarded."""
+
+        self.next_offset = 0
+        """The offset that is assigned to the next appended record."""
+
+        self._segments: List[int] = []
+        self._active: Optional[BinaryIO] = None
+        self._active_size = 0
+        self._synced_offset = -1
+        self._write_lock = asyncio.Lock()
+        self._sync_task: Optional[asyncio.Task[None]] = None
+        self._interval_task: Optional[asyncio.Task[None]] = None
+        self._appended = asyncio.Event()
+
+        self.skipped_records = 0
+        """The number of records skipped because a segment was corrupt."""
+
+        self._reader: Optional[BinaryIO] = None
+        self._reader_segment = -1
+        self._reader_offset = 0
+
+    @classmethod
+    def open(cls, directory: Path, **kwargs: Any) -> Spool:
+        """Open (or create) a spool, recovering its state from disk.
+
+        Parameters
+        ----------
+        directory : `pathlib.Path`
+            The spool directory, which is created if necessary.
+        **kwargs
+            Keyword arguments for `Spool`.
+
+        Returns
+        -------
+        spool : `Spool`
+            The spool, ready for appending.
+        """
+        spool = cls(directory, **kwargs)
+        spool._recover()
+        return spool
+
+    @property
+    def depth(self) -> int:
+        """The number of records that haven't been forwarded yet."""
+        return self.next_offset - self.committed_offset
+
+    def start(self) -> None:
+        """Start the background fsync task for the ``interval`` policy."""
+        if self.fsync == "interval" and self._interval_task is None:
+            self._interval_task = asyncio.create_task(
+                self._sync_periodically()
+            )
+
+    async def close(self) -> None:
+        """Sync and close the spool's files."""
+        if self._interval_task is not None:
+            self._interval_task.cancel()
+            try:
+                await self._interval_task
+            except asyncio.CancelledError:
+                pass
+            self._interval_task = None
+        async with self._write_lock:
+            if self._sync_task is not None:
+                await self._sync_task
+            if self._active is not None:
+                await self._sync_active()
+                self._active.close()
+                self._active = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    async def append(
+        self,
+        topic: str,
+        key: bytes,
+        value: Optional[bytes],
+        *,
+        partition: Optional[int] = None,
+    ) -> int:
+        """Append a message to the spool.
+
+        With the ``always`` fsync policy, this method returns once the record
+        is durably on disk.
+
+        Returns
+        -------
+        offset : `int`
+            The offset of the record.
+        """
+        body = _encode_record(topic, key, value, partition)
+        async with self._write_lock:
+            if self._active is None or self._active_size >= self.segment_bytes:
+                await self._rotate()
+            assert self._active is not None
+            self._active.write(_FRAME.pack(len(body), zlib.crc32(body)))
+            self._active.write(body)
+            self._active.flush()
+            self._active_size += _FRAME.size + len(body)
+            offset = self.next_offset
+            self.next_offset += 1
+        self._appended.set()
+        if self.fsync == "always":
+            await self._sync_to(offset)
+        return offset
+
+    async def wait_for_records(self) -> None:
+        """Wait until there are records that haven't been read."""
+        while self._reader_offset >= self.next_offset:
+            self._appended.clear()
+            await self._appended.wait()
+
+    def read(self, max_records: int) -> List[SpoolRecord]:
+        """Read the next records that haven't been read since the last
+        `rewind`.
+
+        Parameters
+        ----------
+        max_records : `int`
+            The maximum number of records to read.
+
+        Returns
+        -------
+        records : `list` of `SpoolRecord`
+            The records, in order. The list is empty if there are no
+            unread records.
+        """
+        records: List[SpoolRecord] = []
+        while (
+            len(records) < max_records
+            and self._reader_offset < self.next_offset
+        ):
+            segment = self._segment_for(self._reader_offset)
+            if self._reader is None or self._reader_segment != segment:
+                self._open_reader(self._reader_offset)
+            assert self._reader is not None
+            record = _read_record(self._reader, self._reader_offset)
+            if record is None:
+                if segment == self._segments[-1]:
+                    # The record is still being written.
+                    break
+                # A completed segment can only end early if it's corrupt;
+                # skip to the next segment.
+                next_segment = self._segments[
+                    self._segments.index(segment) + 1
+                ]
+                self.skipped_records += next_segment - self._reader_offset
+                self._reader_offset = next_segment
+                continue
+            records.append(record)
+            self._reader_offset += 1
+        return records
+
+    def rewind(self) -> None:
+        """Reposition the reader at the committed offset, so that records
+        that were read but not committed are read again.
+        """
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._reader_segment = -1
+        self._reader_offset = self.committed_offset
+
+    async def commit(self, offset: int) -> None:
+        """Record that all records before an offset were forwarded, and
+        delete segments that only contain forwarded records.
+
+        The commit file is written (and fsync'd) in an executor, so that a
+        slow disk doesn't block the event loop.
+
+        Parameters
+        ----------
+        offset : `int`
+            The offset of the next record that needs to be forwarded.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_commit, offset)
+        self.committed_offset = offset
+        self._compact()
+
+    def _write_commit(self, offset: int) -> None:
+        """Atomically replace the commit file."""
+        commit_path = self.directory / "commit"
+        temp_path = self.directory / "commit.tmp"
+        with open(temp_path, "w") as f:
+            f.write(str(offset))
+            if self.fsync != "never":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, commit_path)
+
+    def _recover(self) -> None:
+        """Load the spool's state from the spool directory, truncating any
+        torn record at the end of the last segment.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segments = sorted(
+            int(p.name[: -len(_SEGMENT_SUFFIX)])
+            for p in self.directory.glob(f"*{_SEGMENT_SUFFIX}")
+        )
+        commit_path = self.directory / "commit"
+        if commit_path.exists():
+            self.committed_offset = int(commit_path.read_text().strip())
+
+        if self._segments:
+            base = self._segments[-1]
+            path = self._segment_path(base)
+            count, size = _scan_segment(path)
+            if size < path.stat().st_size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+            self.next_offset = base + count
+            self.committed_offset = max(
+                min(self.committed_offset, self.next_offset),
+                self._segments[0],
+            )
+        else:
+            self.next_offset = self.committed_offset
+        self._synced_offset = self.next_offset - 1
+        self._reader_offset = self.committed_offset
+        self._compact()
+
+    async def _rotate(self) -> None:
+        """Start a new active segment (the write lock must be held).
+
+        When the spool was just opened, the last existing segment continues
+        to be the active segment if it isn't full.
+        """
+        reopen = self._active is None
+        if self._active is not None:
+            if self._sync_task is not None:
+                await self._sync_task
+            await self._sync_active()
+            self._active.close()
+            self._active = None
+
+        if (
+            reopen
+            and self._segments
+            and self._segment_size(self._segments[-1]) < self.segment_bytes
+        ):
+            base = self._segments[-1]
+        else:
+            base = self.next_offset
+            self._segments.append(base)
+        self._active = open(self._segment_path(base), "ab")
+        self._active_size = self._active.tell()
+
+    async def _sync_active(self) -> None:
+        """Flush and fsync the active segment in an executor (the write lock
+        must be held).
+        """
+        assert self._active is not None
+        target = self.next_offset - 1
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._flush_file, self._active)
+        self._synced_offset = target
+
+    def _flush_file(self, f: BinaryIO) -> None:
+        f.flush()
+        if self.fsync != "never":
+            os.fsync(f.fileno())
+
+    async def _sync_to(self, offset: int) -> None:
+        """Wait until the record at an offset is fsync'd, sharing fsyncs
+        between concurrent appends.
+        """
+        while self._synced_offset < offset:
+            if self._sync_task is None:
+                self._sync_task = asyncio.create_task(self._sync())
+            await asyncio.shield(self._sync_task)
+
+    async def _sync(self) -> None:
+        """Fsync the active segment in an executor."""
+        try:
+            if self._active is None:
+                return
+            target = self.next_offset - 1
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, os.fsync, self._active.fileno())
+            self._synced_offset = max(self._synced_offset, target)
+        finally:
+            self._sync_task = None
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            if self._synced_offset < self.next_offset - 1:
+                await self._sync_to(self.next_offset - 1)
+
+    def _compact(self) -> None:
+        """Delete segments whose records were all forwarded."""
+        while (
+            len(self._segments) > 1
+            and self._segments[1] <= self.committed_offset
+        ):
+            base = self._segments.pop(0)
+            if self._reader is not None and self._reader_segment == base:
+                self._reader.close()
+                self._reader = None
+                self._reader_segment = -1
+            self._segment_path(base).unlink()
+
+    def _segment_path(self, base: int) -> Path:
+        return self.directory / f"{base:020d}{_SEGMENT_SUFFIX}"
+
+    def _segment_size(self, base: int) -> int:
+        return self._segment_path(base).stat().st_size
+
+    def _segment_for(self, offset: int) -> int:
+        """Get the base offset of the segment containing an offset."""
+        for base in reversed(self._segments):
+            if base <= offset:
+                return base
+        raise ValueError(f"Offset {offset} is not in the spool")
+
+    def _open_reader(self, offset: int) -> None:
+        """Open the segment containing an offset and seek to the record."""
+        if self._reader is not None:
+            self._reader.close()
+        base = self._segment_for(offset)
+        self._reader = open(self._segment_path(base), "rb")
+        self._reader_segment = base
+        for _ in _iter_frames(self._reader, offset - base):
+            pass
+
+
+def worker_spool_dirs(
+    root: Path, index: int, workers: int
+) -> Tuple[Path, List[Path]]:
+    """Get the spool directory of a worker process, and the spool directories
+    that it adopts.
+
+    A single process spools to the root spool directory, while each of
+    several worker processes spools to a ``worker-<index>`` subdirectory.
+    Once the number of workers changes, the spools of the previous layout
+    are left over. They're adopted so that their messages are forwarded:
+    the root spool by worker 0, and each leftover ``worker-<n>`` spool by
+    worker ``n % workers``.
+
+    Parameters
+    ----------
+    root : `pathlib.Path`
+        The root spool directory (the ``spool_dir`` configuration).
+    index : `int`
+        The index of the worker.
+    workers : `int`
+        The number of workers.
+
+    Returns
+    -------
+    directory : `pathlib.Path`
+        The worker's spool directory.
+    adopted : `list` of `pathlib.Path`
+        The leftover spool directories that have segments, which the worker
+        forwards.
+    """
+    if workers == 1:
+        directory = root
+    else:
+        directory = root / f"worker-{index}"
+
+    adopted: List[Path] = []
+    if workers > 1 and index == 0 and _has_segments(root):
+        adopted.append(root)
+    if root.is_dir():
+        subdirectories = []
+        for path in root.glob("worker-*"):
+            suffix = path.name[len("worker-") :]
+            if path.is_dir() and suffix.isdigit():
+                subdirectories.append((int(suffix), path))
+        for number, path in sorted(subdirectories):
+            if workers > 1 and number < workers:
+                continue
+            if number % workers == index and _has_segments(path):
+                adopted.append(path)
+    return directory, adopted
+
+
+def _has_segments(directory: Path) -> bool:
+    return any(directory.glob(f"*{_SEGMENT_SUFFIX}"))
+
+
+def _encode_record(
+    topic: str,
+    key: bytes,
+    value: Optional[bytes],
+    partition: Optional[int] = None,
+) -> bytes:
+    topic_bytes = topic.encode()
+    topic_length = len(topic_bytes)
+    if value is None:
+        topic_length |= _TOMBSTONE_FLAG
+        value = b""
+    if partition is None:
+        header = struct.pack(">H", topic_length)
+    else:
+        header = struct.pack(">HI", topic_length | _PARTITION_FLAG, partition)
+    return b"".join(
+        (header, topic_bytes, struct.pack(">I", len(key)), key, value)
+    )
+
+
+def _decode_record(offset: int, body: bytes) -> SpoolRecord:
+    (topic_length,) = struct.unpack_from(">H", body, 0)
+    position = 2
+    partition: Optional[int] = None
+    if topic_length & _PARTITION_FLAG:
+        topic_length &= ~_PARTITION_FLAG
+        (partition,) = struct.unpack_from(">I", body, position)
+        position += 4
+    tombstone = bool(topic_length & _TOMBSTONE_FLAG)
+    topic_length &= ~_TOMBSTONE_FLAG
+    topic = body[position : position + topic_length].decode()
+    position += topic_length
+    (key_length,) = struct.unpack_from(">I", body, position)
+    position += 4
+    key = body[position : position + key_length]
+    value = None if tombstone else body[position + key_length :]
+    return SpoolRecord(
+        offset=offset, topic=topic, key=key, value=value, partition=partition
+    )
+
+
+def _read_frame(f: BinaryIO) -> Optional[bytes]:
+    """Read a record body, or return `None` at the end of the segment (or
+    at a torn or corrupt record).
+    """
+    frame = f.read(_FRAME.size)
+    if len(frame) < _FRAME.size:
+        return None
+    length, crc = _FRAME.unpack(frame)
+    body = f.read(length)
+    if len(body) < length or zlib.crc32(body) != crc:
+        return None
+    return body
+
+
+def _read_record(f: BinaryIO, offset: int) -> Optional[SpoolRecord]:
+    position = f.tell()
+    body = _read_frame(f)
+    if body is None:
+        # Leave the file positioned at the start of the incomplete record so
+        # it can be read once the write completes.
+        f.seek(position)
+        return None
+    return _decode_record(offset, body)
+
+
+def _iter_frames(f: BinaryIO, count: int) -> Iterator[bytes]:
+    for _ in range(count):
+        body = _read_frame(f)
+        if body is None:
+            return
+        yield body
+
+
+def _scan_segment(path: Path) -> Tuple[int, int]:
+    """Count the valid records in a segment.
+
+    Returns
+    -------
+    count : `int`
+        The number of valid records.
+    size : `int`
+        The size, in bytes, of the valid records.
+    """
+    count = 0
+    with open(path, "rb") as f:
+        while True:
+            size = f.tell()
+            if _read_frame(f) is None:
+                return count, size
+            count += 1
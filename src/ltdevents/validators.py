@@ -0,0 +1,194 @@
+"""Compiled fast-path validators for webhook payload models.
+
+The pydantic models in `ltdevents.webhookmodels` are the schema of record
+for webhook payloads. Constructing a model instance, though, and then copying
+it back into a `dict` for Avro serialization, is a large share of the cost of
+handling a webhook. `compile_validator` walks a model's fields once and
+builds a function that checks a decoded JSON payload against a conservative
+subset of what pydantic accepts, producing the same record that
+``Model.parse_obj(payload).dict()`` would.
+
+A compiled validator never rejects a payload. If a value isn't certainly
+valid (for example, a timestamp without a timezone, or a number where a
+string is expected), the validator returns `None` and the caller falls back
+to the pydantic model, which either coerces the value or raises the usual
+`pydantic.ValidationError`.
+"""
+
+from __future__ import annotations
+
+import copy
+import datetime
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, Extra, HttpUrl
+
+__all__ = ["compile_validator", "FastValidator"]
+
+FastValidator = Callable[[Any], Optional[Dict[str, Any]]]
+"""Type of a compiled validator: takes a decoded JSON payload and returns
+the validated record, or `None` if the payload needs to be validated by
+pydantic.
+"""
+
+_HTTP_URL_PATTERN = re.compile(
+    r"https?://"
+    r"(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+"
+    r"[A-Za-z]{2,63}"
+    r"(?:[/?#][A-Za-z0-9\-._~%!$&'()*+,;=:@/?#]*)?"
+)
+"""A conservative pattern for `pydantic.HttpUrl` values: no user info, no
+port, no IP addresses, and an alphabetic top-level domain.
+"""
+
+_HTTP_URL_MAX_LENGTH = 2083
+"""The maximum length of a `pydantic.HttpUrl`."""
+
+_DATETIME_PATTERN = re.compile(
+    r"([0-9]{4})-([0-9]{2})-([0-9]{2})"
+    r"T([0-9]{2}):([0-9]{2}):([0-9]{2})(?:\.([0-9]{1,6}))?"
+    r"(Z|[+-][0-9]{2}:[0-9]{2})"
+)
+"""A conservative pattern for datetimes: ISO 8601 with seconds and an
+explicit timezone.
+"""
+
+
+class _Fallback(Exception):
+    """Raised by a compiled field check when a value needs to be validated
+    by pydantic.
+    """
+
+
+class _Unsupported(Exception):
+    """Raised while compiling a validator for a model that has a field type
+    or feature that the fast path doesn't support.
+    """
+
+
+def compile_validator(model: Type[BaseModel]) -> Optional[FastValidator]:
+    """Compile a fast-path validator for a pydantic model.
+
+    Parameters
+    ----------
+    model : `pydantic.BaseModel` subclass
+        The pydantic model.
+
+    Returns
+    -------
+    validator : callable or `None`
+        A function that takes a decoded JSON payload and returns the record
+        (the equivalent of ``model.parse_obj(payload).dict()``), or `None` if
+        the payload must be validated by the pydantic model. `None` is
+        returned instead of a function if the model uses features that the
+        fast path doesn't support, such as custom validators.
+    """
+    try:
+        validate = _compile_model(model)
+    except _Unsupported:
+        return None
+
+    def validator(payload: Any) -> Optional[Dict[str, Any]]:
+        try:
+            return validate(payload)
+        except _Fallback:
+            return None
+
+    return validator
+
+
+def _compile_model(model: Type[BaseModel]) -> Callable[[Any], Dict[str, Any]]:
+    if (
+        model.__config__.extra != Extra.ignore
+        or model.__validators__
+        or model.__pre_root_validators__
+        or model.__post_root_validators__
+    ):
+        raise _Unsupported(model)
+
+    fields: List[Tuple[str, str, Callable[[Any], Any], bool, Any]] = []
+    for field in model.__fields__.values():
+        fields.append(
+            (
+                field.name,
+                field.alias,
+                _compile_type(field.outer_type_),
+                bool(field.required),
+                field.default,
+            )
+        )
+
+    def validate(value: Any) -> Dict[str, Any]:
+        if type(value) is not dict:
+            raise _Fallback
+        record = {}
+        for name, alias, check, required, default in fields:
+            try:
+                field_value = value[alias]
+            except KeyError:
+                if required:
+                    raise _Fallback
+                record[name] = copy.deepcopy(default)
+                continue
+            record[name] = check(field_value)
+        return record
+
+    return validate
+
+
+def _compile_type(type_: Any) -> Callable[[Any], Any]:
+    if type_ is str:
+        return _check_str
+    elif type_ is HttpUrl:
+        return _check_http_url
+    elif type_ is datetime.datetime:
+        return _check_datetime
+    elif isinstance(type_, type) and issubclass(type_, BaseModel):
+        return _compile_model(type_)
+    raise _Unsupported(type_)
+
+
+def _check_str(value: Any) -> str:
+    if type(value) is not str:
+        raise _Fallback
+    return value
+
+
+def _check_http_url(value: Any) -> str:
+    if (
+        type(value) is not str
+        or len(value) > _HTTP_URL_MAX_LENGTH
+        or _HTTP_URL_PATTERN.fullmatch(value) is None
+    ):
+        raise _Fallback
+    return value
+
+
+def _check_datetime(value: Any) -> datetime.datetime:
+    if type(value) is not str:
+        raise _Fallback
+    match = _DATETIME_PATTERN.fullmatch(value)
+    if match is None:
+        raise _Fallback
+    year, month, day, hour, minute, second, fraction, tz = match.groups()
+    try:
+        if tz == "Z":
+            tzinfo = datetime.timezone.utc
+        else:
+            offset = datetime.timedelta(
+                hours=int(tz[1:3]), minutes=int(tz[4:6])
+            )
+            tzinfo = datetime.timezone(-offset if tz[0] == "-" else offset)
+        return datetime.datetime(
+            int(year),
+            int(month),
+            int(day),
+            int(hour),
+            int(minute),
+            int(second),
+            int(fraction.ljust(6, "0")) if fraction else 0,
+            tzinfo=tzinfo,
+        )
+    except ValueError:
+        raise _Fallback
@@ -1,65 +1,68 @@
 """Models for webhook payloads from LTD Keeper that are recieved by the
 ``post_webhook`` endpoint.
+
+The models are dispatched by event type through the event registry (see
+`ltdevents.eventregistry`).
 """
 
 from __future__ import annotations
 
 import datetime
-from typing import Any, Dict
 
 from pydantic import BaseModel, HttpUrl
 
-__all__ = ["parse_event", "EditionUpdatedEvent"]
+__all__ = [
+    "BaseEvent",
+    "ProductInfo",
+    "EditionInfo",
+    "DeletedEditionInfo",
+    "BuildInfo",
+    "EditionUpdatedEvent",
+    "EditionDeletedEvent",
+    "BuildUploadedEvent",
+    "ProductCreatedEvent",
+]
 
 
-def parse_event(payload: Dict[str, Any], logger: Any) -> BaseEvent:
-    """Parse a webhook payload (automatically sorting its event type).
+class ProductInfo(BaseModel):
+    """A model for information about an LSST the Docs product.
 
-    Parameters
-    ----------
-    payload : `dict`
-        The webhook payload body, parsed from JSON.
-    logger
-        Structlog logger instance.
+    This model appears within webhook payload models.
+    """
 
-    Returns
-    -------
-    pydantic.BaseEvent
-        The parsed payload, depending on the webhook event type:
+    url: HttpUrl
 
-        edition.updated
-            `EditionUpdatedEvent`
-    """
-    try:
-        event_type = payload["event_type"]
-    except KeyError:
-        raise RuntimeError("Payload does not contain ``event_type``.")
+    published_url: HttpUrl
 
-    if event_type == "edition.updated":
-        event = EditionUpdatedEvent.parse_obj(payload)
-    else:
-        raise RuntimeError(f"Payload type ``{event_type}`` is not known.")
+    title: str
 
-    return event
+    slug: str
 
 
-class ProductInfo(BaseModel):
-    """A model for information about an LSST the Docs product.
+class EditionInfo(BaseModel):
+    """A model for information about an edition.
 
     This model appears within webhook payload models.
     """
 
     url: HttpUrl
+    """The LTD Keeper API URL of the edition resource."""
 
     published_url: HttpUrl
+    """The website URL of the edition."""
 
     title: str
+    """The title of the edition."""
 
     slug: str
+    """The LTD Keeper API slug of the edition resource."""
 
+    build_url: HttpUrl
+    """The LTD Keeper API URL of the edition's build resource."""
 
-class EditionInfo(BaseModel):
-    """A model for information about an edition.
+
+class DeletedEditionInfo(BaseModel):
+    """A model for information about an edition that was deleted.
 
     This model appears within webhook payload models.
     """
@@ -76,8 +79,21 @@ class EditionInfo(BaseModel):
     slug: str
     """The LTD Keeper API slug of the edition resource."""
 
-    build_url: HttpUrl
-    """The LTD Keeper API URL of the edition's build resource."""
+
+class BuildInfo(BaseModel):
+    """A model for information about a build.
+
+    This model appears within webhook payload models.
+    """
+
+    url: HttpUrl
+    """The LTD Keeper API URL of the build resource."""
+
+    published_url: HttpUrl
+    """The website URL of the build."""
+
+    slug: str
+    """The LTD Keeper API slug of the build resource."""
 
 
 class BaseEvent(BaseModel):
@@ -98,3 +114,39 @@ class EditionUpdatedEvent(BaseEvent):
 
     product: ProductInfo
     """Information about the edition's product resource."""
+
+
+class EditionDeletedEvent(BaseEvent):
+    """A webhook payload model for edition.deleted events."""
+
+    event_type: str = "edition.deleted"
+    """Name of the event."""
+
+    edition: DeletedEditionInfo
+    """Information about the edition that was deleted."""
+
+    product: ProductInfo
+    """Information about the edition's product resource."""
+
+
+class BuildUploadedEvent(BaseEvent):
+    """A webhook payload model for build.uploaded events."""
+
+    event_type: str = "build.uploaded"
+    """Name of the event."""
+
+    build: BuildInfo
+    """Information about the build that was uploaded."""
+
+    product: ProductInfo
+    """Information about the build's product resource."""
+
+
+class ProductCreatedEvent(BaseEvent):
+    """A webhook payload model for product.created events."""
+
+    event_type: str = "product.created"
+    """Name of the event."""
+
+    product: ProductInfo
+    """Information about the product that was created."""
@@ -0,0 +1,239 @@
+"""Multi-process serving for the ``ltdevents run --workers`` command.
+
+A `WorkerSupervisor` starts several worker processes that each run the
+application on its own event loop. The workers bind the same port with
+``SO_REUSEPORT``, so the kernel balances incoming connections among them.
+Each worker creates its own Kafka producer and Schema Registry client through
+the application's cleanup contexts.
+
+The supervisor restarts workers that exit unexpectedly. On ``SIGTERM`` or
+``SIGINT``, it asks every worker to shut down gracefully (which runs the
+application's cleanup contexts, flushing the publish queue) and only kills
+workers that don't exit within the shutdown timeout.
+
+All other in-memory state is also per worker, and a request is answered by
+whichever worker the kernel picks:
+
+- ``/metrics`` serves the metrics of one worker, so its counters and
+  histograms only cover that worker's share of the requests (scrape
+  ``/metrics`` with a single worker where complete metrics matter).
+- ``/<app-name>/events`` lists the events stored by one worker.
+- ``/lag`` summarizes the lag of the events acknowledged by one worker.
+- ``/webhook/queue`` reports the publish queue, admission, sink and circuit
+  breaker state of one worker (the ``worker`` field is the worker's index).
+- De-duplication and coalescing windows and admission limits apply per
+  worker, so a duplicate webhook that reaches a different worker is
+  published again, only the events that reach the same worker are
+  coalesced, and the admission limits are multiplied by the number of
+  workers.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import signal
+import time
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Optional
+
+import structlog
+from aiohttp.web import run_app
+
+__all__ = ["WorkerSupervisor", "serve_worker"]
+
+
+def serve_worker(
+    index: int, host: Optional[str], port: int, workers: int
+) -> None:
+    """Run the application in a worker process.
+
+    Parameters
+    ----------
+    index : `int`
+        The index of the worker, which is stable across restarts.
+    host : `str`, optional
+        The host to bind.
+    port : `int`
+        The port to bind, shared with the other workers.
+    workers : `int`
+        The number of workers.
+    """
+    from ltdevents.app import create_app
+    from ltdevents.config import Configuration
+
+    # Each worker appends to and forwards from its own spool (see
+    # ltdevents.spool.worker_spool_dirs)
+    config = Configuration()
+    config.worker_index = index
+    config.workers = workers
+    app = create_app(config)
+    run_app(app, host=host, port=port, reuse_port=True, print=_no_print)
+
+
+def _no_print(*args: Any, **kwargs: Any) -> None:
+    """Suppress `aiohttp.web.run_app`'s startup message, which every worker
+    would print.
+    """
+
+
+class WorkerSupervisor:
+    """A supervisor for a set of worker processes.
+
+    Parameters
+    ----------
+    workers : `int`
+        The number of worker processes.
+    port : `int`
+        The port that the workers bind.
+    host : `str`, optional
+        The host that the workers bind (all interfaces by default).
+    restart_delay : `float`, optional
+        Time, in seconds, to wait before restarting a worker that exited
+        unexpectedly.
+    shutdown_timeout : `float`, optional
+        Time, in seconds, to wait for workers to shut down gracefully before
+        they're killed.
+    logger_name : `str`, optional
+        Name of the logger.
+    target : callable, optional
+        The function that each worker process runs, called with the worker's
+        index, the host, the port, and the number of workers. The default is
+        `serve_worker`.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int,
+        port: int,
+        host: Optional[str] = None,
+        restart_delay: float = 1.0,
+        shutdown_timeout: float = 30.0,
+        logger_name: str = "ltdevents",
+        target: Callable[[int, Optional[str], int, int], None] = serve_worker,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("There must be at least one worker.")
+        self.workers = workers
+        self.port = port
+        self.host = host
+        self.restart_delay = restart_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.restart_count = 0
+        self._target = target
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, Any] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._stopping = False
+        self._logger = structlog.get_logger(logger_name)
+
+    @property
+    def pids(self) -> Dict[int, int]:
+        """The process IDs of the live workers, keyed by worker index."""
+        return {
+            index: process.pid
+            for index, process in self._processes.items()
+            if process.is_alive()
+        }
+
+    def run(self) -> None:
+        """Start the workers and supervise them until ``SIGTERM`` or
+        ``SIGINT`` is received, then shut them down.
+
+        This method must be called from the main thread.
+        """
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        self.start()
+        try:
+            while not self._stopping:
+                self.check(timeout=1.0)
+        finally:
+            self.stop()
+
+    def start(self) -> None:
+        """Start the worker processes."""
+        for index in range(self.workers):
+            self._start_worker(index)
+        self._logger.info(
+            "Started workers", workers=self.workers, port=self.port
+        )
+
+    def check(self, timeout: float = 0.0) -> None:
+        """Wait for workers to exit and restart the workers that have
+        exited.
+
+        Parameters
+        ----------
+        timeout : `float`, optional
+            Maximum time, in seconds, to wait for a worker to exit.
+        """
+        now = time.monotonic()
+        if self._restart_at:
+            timeout = max(
+                0.0, min(timeout, min(self._restart_at.values()) - now)
+            )
+        sentinels = [
+            process.sentinel
+            for index, process in self._processes.items()
+            if index not in self._restart_at
+        ]
+        wait(sentinels, timeout=timeout)
+        if self._stopping:
+            return
+
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive() or index in self._restart_at:
+                continue
+            process.join()
+            self._logger.error(
+                "Worker exited",
+                worker=index,
+                pid=process.pid,
+                exitcode=process.exitcode,
+            )
+            self._restart_at[index] = now + self.restart_delay
+
+        for index, restart_at in list(self._restart_at.items()):
+            if restart_at <= now:
+                del self._restart_at[index]
+                self._start_worker(index)
+                self.restart_count += 1
+                self._logger.info("Restarted worker", worker=index)
+
+    def stop(self) -> None:
+        """Shut the workers down gracefully, killing the workers that don't
+        exit within the shutdown timeout.
+        """
+        self._stopping = True
+        self._restart_at.clear()
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for index, process in self._processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                self._logger.warning(
+                    "Killing worker that didn't shut down",
+                    worker=index,
+                    pid=process.pid,
+                )
+                process.kill()
+                process.join()
+        self._logger.info("Stopped workers")
+
+    def _start_worker(self, index: int) -> None:
+        process = self._context.Process(
+            target=self._target,
+            args=(index, self.host, self.port, self.workers),
+            name=f"ltdevents-worker-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+
+    def _handle_signal(self, signum: int, frame: Any) -> None:
+        self._logger.info("Shutting down workers", signal=signum)
+        self._stopping = True
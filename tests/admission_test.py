@@ -0,0 +1,64 @@
+"""Tests for the ltdevents.admission module."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from ltdevents.admission import AdmissionController, AdmissionRejected
+from ltdevents.metrics import WebhookMetrics
+
+
+async def test_admission_controller() -> None:
+    controller = AdmissionController(
+        max_in_flight=1, max_queued=1, queue_timeout=0.05, retry_after=1
+    )
+    await controller.acquire()
+    assert controller.in_flight == 1
+
+    # The second request waits in the queue until the first is released
+    waiter = asyncio.ensure_future(controller.acquire())
+    await asyncio.sleep(0)
+    assert controller.queued == 1
+
+    # The queue is full
+    with pytest.raises(AdmissionRejected) as excinfo:
+        await controller.acquire()
+    assert excinfo.value.status == 429
+
+    controller.release()
+    await waiter
+    assert controller.in_flight == 1
+    assert controller.queued == 0
+
+    # A queued request times out
+    with pytest.raises(AdmissionRejected) as excinfo:
+        await controller.acquire()
+    assert excinfo.value.status == 503
+    assert controller.rejected == {"queue_full": 1, "queue_timeout": 1}
+
+    controller.release()
+    assert controller.in_flight == 0
+
+
+async def test_admission_metrics() -> None:
+    metrics = WebhookMetrics()
+    controller = AdmissionController(
+        max_in_flight=2, max_queued=0, queue_timeout=0.05, retry_after=1
+    )
+    metrics.track_admission(controller)
+    await controller.acquire()
+    await controller.acquire()
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire()
+
+    registry = metrics.registry
+    assert registry.get_sample_value("ltdevents_webhook_in_flight") == 2
+    assert registry.get_sample_value("ltdevents_webhook_in_flight_limit") == 2
+    assert (
+        registry.get_sample_value(
+            "ltdevents_webhook_rejected_total", {"reason": "queue_full"}
+        )
+        == 1
+    )
@@ -0,0 +1,71 @@
+"""Tests for the ltdevents.backfill module."""
+
+from __future__ import annotations
+
+import copy
+import json
+from pathlib import Path
+from typing import List
+
+from ltdevents.backfill import Checkpoint, backfill, ndjson_source
+from ltdevents.bench import (
+    PAYLOAD_TEMPLATES,
+    FakeKafkaProducer,
+    create_bench_app,
+)
+
+
+def write_dump(path: Path, count: int) -> None:
+    lines: List[str] = []
+    for i in range(count):
+        payload = copy.deepcopy(PAYLOAD_TEMPLATES["edition.updated"])
+        payload["edition"]["slug"] = str(i)
+        lines.append(json.dumps(payload))
+    lines.insert(2, "{not json")
+    lines.insert(4, json.dumps({"event_type": "edition.nonexistent"}))
+    path.write_text("\n".join(lines) + "\n")
+
+
+async def test_ndjson_source_resume(tmp_path: Path) -> None:
+    dump_path = tmp_path / "dump.ndjson"
+    write_dump(dump_path, 5)
+
+    items = [item async for item in ndjson_source(dump_path)]
+    assert len(items) == 7
+    assert isinstance(items[2][0], ValueError)
+
+    resumed = [item async for item in ndjson_source(dump_path, items[3][1])]
+    assert resumed == items[4:]
+
+
+async def test_backfill(tmp_path: Path) -> None:
+    dump_path = tmp_path / "dump.ndjson"
+    checkpoint_path = tmp_path / "checkpoint.json"
+    write_dump(dump_path, 20)
+
+    producer = FakeKafkaProducer()
+    progress = await backfill(
+        str(dump_path),
+        checkpoint_path=checkpoint_path,
+        max_pending=4,
+        app=create_bench_app(producer),
+    )
+    assert progress.read == 22
+    assert progress.published == 20
+    assert progress.invalid == 2
+    assert producer.message_count == 20
+
+    checkpoint = Checkpoint(checkpoint_path, str(dump_path))
+    assert checkpoint.load() == {"offset": dump_path.stat().st_size}
+
+    # Resuming from the checkpoint publishes only the new payloads
+    with dump_path.open("a") as f:
+        f.write(json.dumps(PAYLOAD_TEMPLATES["edition.updated"]) + "\n")
+    producer = FakeKafkaProducer()
+    progress = await backfill(
+        str(dump_path),
+        checkpoint_path=checkpoint_path,
+        app=create_bench_app(producer),
+    )
+    assert progress.read == 1
+    assert producer.message_count == 1
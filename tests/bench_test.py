@@ -0,0 +1,55 @@
+"""Tests for the ltdevents.bench module."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from ltdevents.bench import (
+    BenchmarkResult,
+    make_payloads,
+    parse_mix,
+    run_benchmark,
+)
+
+
+def test_parse_mix() -> None:
+    assert parse_mix("edition.updated=3,build.uploaded,invalid=0.5") == {
+        "edition.updated": 3.0,
+        "build.uploaded": 1.0,
+        "invalid": 0.5,
+    }
+    with pytest.raises(ValueError):
+        parse_mix("edition.nonexistent")
+
+
+def test_make_payloads() -> None:
+    payloads = make_payloads(
+        {"edition.updated": 1, "product.created": 1}, 20, editions=3
+    )
+    assert len(payloads) == 20
+    event_types = {json.loads(p)["event_type"] for p in payloads}
+    assert event_types == {"edition.updated", "product.created"}
+
+
+def test_percentile() -> None:
+    result = BenchmarkResult(
+        duration=1.0, latencies=[float(i) for i in range(1, 101)]
+    )
+    assert result.percentile(50) == 50.0
+    assert result.percentile(99) == 99.0
+    assert result.throughput == 100.0
+
+
+async def test_run_benchmark() -> None:
+    weights = parse_mix("edition.updated=2,build.uploaded,invalid")
+    payloads = make_payloads(weights, 40, editions=5)
+    invalid = sum(
+        1 for p in payloads if json.loads(p)["event_timestamp"][0] == "n"
+    )
+
+    result = await run_benchmark(payloads, concurrency=4, warmup=5)
+    assert result.requests == 40
+    assert result.statuses == {200: 40 - invalid, 400: invalid}
+    assert result.messages == 40 - invalid
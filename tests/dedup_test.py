@@ -0,0 +1,231 @@
+"""Tests for the ltdevents.dedup module."""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+from typing import Any, Dict, List
+
+from ltdevents.bench import PAYLOAD_TEMPLATES, FakeKafkaProducer
+from ltdevents.dedup import Coalescer, Deduplicator, DuplicateFilter
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+from ltdevents.metrics import WebhookMetrics
+from ltdevents.publisher import DirectPublisher, OutboundMessage
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RecordingPublisher(DirectPublisher):
+    def __init__(self, fail: bool = False) -> None:
+        super().__init__(FakeKafkaProducer())
+        self.fail = fail
+        self.published: List[OutboundMessage] = []
+
+    async def publish(self, message: OutboundMessage) -> None:
+        if self.fail:
+            raise RuntimeError("Publish failed")
+        self.published.append(message)
+
+
+def make_record(build: str, edition: str = "1.0") -> Dict[str, Any]:
+    payload = copy.deepcopy(PAYLOAD_TEMPLATES["edition.updated"])
+    payload["edition"]["slug"] = edition
+    payload["edition"][
+        "build_url"
+    ] = f"https://keeper.lsst.codes/builds/{build}"
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    return registry.parse(payload)[1]
+
+
+def make_message(value: str, key: bytes = b"k") -> OutboundMessage:
+    return OutboundMessage(topic="ltd.events", key=key, value=value.encode())
+
+
+def test_duplicate_filter_window() -> None:
+    clock = FakeClock()
+    dedup = DuplicateFilter(window=5.0, max_entries=10, clock=clock)
+    assert dedup.is_duplicate("a") is False
+    # Keys are only duplicates once they're remembered
+    assert dedup.is_duplicate("a") is False
+    dedup.remember("a")
+    clock.now = 4.0
+    assert dedup.is_duplicate("a") is True
+    assert dedup.is_duplicate("b") is False
+    dedup.remember("a")
+    dedup.remember("b")
+
+    # The window is measured from the first time a key is remembered
+    clock.now = 5.0
+    assert dedup.is_duplicate("a") is False
+    assert dedup.is_duplicate("b") is True
+    assert dedup.suppressed == 2
+
+
+def test_duplicate_filter_max_entries() -> None:
+    clock = FakeClock()
+    dedup = DuplicateFilter(window=5.0, max_entries=2, clock=clock)
+    for key in ("a", "b", "c"):
+        assert dedup.is_duplicate(key) is False
+        dedup.remember(key)
+    assert len(dedup) == 2
+    # "a" was forgotten to make room for "c"
+    assert dedup.is_duplicate("a") is False
+    assert dedup.is_duplicate("c") is True
+
+
+async def test_coalescer() -> None:
+    publisher = RecordingPublisher()
+    coalescer = Coalescer(publisher, window=0.05, max_entries=10)
+    assert coalescer.hold("a", make_message("a1")) is False
+    assert coalescer.hold("a", make_message("a2")) is True
+    assert coalescer.hold("b", make_message("b1")) is False
+    assert publisher.published == []
+
+    await asyncio.sleep(0.1)
+    assert [m.value for m in publisher.published] == [b"a2", b"b1"]
+    assert coalescer.coalesced == 1
+    assert len(coalescer) == 0
+
+
+async def test_coalescer_max_entries_and_close() -> None:
+    publisher = RecordingPublisher()
+    coalescer = Coalescer(publisher, window=60.0, max_entries=1)
+    coalescer.hold("a", make_message("a1"))
+    coalescer.hold("b", make_message("b1"))
+    await asyncio.sleep(0)
+    assert [m.value for m in publisher.published] == [b"a1"]
+
+    await coalescer.close()
+    assert [m.value for m in publisher.published] == [b"a1", b"b1"]
+
+
+async def test_coalescer_release_before() -> None:
+    publisher = RecordingPublisher()
+    coalescer = Coalescer(publisher, window=60.0, max_entries=10)
+    published: List[str] = []
+    coalescer.hold(
+        "a", make_message("a1", key=b"a"), lambda: published.append("a1")
+    )
+    coalescer.hold(
+        "a", make_message("a2", key=b"a"), lambda: published.append("a2")
+    )
+    coalescer.hold("b", make_message("b1", key=b"b"))
+
+    # Only the held message with the same key is released, and only the
+    # latest event's callback is called
+    tasks = coalescer.release_before(make_message("a3", key=b"a"))
+    assert len(tasks) == 1
+    assert published == []
+    await asyncio.wait(tasks)
+    assert [m.value for m in publisher.published] == [b"a2"]
+    assert published == ["a2"]
+    assert len(coalescer) == 1
+    assert coalescer.release_before(make_message("a3", key=b"a")) == set()
+
+    # Messages being published are also waited for
+    tasks = coalescer.release_before(make_message("b2", key=b"b"))
+    assert coalescer.release_before(make_message("b2", key=b"b")) == tasks
+    await asyncio.wait(tasks)
+    assert [m.value for m in publisher.published] == [b"a2", b"b1"]
+
+
+async def test_coalescer_publish_failure() -> None:
+    coalescer = Coalescer(
+        RecordingPublisher(fail=True), window=60.0, max_entries=10
+    )
+    published: List[str] = []
+    coalescer.hold("a", make_message("a1"), lambda: published.append("a1"))
+    await coalescer.close()
+    assert published == []
+    assert coalescer.failed == 1
+
+
+async def test_deduplicator_drop() -> None:
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    metrics = WebhookMetrics()
+    deduplicator = Deduplicator(
+        "drop",
+        RecordingPublisher(),
+        window=60.0,
+        max_entries=10,
+        metrics=metrics,
+    )
+    event_type = registry["edition.updated"]
+    assert deduplicator.is_duplicate(event_type, make_record("1")) is False
+    # An event that failed to publish isn't remembered, so its retry isn't
+    # a duplicate
+    assert deduplicator.is_duplicate(event_type, make_record("1")) is False
+    deduplicator.remember(event_type, make_record("1"))
+    assert deduplicator.is_duplicate(event_type, make_record("1")) is True
+    assert deduplicator.is_duplicate(event_type, make_record("2")) is False
+    assert (
+        deduplicator.is_duplicate(event_type, make_record("1", edition="2.0"))
+        is False
+    )
+    assert (
+        metrics.registry.get_sample_value(
+            "ltdevents_webhook_suppressed_total",
+            {"event_type": "edition.updated", "reason": "duplicate"},
+        )
+        == 1
+    )
+
+    # Event types without a dedup_key aren't de-duplicated
+    product_type = registry["product.created"]
+    record = {"product": {"slug": "example"}}
+    deduplicator.remember(product_type, record)
+    assert deduplicator.is_duplicate(product_type, record) is False
+    assert deduplicator.is_duplicate(product_type, record) is False
+
+
+async def test_deduplicator_coalesce() -> None:
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    publisher = RecordingPublisher()
+    deduplicator = Deduplicator(
+        "coalesce", publisher, window=60.0, max_entries=10
+    )
+    event_type = registry["edition.updated"]
+    assert deduplicator.is_duplicate(event_type, make_record("1")) is False
+    assert deduplicator.hold(event_type, make_record("1"), make_message("1"))
+    assert deduplicator.hold(event_type, make_record("2"), make_message("2"))
+    assert deduplicator.size == 1
+
+    await deduplicator.close()
+    assert [m.value for m in publisher.published] == [b"2"]
+
+
+async def test_deduplicator_coalesce_flush() -> None:
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    metrics = WebhookMetrics()
+    publisher = RecordingPublisher(fail=True)
+    deduplicator = Deduplicator(
+        "coalesce", publisher, window=60.0, max_entries=10, metrics=metrics
+    )
+    event_type = registry["edition.updated"]
+    deduplicator.hold(event_type, make_record("1"), make_message("1"))
+
+    # A message that isn't held publishes the held message for its key first
+    await deduplicator.flush(make_message("deleted"))
+    assert deduplicator.size == 0
+    assert (
+        metrics.registry.get_sample_value("ltdevents_coalesce_failed_total")
+        == 1
+    )
+
+
+def test_deduplicator_off() -> None:
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    deduplicator = Deduplicator(
+        "off", RecordingPublisher(), window=60.0, max_entries=10
+    )
+    event_type = registry["edition.updated"]
+    record = make_record("1")
+    deduplicator.remember(event_type, record)
+    assert deduplicator.is_duplicate(event_type, record) is False
+    assert deduplicator.hold(event_type, record, make_message("1")) is False
@@ -0,0 +1,176 @@
+"""Tests for the ltdevents.enrichment module."""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import datetime
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict
+
+import aiohttp
+import fastavro
+from aiohttp import web
+from kafkit.registry.manager import RecordNameSchemaManager
+from kafkit.registry.sansio import MockRegistryApi
+
+from ltdevents.bench import PAYLOAD_TEMPLATES
+from ltdevents.enrichment import Enricher, ResourceFetcher, TTLCache
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+from ltdevents.serializers import AvroSerializers
+
+if TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestServer
+
+SCHEMA_ROOT = Path(__file__).parent.parent / "src" / "ltdevents" / "schemas"
+
+BUILD = {
+    "self_url": "https://keeper.lsst.codes/builds/1",
+    "slug": "1",
+    "published_url": "https://example.lsst.io/builds/1",
+    "git_refs": ["main"],
+    "date_created": "2020-01-01T11:59:00Z",
+}
+
+PRODUCT = {
+    "self_url": "https://keeper.lsst.codes/products/example",
+    "slug": "example",
+    "doc_repo": "https://github.com/lsst/example",
+}
+
+
+def test_ttl_cache() -> None:
+    now = 0.0
+    cache = TTLCache(ttl=10.0, max_entries=2, clock=lambda: now)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == (True, 1)
+    cache.set("c", 3)
+    # "b" is the least recently used entry
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+
+    now = 10.0
+    assert cache.get("a") == (False, None)
+    assert len(cache) == 1
+
+
+async def make_keeper(aiohttp_server: Any, counts: Dict[str, int]) -> str:
+    """Start a fake LTD Keeper API and return its root URL."""
+
+    async def get_build(request: web.Request) -> web.Response:
+        counts["build"] = counts.get("build", 0) + 1
+        await asyncio.sleep(0.05)
+        return web.json_response(BUILD)
+
+    async def get_product(request: web.Request) -> web.Response:
+        counts["product"] = counts.get("product", 0) + 1
+        return web.Response(status=500)
+
+    async def get_invalid_build(request: web.Request) -> web.Response:
+        counts["invalid"] = counts.get("invalid", 0) + 1
+        if request.match_info["build"] == "2":
+            return web.json_response(["not", "an", "object"])
+        return web.json_response({"slug": 3, "published_url": ["x"]})
+
+    app = web.Application()
+    app.router.add_get("/builds/1", get_build)
+    app.router.add_get("/builds/{build:[23]}", get_invalid_build)
+    app.router.add_get("/products/example", get_product)
+    server: TestServer = await aiohttp_server(app)
+    return str(server.make_url("/"))
+
+
+async def test_enrich(aiohttp_server: Any) -> None:
+    counts: Dict[str, int] = {}
+    root = await make_keeper(aiohttp_server, counts)
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    payload = copy.deepcopy(PAYLOAD_TEMPLATES["edition.updated"])
+    event_type, record = registry.parse(payload)
+    record["edition"]["build_url"] = f"{root}builds/1"
+    record["product"]["url"] = f"{root}products/example"
+
+    async with aiohttp.ClientSession() as session:
+        fetcher = ResourceFetcher(
+            session,
+            cache=TTLCache(ttl=60.0, max_entries=10),
+            concurrency=2,
+            timeout=1.0,
+        )
+        enricher = Enricher(fetcher, base_url=root)
+        results = await asyncio.gather(
+            *(enricher.enrich(record) for _ in range(5))
+        )
+        await enricher.enrich(record)
+
+    # Concurrent lookups are coalesced, and later lookups are cached. The
+    # product resource failed, so it isn't cached.
+    assert counts == {"build": 1, "product": 2}
+    assert enricher.stats()["coalesced"] == 8
+    assert enricher.stats()["hits"] == 1
+    enriched = results[0]
+    assert enriched["build"]["slug"] == "1"
+    assert enriched["build"]["git_refs"] == ["main"]
+    assert enriched["build"]["date_created"] == datetime.datetime(
+        2020, 1, 1, 11, 59, tzinfo=datetime.timezone.utc
+    )
+    assert enriched["product"]["doc_repo"] is None
+    assert "build" not in record
+
+    schema_registry = MockRegistryApi()
+    manager = RecordNameSchemaManager(
+        root=SCHEMA_ROOT, registry=schema_registry
+    )
+    for schema_id, schema in enumerate(manager.schemas.values(), start=1):
+        schema_registry.schema_cache.insert(schema, schema_id)
+    serializers = await AvroSerializers.from_manager(manager, schema_registry)
+    message = registry.serialize(
+        event_type, enriched, serializers, enriched=True
+    )
+    schema = serializers["ltd.edition_update_v2"]._parsed_schema
+    assert message.value is not None
+    decoded = fastavro.schemaless_reader(BytesIO(message.value[5:]), schema)
+    assert decoded["build"]["slug"] == "1"
+    assert decoded["edition"]["slug"] == payload["edition"]["slug"]
+
+
+async def test_enrich_invalid(aiohttp_server: Any) -> None:
+    counts: Dict[str, int] = {}
+    root = await make_keeper(aiohttp_server, counts)
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    payload = copy.deepcopy(PAYLOAD_TEMPLATES["edition.updated"])
+    _, record = registry.parse(payload)
+
+    async with aiohttp.ClientSession() as session:
+        fetcher = ResourceFetcher(
+            session,
+            cache=TTLCache(ttl=60.0, max_entries=10),
+            concurrency=2,
+            timeout=1.0,
+        )
+        enricher = Enricher(fetcher, base_url=f"{root}builds")
+
+        # Resources that aren't JSON objects, or don't have a string slug,
+        # aren't enriched, and resources that aren't JSON objects aren't
+        # cached
+        for build in ("2", "3", "2"):
+            record["edition"]["build_url"] = f"{root}builds/{build}"
+            enriched = await enricher.enrich(record)
+            assert enriched["build"] is None
+        assert counts == {"invalid": 3}
+        assert fetcher.errors == 2
+
+        # URLs outside of the LTD Keeper base URL aren't fetched
+        for url in (
+            f"{root}products/example",
+            "http://169.254.169.254/builds/1",
+            f"{root}buildsx/1",
+        ):
+            record["edition"]["build_url"] = url
+            enriched = await enricher.enrich(record)
+            assert enriched["build"] is None
+        assert enriched["product"]["doc_repo"] is None
+        assert counts == {"invalid": 3}
+        # The product URL (on keeper.lsst.codes) is also rejected each time
+        assert enricher.stats()["rejected"] == 9
@@ -0,0 +1,180 @@
+"""Tests for the ltdevents.eventregistry module."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+from kafkit.registry.manager import RecordNameSchemaManager
+from kafkit.registry.sansio import MockRegistryApi
+
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry, EventType
+from ltdevents.partitioner import KeyPartitioner
+from ltdevents.serializers import AvroSerializers
+from ltdevents.webhookmodels import EditionUpdatedEvent
+
+SCHEMA_ROOT = Path(__file__).parent.parent / "src" / "ltdevents" / "schemas"
+
+PRODUCT = {
+    "published_url": "https://example.lsst.io/",
+    "url": "https://keeper.lsst.codes/products/example",
+    "title": "Example product",
+    "slug": "example",
+}
+
+PAYLOADS: Dict[str, Dict[str, Any]] = {
+    "edition.updated": {
+        "event_type": "edition.updated",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": PRODUCT,
+        "edition": {
+            "published_url": "https://example.lsst.io/v/1.0",
+            "url": "https://keeper.lsst.codes/editions/1234",
+            "title": "Version 1.0",
+            "slug": "1.0",
+            "build_url": "https://keeper.lsst.codes/builds/1",
+        },
+    },
+    "edition.deleted": {
+        "event_type": "edition.deleted",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": PRODUCT,
+        "edition": {
+            "published_url": "https://example.lsst.io/v/1.0",
+            "url": "https://keeper.lsst.codes/editions/1234",
+            "title": "Version 1.0",
+            "slug": "1.0",
+        },
+    },
+    "build.uploaded": {
+        "event_type": "build.uploaded",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": PRODUCT,
+        "build": {
+            "published_url": "https://example.lsst.io/builds/1",
+            "url": "https://keeper.lsst.codes/builds/1",
+            "slug": "1",
+        },
+    },
+    "product.created": {
+        "event_type": "product.created",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": PRODUCT,
+    },
+}
+
+
+async def make_serializers() -> AvroSerializers:
+    registry = MockRegistryApi()
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    for schema_id, schema in enumerate(manager.schemas.values(), start=1):
+        registry.schema_cache.insert(schema, schema_id)
+    return await AvroSerializers.from_manager(manager, registry)
+
+
+def test_all_event_types_have_payloads() -> None:
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    assert sorted(registry.names) == sorted(PAYLOADS.keys())
+
+
+@pytest.mark.parametrize("name", sorted(PAYLOADS.keys()))
+async def test_parse_and_serialize(name: str) -> None:
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    serializers = await make_serializers()
+    payload = PAYLOADS[name]
+
+    event_type, record = registry.parse(payload)
+    assert event_type.name == name
+    assert record == registry.parse_event(payload).dict()
+
+    message = registry.serialize(event_type, record, serializers)
+    assert message.topic == "ltd.events"
+    assert message.key == serializers.serialize_key(
+        event_type.key(record), name=event_type.key_schema
+    )
+    assert message.value == serializers.serialize(
+        record, name=event_type.value_schema
+    )
+
+
+async def test_serialize_partition() -> None:
+    partitioner = KeyPartitioner(8)
+    registry = EventRegistry(
+        EVENT_TYPES, default_topic="ltd.events", partitioner=partitioner
+    )
+    serializers = await make_serializers()
+
+    updated_type, updated = registry.parse(PAYLOADS["edition.updated"])
+    deleted_type, deleted = registry.parse(PAYLOADS["edition.deleted"])
+    updated_message = registry.serialize(updated_type, updated, serializers)
+    deleted_message = registry.serialize(deleted_type, deleted, serializers)
+    # Messages for the same edition are routed to the same partition
+    assert updated_message.partition == partitioner(("example", "1.0"))
+    assert deleted_message.partition == updated_message.partition
+
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    message = registry.serialize(updated_type, updated, serializers)
+    assert message.partition is None
+
+
+async def test_state_message() -> None:
+    registry = EventRegistry(
+        EVENT_TYPES, default_topic="ltd.events", state_topic="ltd.editions"
+    )
+    serializers = await make_serializers()
+
+    messages = {}
+    for name in ("edition.updated", "edition.deleted", "build.uploaded"):
+        event_type, record = registry.parse(PAYLOADS[name])
+        message = registry.serialize(event_type, record, serializers)
+        messages[name] = (message, registry.state_message(event_type, message))
+
+    updated, updated_state = messages["edition.updated"]
+    assert updated_state is not None
+    assert updated_state.topic == "ltd.editions"
+    assert updated_state.key == updated.key
+    assert updated_state.value == updated.value
+    deleted, deleted_state = messages["edition.deleted"]
+    assert deleted_state is not None
+    assert deleted_state.key == updated.key
+    assert deleted_state.value is None
+    assert messages["build.uploaded"][1] is None
+
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    event_type, _ = registry.parse(PAYLOADS["edition.updated"])
+    assert registry.state_message(event_type, updated) is None
+
+
+def test_topic_override() -> None:
+    event_type = EventType(
+        name="edition.updated",
+        model=EditionUpdatedEvent,
+        key_schema="ltd.edition_key_v1",
+        value_schema="ltd.edition_update_v1",
+        key=lambda r: (r["product"]["slug"], r["edition"]["slug"]),
+        topic="ltd.editions",
+    )
+    registry = EventRegistry([event_type], default_topic="ltd.events")
+    assert registry.topic("edition.updated") == "ltd.editions"
+
+    with pytest.raises(ValueError):
+        EventRegistry([event_type, event_type], default_topic="ltd.events")
+
+
+def test_parse_unknown_type() -> None:
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    payload = dict(PAYLOADS["edition.updated"])
+    payload["event_type"] = "edition.nonexistent"
+    with pytest.raises(RuntimeError):
+        registry.parse(payload)
+
+    del payload["event_type"]
+    with pytest.raises(RuntimeError):
+        registry.parse(payload)
+
+
+def test_parse_not_object() -> None:
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    with pytest.raises(RuntimeError):
+        registry.parse([PAYLOADS["edition.updated"]])  # type: ignore
@@ -0,0 +1,66 @@
+"""Tests for the ltdevents.eventstore module."""
+
+from __future__ import annotations
+
+import datetime
+import json
+from typing import Any, Dict, Optional
+
+import pytest
+
+from ltdevents.eventstore import EventStore
+
+
+def make_record(
+    minute: int, product: str, edition: Optional[str] = None
+) -> Dict[str, Any]:
+    record: Dict[str, Any] = {
+        "event_timestamp": datetime.datetime(
+            2020, 1, 1, 12, minute, tzinfo=datetime.timezone.utc
+        ),
+        "product": {"slug": product},
+    }
+    if edition is not None:
+        record["edition"] = {"slug": edition}
+    return record
+
+
+def test_query() -> None:
+    store = EventStore(10)
+    store.add("edition.updated", make_record(0, "a", "main"))
+    store.add("edition.updated", make_record(1, "b", "main"))
+    store.add("product.created", make_record(2, "c"))
+    store.add("edition.updated", make_record(3, "a", "v1"))
+    store.add("edition.updated", make_record(4, "a", "main"))
+
+    assert [e.id for e in store.query()] == [5, 4, 3, 2, 1]
+    assert [e.id for e in store.query(product="a")] == [5, 4, 1]
+    assert [e.id for e in store.query(product="a", edition="main")] == [5, 1]
+    assert [e.id for e in store.query(limit=2)] == [5, 4]
+    assert [e.id for e in store.query(before=4, limit=2)] == [3, 2]
+    since = datetime.datetime(2020, 1, 1, 12, 1)
+    until = datetime.datetime(2020, 1, 1, 12, 4, tzinfo=datetime.timezone.utc)
+    assert [e.id for e in store.query(since=since, until=until)] == [4, 3, 2]
+
+    body = json.loads(store.query(limit=1)[0].body)
+    assert body["id"] == 5
+    assert body["edition"]["slug"] == "main"
+    assert body["event_timestamp"].startswith("2020-01-01T12:04:00")
+
+    with pytest.raises(ValueError):
+        store.query(edition="main")
+
+
+def test_eviction() -> None:
+    store = EventStore(3)
+    store.add("edition.updated", make_record(0, "a", "main"))
+    store.add("edition.updated", make_record(1, "b", "main"))
+    store.add("edition.updated", make_record(2, "a", "main"))
+    store.add("edition.updated", make_record(3, "c", "main"))
+    store.add("edition.updated", make_record(4, "c", "main"))
+
+    assert len(store) == 3
+    assert store.last_id == 5
+    assert [e.id for e in store.query()] == [5, 4, 3]
+    assert [e.id for e in store.query(product="a")] == [3]
+    assert store.query(product="b") == []
@@ -0,0 +1,53 @@
+"""Tests for the ltdevents.handlers.external.events module and routes."""
+
+from __future__ import annotations
+
+import copy
+from typing import TYPE_CHECKING
+
+from ltdevents.bench import (
+    PAYLOAD_TEMPLATES,
+    FakeKafkaProducer,
+    create_bench_app,
+)
+
+if TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_get_events(aiohttp_client: TestClient) -> None:
+    """Test GET /app-name/events."""
+    app = create_bench_app(FakeKafkaProducer())
+    name = app["safir/config"].name
+    client = await aiohttp_client(app)
+
+    for slug in ("main", "v1", "v2"):
+        payload = copy.deepcopy(PAYLOAD_TEMPLATES["edition.updated"])
+        payload["edition"]["slug"] = slug
+        response = await client.post("/webhook", json=payload)
+        assert response.status == 200
+    product = PAYLOAD_TEMPLATES["edition.updated"]["product"]["slug"]
+
+    response = await client.get(
+        f"/{name}/events", params={"product": product, "limit": "2"}
+    )
+    assert response.status == 200
+    data = await response.json()
+    assert [e["edition"]["slug"] for e in data["events"]] == ["v2", "v1"]
+    etag = response.headers["ETag"]
+
+    assert data["next"].startswith(f"/{name}/events?")
+    response = await client.get(data["next"])
+    data = await response.json()
+    assert [e["edition"]["slug"] for e in data["events"]] == ["main"]
+    assert data["next"] is None
+
+    response = await client.get(
+        f"/{name}/events",
+        params={"product": product, "limit": "2"},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status == 304
+
+    response = await client.get(f"/{name}/events", params={"since": "x"})
+    assert response.status == 400
@@ -0,0 +1,91 @@
+"""Tests for the /healthz and /readyz endpoints."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from ltdevents.app import create_app
+from ltdevents.bench import FakeKafkaProducer, create_bench_app
+
+if TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_get_healthz(aiohttp_client: TestClient) -> None:
+    """Test GET /healthz."""
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    response = await client.get("/healthz")
+    assert response.status == 200
+
+
+async def test_get_readyz_not_configured(aiohttp_client: TestClient) -> None:
+    """Test GET /readyz when Kafka and the Schema Registry aren't
+    configured.
+    """
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    response = await client.get("/readyz")
+    assert response.status == 200
+    data = await response.json()
+    assert data["status"] == "ready"
+    assert data["checks"]["kafka_producer"]["status"] == "not configured"
+
+
+async def test_get_readyz(aiohttp_client: TestClient) -> None:
+    """Test GET /readyz with a producer that loses its brokers."""
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    client = await aiohttp_client(app)
+
+    response = await client.get("/readyz")
+    assert response.status == 200
+    data = await response.json()
+    assert data["checks"]["kafka_producer"]["brokers"] == 1
+    assert data["checks"]["schema_registration"]["status"] == "registered"
+
+    producer.client.cluster.broker_ids.clear()
+    response = await client.get("/readyz")
+    assert response.status == 503
+    data = await response.json()
+    assert data["status"] == "unready"
+    assert data["checks"]["kafka_producer"]["status"] == "no brokers"
+
+
+async def test_get_readyz_circuit_open(aiohttp_client: TestClient) -> None:
+    """Test GET /readyz while the Kafka circuit breaker is open."""
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    client = await aiohttp_client(app)
+    breaker = app["ltdevents/circuit_breaker"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    response = await client.get("/readyz")
+    assert response.status == 503
+    data = await response.json()
+    assert data["checks"]["kafka_producer"]["status"] == "circuit open"
+
+    breaker.record_success()
+    response = await client.get("/readyz")
+    assert response.status == 200
+
+
+async def test_get_readyz_buffered(aiohttp_client: TestClient) -> None:
+    """Test that GET /readyz stays ready while the Kafka circuit breaker is
+    open in the queue delivery mode, which buffers events.
+    """
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer, delivery_mode="queue")
+    client = await aiohttp_client(app)
+    breaker = app["ltdevents/circuit_breaker"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    response = await client.get("/readyz")
+    assert response.status == 200
+    data = await response.json()
+    assert data["checks"]["kafka_producer"]["status"] == "circuit open"
+    assert data["checks"]["kafka_producer"]["buffering"] is True
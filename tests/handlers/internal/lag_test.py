@@ -0,0 +1,50 @@
+"""Tests for the /lag endpoint."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from ltdevents.bench import (
+    PAYLOAD_TEMPLATES,
+    FakeKafkaProducer,
+    create_bench_app,
+)
+
+if TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_get_lag(aiohttp_client: TestClient) -> None:
+    """Test GET /lag after publishing events."""
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    client = await aiohttp_client(app)
+
+    payload = PAYLOAD_TEMPLATES["edition.updated"]
+    response = await client.post("/webhook", json=payload)
+    assert response.status == 200
+    response = await client.post("/webhook/batch", json=[payload, payload])
+    assert response.status == 200
+
+    response = await client.get("/lag")
+    assert response.status == 200
+    data = await response.json()
+    assert data["all"]["count"] == 3
+    updated = data["event_types"]["edition.updated"]
+    # The payload's event_timestamp is in 2020
+    assert updated["receipt"]["p50"] > 3600
+    assert updated["end_to_end"]["max"] >= updated["receipt"]["max"]
+
+    response = await client.get("/metrics")
+    text = await response.text()
+    assert 'segment="end_to_end"' in text
+
+
+async def test_get_lag_disabled(aiohttp_client: TestClient) -> None:
+    """Test GET /lag when lag tracking is disabled."""
+    app = create_bench_app(FakeKafkaProducer())
+    app["ltdevents/lag_tracker"] = None
+    client = await aiohttp_client(app)
+
+    response = await client.get("/lag")
+    assert response.status == 404
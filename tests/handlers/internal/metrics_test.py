@@ -0,0 +1,37 @@
+"""Tests for the ltdevents.handlers.internal.metrics module and routes."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from ltdevents.app import create_app
+
+if TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestClient
+
+
+async def test_get_metrics(aiohttp_client: TestClient) -> None:
+    """Test GET /metrics after an invalid webhook."""
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    payload = {
+        "event_type": "edition.updated",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+    }
+    response = await client.post("/webhook", json=payload)
+    assert response.status == 400
+
+    response = await client.get("/metrics")
+    assert response.status == 200
+    assert response.content_type == "text/plain"
+    text = await response.text()
+    assert (
+        'ltdevents_webhook_events_total{event_type="edition.updated",'
+        'outcome="invalid"} 1.0'
+    ) in text
+    assert 'ltdevents_webhook_stage_seconds_count{stage="decode"} 1.0' in text
+    assert (
+        'ltdevents_http_request_seconds_count{method="POST",'
+        'route="/webhook",status="400"} 1.0'
+    ) in text
@@ -2,9 +2,20 @@
 
 from __future__ import annotations
 
+import asyncio
+import copy
+import json
+from pathlib import Path
 from typing import TYPE_CHECKING
 
+from ltdevents.admission import AdmissionController
 from ltdevents.app import create_app
+from ltdevents.bench import (
+    PAYLOAD_TEMPLATES,
+    FakeKafkaProducer,
+    create_bench_app,
+)
+from ltdevents.signatures import SIGNATURE_HEADER, sign
 
 if TYPE_CHECKING:
     from aiohttp.pytest_plugin.test_utils import TestClient
@@ -125,3 +136,337 @@ async def test_post_webhook_edition_updated_invalid(
     assert response.status == 400
     response_json = await response.json()
     assert "error" in response_json
+
+
+async def test_post_webhook_not_object(aiohttp_client: TestClient) -> None:
+    """Test POST /webhook for a JSON body that isn't an object."""
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    response = await client.post("/webhook", json=[{"event_type": "test"}])
+    assert response.status == 400
+    response_json = await response.json()
+    assert "error" in response_json
+
+
+async def test_post_webhook_invalid_json(aiohttp_client: TestClient) -> None:
+    """Test POST /webhook for a body that isn't valid JSON."""
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    response = await client.post(
+        "/webhook",
+        data=b"{not json",
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status == 400
+    response_json = await response.json()
+    assert "error" in response_json
+
+
+async def test_get_webhook_queue(aiohttp_client: TestClient) -> None:
+    """Test GET /webhook/queue."""
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    response = await client.get("/webhook/queue")
+    assert response.status == 200
+    data = await response.json()
+    assert data["worker"] == 0
+    assert data["delivery_mode"] == app["safir/config"].delivery_mode
+    assert data["depth"] == 0
+
+
+async def test_post_webhook_batch(aiohttp_client: TestClient) -> None:
+    """Test POST /webhook/batch with valid and invalid payloads."""
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    payload = {
+        "event_type": "edition.updated",
+        "event_timestamp": "2020-01-01T12:00:00Z",
+        "product": {
+            "published_url": "https://example.lsst.io/",
+            "url": "https://keeper.lsst.codes/products/example",
+            "title": "Example product",
+            "slug": "example",
+        },
+        "edition": {
+            "published_url": "https://example.lsst.io/v/1.0",
+            "url": "https://keeper.lsst.codes/editions/1234",
+            "title": "Version 1.0",
+            "slug": "1.0",
+            "build_url": "https://keeper.lsst.codes/builds/1",
+        },
+    }
+    invalid_payload = dict(payload, event_type="edition.nonexistent")
+
+    response = await client.post(
+        "/webhook/batch", json=[payload, invalid_payload, payload]
+    )
+    assert response.status == 200
+    results = (await response.json())["results"]
+    assert [r["status"] for r in results] == [200, 400, 200]
+    assert "error" in results[1]
+
+
+async def test_post_webhook_batch_ndjson(aiohttp_client: TestClient) -> None:
+    """Test POST /webhook/batch with an NDJSON body containing payloads that
+    can't be decoded or parsed.
+    """
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    body = '{"event_timestamp": "2020-01-01T12:00:00Z"}\n{not json\n\n[]\n'
+    response = await client.post(
+        "/webhook/batch",
+        data=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status == 200
+    results = (await response.json())["results"]
+    assert [r["status"] for r in results] == [400, 400, 400]
+
+
+async def test_post_webhook_batch_not_array(
+    aiohttp_client: TestClient,
+) -> None:
+    """Test POST /webhook/batch with a JSON body that isn't an array."""
+    app = create_app()
+    client = await aiohttp_client(app)
+
+    response = await client.post("/webhook/batch", json={"event_type": "x"})
+    assert response.status == 400
+    response_json = await response.json()
+    assert "error" in response_json
+
+
+async def test_post_webhook_dedup_drop(aiohttp_client: TestClient) -> None:
+    """Test that POST /webhook drops repeated edition.updated events."""
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    app["safir/config"].dedup_mode = "drop"
+    client = await aiohttp_client(app)
+
+    payload = copy.deepcopy(PAYLOAD_TEMPLATES["edition.updated"])
+    for _ in range(3):
+        response = await client.post("/webhook", json=payload)
+        assert response.status == 200
+    payload["edition"]["build_url"] = "https://keeper.lsst.codes/builds/2"
+    response = await client.post("/webhook", json=payload)
+    assert response.status == 200
+
+    assert producer.message_count == 2
+
+
+async def test_post_webhook_dedup_retry(aiohttp_client: TestClient) -> None:
+    """Test that POST /webhook doesn't drop the retry of an event that failed
+    to publish.
+    """
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    app["safir/config"].dedup_mode = "drop"
+    client = await aiohttp_client(app)
+    breaker = app["ltdevents/circuit_breaker"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    payload = PAYLOAD_TEMPLATES["edition.updated"]
+    response = await client.post("/webhook", json=payload)
+    assert response.status == 503
+    assert producer.message_count == 0
+
+    breaker.record_success()
+    for _ in range(2):
+        response = await client.post("/webhook", json=payload)
+        assert response.status == 200
+    assert producer.message_count == 1
+
+
+async def test_post_webhook_dedup_coalesce(
+    aiohttp_client: TestClient,
+) -> None:
+    """Test that POST /webhook publishes a held edition.updated event before
+    a later edition.deleted event for the same edition, and delivers the held
+    event once it's published.
+    """
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    config = app["safir/config"]
+    config.dedup_mode = "coalesce"
+    config.dedup_window_ms = 60000
+    config.state_kafka_topic = None
+    client = await aiohttp_client(app)
+
+    response = await client.post(
+        "/webhook", json=PAYLOAD_TEMPLATES["edition.updated"]
+    )
+    assert response.status == 202
+    assert producer.message_count == 0
+    response = await client.get(f"/{config.name}/events")
+    data = await response.json()
+    assert data["events"] == []
+
+    response = await client.post(
+        "/webhook", json=PAYLOAD_TEMPLATES["edition.deleted"]
+    )
+    assert response.status == 200
+    assert producer.message_count == 2
+    response = await client.get(f"/{config.name}/events")
+    data = await response.json()
+    assert [e["event_type"] for e in data["events"]] == [
+        "edition.deleted",
+        "edition.updated",
+    ]
+
+
+async def test_post_webhook_admission(aiohttp_client: TestClient) -> None:
+    """Test that POST /webhook rejects requests when it's saturated."""
+    producer = FakeKafkaProducer(ack_latency=0.2)
+    app = create_bench_app(producer)
+    app["ltdevents/admission"] = AdmissionController(
+        max_in_flight=1, max_queued=0, queue_timeout=1.0, retry_after=3
+    )
+    client = await aiohttp_client(app)
+
+    payload = PAYLOAD_TEMPLATES["edition.updated"]
+    responses = await asyncio.gather(
+        client.post("/webhook", json=payload),
+        client.post("/webhook", json=payload),
+    )
+    statuses = sorted(r.status for r in responses)
+    assert statuses == [200, 429]
+    rejected = [r for r in responses if r.status == 429][0]
+    assert rejected.headers["Retry-After"] == "3"
+
+    response = await client.get("/webhook/queue")
+    data = await response.json()
+    assert data["admission"]["rejected"]["queue_full"] == 1
+    assert data["admission"]["in_flight"] == 0
+
+
+async def test_post_webhook_signature(
+    aiohttp_client: TestClient, tmp_path: Path
+) -> None:
+    """Test that POST /webhook verifies signatures when keys are
+    configured.
+    """
+    (tmp_path / "key").write_bytes(b"secret")
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    app["safir/config"].webhook_keys_dir = tmp_path
+    client = await aiohttp_client(app)
+
+    body = json.dumps(PAYLOAD_TEMPLATES["edition.updated"]).encode()
+    headers = {"Content-Type": "application/json"}
+    response = await client.post("/webhook", data=body, headers=headers)
+    assert response.status == 401
+
+    headers[SIGNATURE_HEADER] = sign(b"secret", body)
+    response = await client.post("/webhook", data=body, headers=headers)
+    assert response.status == 200
+    assert producer.message_count == 1
+
+
+async def test_post_webhook_sink_file(
+    aiohttp_client: TestClient, tmp_path: Path
+) -> None:
+    """Test that POST /webhook delivers events to a file sink."""
+    sink_path = tmp_path / "events.ndjson"
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    app["safir/config"].sink_file = sink_path
+    client = await aiohttp_client(app)
+
+    payload = PAYLOAD_TEMPLATES["edition.updated"]
+    response = await client.post("/webhook", json=payload)
+    assert response.status == 200
+    await asyncio.sleep(0.1)
+
+    response = await client.get("/webhook/queue")
+    data = await response.json()
+    assert data["sinks"][0]["sink"] == str(sink_path)
+    assert data["sinks"][0]["delivered"] == 1
+    event = json.loads(sink_path.read_text())
+    assert event["event_type"] == "edition.updated"
+    assert event["edition"]["slug"] == payload["edition"]["slug"]
+
+
+async def test_post_webhook_state_topic(aiohttp_client: TestClient) -> None:
+    """Test that POST /webhook also publishes edition events to the
+    latest-state topic.
+    """
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    app["ltdevents/event_registry"].state_topic = "ltd.editions"
+    client = await aiohttp_client(app)
+
+    for name in ("edition.updated", "build.uploaded", "edition.deleted"):
+        response = await client.post("/webhook", json=PAYLOAD_TEMPLATES[name])
+        assert response.status == 200
+    assert producer.message_count == 5
+
+    payloads = [
+        PAYLOAD_TEMPLATES["edition.updated"],
+        PAYLOAD_TEMPLATES["product.created"],
+    ]
+    response = await client.post("/webhook/batch", json=payloads)
+    data = await response.json()
+    assert [r["status"] for r in data["results"]] == [200, 200]
+    assert producer.message_count == 8
+
+
+async def test_post_webhook_circuit_open(aiohttp_client: TestClient) -> None:
+    """Test that POST /webhook fails fast while the Kafka circuit breaker is
+    open.
+    """
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    client = await aiohttp_client(app)
+    breaker = app["ltdevents/circuit_breaker"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    payload = PAYLOAD_TEMPLATES["edition.updated"]
+    response = await client.post("/webhook", json=payload)
+    assert response.status == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    response = await client.post("/webhook/batch", json=[payload])
+    data = await response.json()
+    assert data["results"][0]["status"] == 503
+    assert producer.message_count == 0
+    # Events that weren't published aren't stored or delivered to sinks
+    assert len(app["ltdevents/event_store"]) == 0
+
+    response = await client.get("/webhook/queue")
+    data = await response.json()
+    assert data["circuit_breaker"]["state"] == "open"
+    assert data["circuit_breaker"]["rejected"] == 2
+
+
+async def test_post_webhook_queue_circuit_open(
+    aiohttp_client: TestClient,
+) -> None:
+    """Test that POST /webhook doesn't enqueue events in the queue delivery
+    mode while the Kafka circuit breaker is open.
+    """
+    producer = FakeKafkaProducer()
+    app = create_bench_app(producer)
+    app["safir/config"].delivery_mode = "queue"
+    client = await aiohttp_client(app)
+    breaker = app["ltdevents/circuit_breaker"]
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    payload = PAYLOAD_TEMPLATES["edition.updated"]
+    response = await client.post("/webhook", json=payload)
+    assert response.status == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    response = await client.post("/webhook/batch", json=[payload])
+    data = await response.json()
+    assert data["results"][0]["status"] == 503
+    assert app["ltdevents/publisher"].depth == 0
+
+    breaker.record_success()
+    response = await client.post("/webhook", json=payload)
+    assert response.status == 202
@@ -0,0 +1,75 @@
+"""Tests for the ltdevents.lag module."""
+
+from __future__ import annotations
+
+import datetime
+
+from ltdevents.lag import LagTracker
+from ltdevents.metrics import WebhookMetrics
+
+EVENT_TIME = datetime.datetime(2020, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+def make_record(product: str) -> dict:
+    return {
+        "event_type": "edition.updated",
+        "event_timestamp": EVENT_TIME,
+        "product": {"slug": product},
+    }
+
+
+def test_lag_tracker() -> None:
+    now = EVENT_TIME.timestamp()
+    metrics = WebhookMetrics()
+    tracker = LagTracker(
+        metrics, window=60.0, max_samples=100, clock=lambda: now
+    )
+
+    # Events received 0 to 9 seconds after their event_timestamp, and all
+    # acknowledged 10 seconds after it
+    acks = [
+        tracker.track("edition.updated", make_record("example"), now + i)
+        for i in range(10)
+    ]
+    # An event received "before" its event_timestamp because of clock skew
+    acks.append(
+        tracker.track("product.created", make_record("other"), now - 5.0)
+    )
+    now += 10.0
+    for ack in acks:
+        ack()
+
+    summary = tracker.summary()
+    assert summary["all"]["count"] == 11
+    updated = summary["event_types"]["edition.updated"]
+    assert updated["count"] == 10
+    assert updated["receipt"] == {
+        "p50": 4.0,
+        "p90": 8.0,
+        "p99": 9.0,
+        "max": 9.0,
+    }
+    assert updated["publish"]["max"] == 10.0
+    assert updated["end_to_end"]["p50"] == 10.0
+    created = summary["event_types"]["product.created"]
+    assert created["receipt"]["max"] == 0.0
+    assert created["end_to_end"]["max"] == 15.0
+
+    assert (
+        metrics.registry.get_sample_value(
+            "ltdevents_event_lag_seconds_count",
+            {
+                "segment": "end_to_end",
+                "event_type": "edition.updated",
+                "product": "example",
+            },
+        )
+        == 10
+    )
+
+    # Samples expire once they're older than the window
+    now += 61.0
+    summary = tracker.summary()
+    assert summary["all"]["count"] == 0
+    assert summary["all"]["receipt"]["p50"] is None
+    assert summary["event_types"] == {}
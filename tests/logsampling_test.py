@@ -0,0 +1,78 @@
+"""Tests for the ltdevents.logsampling module."""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Tuple
+
+from ltdevents.logsampling import WebhookLogging
+
+
+class RecordingLogger:
+    """A stand-in for a structlog logger that records its calls."""
+
+    def __init__(self) -> None:
+        self.calls: List[Tuple[str, str, Dict[str, Any]]] = []
+
+    def __getattr__(self, level: str) -> Any:
+        def log(event: str, **kwargs: Any) -> None:
+            self.calls.append((level, event, kwargs))
+
+        return log
+
+
+def test_debug_disabled() -> None:
+    logging.getLogger("ltdevents-test-info").setLevel(logging.INFO)
+    log = WebhookLogging("ltdevents-test-info")
+    logger = RecordingLogger()
+
+    assert not log.debug_enabled
+    log.debug(logger, "New webhook event")
+    log.success(logger, "Published Kafka message")
+    assert logger.calls == []
+
+
+def test_success_sampling() -> None:
+    logging.getLogger("ltdevents-test-debug").setLevel(logging.DEBUG)
+    log = WebhookLogging("ltdevents-test-debug", sample_every=3)
+    logger = RecordingLogger()
+
+    assert log.debug_enabled
+    for i in range(7):
+        log.success(logger, "Published Kafka message", index=i)
+    log.success(logger, "Dropped duplicate webhook")
+
+    assert logger.calls == [
+        ("debug", "Published Kafka message", {"index": 2, "sampled": 3}),
+        ("debug", "Published Kafka message", {"index": 5, "sampled": 3}),
+    ]
+
+
+def test_error_rate_limit() -> None:
+    now = 0.0
+    log = WebhookLogging(
+        "ltdevents-test-error",
+        error_burst=2,
+        error_interval=1.0,
+        clock=lambda: now,
+    )
+    logger = RecordingLogger()
+
+    for _ in range(5):
+        log.error(logger, "Validation error", info="bad")
+    log.error(logger, "Rejected webhook request", level="warning")
+    assert logger.calls == [
+        ("error", "Validation error", {"info": "bad"}),
+        ("error", "Validation error", {"info": "bad"}),
+        ("warning", "Rejected webhook request", {}),
+    ]
+
+    logger.calls.clear()
+    now = 1.5
+    log.error(logger, "Validation error", info="bad")
+    log.error(logger, "Validation error", info="bad")
+    log.error(logger, "Validation error", info="bad")
+    assert logger.calls == [
+        ("error", "Validation error", {"info": "bad", "suppressed": 3}),
+        ("error", "Validation error", {"info": "bad"}),
+    ]
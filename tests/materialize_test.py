@@ -0,0 +1,310 @@
+"""Tests for the ltdevents.materialize module."""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import json
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import fastavro
+from aiokafka import TopicPartition
+from kafkit.registry.errors import RegistryBrokenError
+from kafkit.registry.manager import RecordNameSchemaManager
+from kafkit.registry.sansio import MockRegistryApi
+from kafkit.registry.serializer import pack_wire_format_prefix
+
+from ltdevents.bench import PAYLOAD_TEMPLATES
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+from ltdevents.materialize import (
+    EditionState,
+    EditionStore,
+    MessageDecoder,
+    run_materializer,
+)
+from ltdevents.serializers import AvroSerializers
+
+SCHEMA_ROOT = Path(__file__).parent.parent / "src" / "ltdevents" / "schemas"
+
+
+class FailingRegistryApi(MockRegistryApi):
+    """A mock Schema Registry that fails its first ``failures`` schema
+    lookups.
+    """
+
+    def __init__(self, failures: int) -> None:
+        super().__init__()
+        self.failures = failures
+
+    async def get_schema_by_id(self, schema_id: int) -> Dict[str, Any]:
+        if self.failures:
+            self.failures -= 1
+            raise RegistryBrokenError(status_code=503)
+        return await super().get_schema_by_id(schema_id)
+
+
+class LookupRegistryApi(MockRegistryApi):
+    """A mock Schema Registry where only the ``registered`` subjects have
+    schemas, which records the requests.
+    """
+
+    def __init__(self, registered: Mapping[str, int]) -> None:
+        super().__init__()
+        self.registered = registered
+        self.requests: List[Tuple[str, str]] = []
+
+    async def _request(
+        self, method: str, url: str, headers: Mapping[str, str], body: bytes
+    ) -> Any:
+        self.requests.append((method, url))
+        subject = url.rsplit("/", 1)[-1]
+        if method == "POST" and subject in self.registered:
+            data = {"subject": subject, "id": self.registered[subject]}
+            return 200, self.DEFAULT_HEADERS, json.dumps(data).encode()
+        return 404, self.DEFAULT_HEADERS, b'{"error_code": 40401}'
+
+
+@dataclass
+class FakeMessage:
+    offset: int
+    value: Optional[bytes]
+
+
+class FakeConsumer:
+    """A consumer of a single-partition topic, which sets the stop event
+    once all messages are consumed.
+    """
+
+    def __init__(
+        self, messages: List[Optional[bytes]], stop: asyncio.Event
+    ) -> None:
+        self.messages = messages
+        self.stop = stop
+        self.position = 0
+
+    def partitions_for_topic(self, topic: str) -> set:
+        return {0}
+
+    def assign(self, partitions: List[TopicPartition]) -> None:
+        assert partitions == [TopicPartition("ltd.events", 0)]
+
+    def seek(self, tp: TopicPartition, offset: int) -> None:
+        self.position = offset
+
+    async def seek_to_beginning(self, tp: TopicPartition) -> None:
+        self.position = 0
+
+    async def getmany(
+        self, *, timeout_ms: int, max_records: int
+    ) -> Dict[TopicPartition, List[FakeMessage]]:
+        start = self.position
+        values = self.messages[start : start + max_records]
+        self.position += len(values)
+        if self.position >= len(self.messages):
+            self.stop.set()
+        if not values:
+            return {}
+        return {
+            TopicPartition("ltd.events", 0): [
+                FakeMessage(offset=start + i, value=value)
+                for i, value in enumerate(values)
+            ]
+        }
+
+
+EVENT_REGISTRY = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+
+
+def make_record(event_type: str, edition: str, minute: int) -> Dict[str, Any]:
+    payload = copy.deepcopy(PAYLOAD_TEMPLATES[event_type])
+    if "edition" in payload:
+        payload["edition"]["slug"] = edition
+    payload["event_timestamp"] = f"2020-01-01T12:{minute:02d}:00Z"
+    _, record = EVENT_REGISTRY.parse(payload)
+    return record
+
+
+def summarize(state: Optional[EditionState]) -> Any:
+    assert state is not None
+    return (state.edition, state.event_type, state.event_timestamp)
+
+
+def test_edition_store(tmp_path: Path) -> None:
+    store = EditionStore(tmp_path / "editions.sqlite3")
+    updated = EditionState.from_record(make_record("edition.updated", "a", 2))
+    older = EditionState.from_record(make_record("edition.updated", "a", 1))
+    store.apply([updated, older], {("ltd.events", 0): 2})
+    assert summarize(store.get("example", "a")) == summarize(updated)
+    assert updated.event_timestamp == 1577880120000
+    assert store.offsets("ltd.events") == {0: 2}
+
+    deleted = EditionState.from_record(make_record("edition.deleted", "a", 3))
+    store.apply([deleted], {("ltd.events", 0): 3})
+    store.close()
+
+    store = EditionStore(tmp_path / "editions.sqlite3")
+    assert summarize(store.get("example", "a")) == summarize(deleted)
+    assert store.get("example", "b") is None
+    assert store.editions("example") == []
+    assert [
+        summarize(state)
+        for state in store.editions("example", include_deleted=True)
+    ] == [summarize(deleted)]
+    assert store.offsets("ltd.events") == {0: 3}
+    assert store.offsets("other") == {}
+
+
+async def test_run_materializer(tmp_path: Path) -> None:
+    registry = MockRegistryApi()
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    for schema_id, schema in enumerate(manager.schemas.values(), start=1):
+        registry.schema_cache.insert(schema, schema_id)
+    serializers = await AvroSerializers.from_manager(manager, registry)
+    messages: List[Optional[bytes]] = []
+    for event_type, edition, minute in [
+        ("edition.updated", "a", 1),
+        ("edition.updated", "b", 2),
+        ("build.uploaded", "a", 3),
+        ("edition.updated", "a", 4),
+        ("edition.deleted", "b", 5),
+    ]:
+        record = make_record(event_type, edition, minute)
+        message = EVENT_REGISTRY.serialize(
+            EVENT_REGISTRY[event_type], record, serializers
+        )
+        messages.append(message.value)
+    decoder = await MessageDecoder.from_manager(manager, registry)
+
+    store = EditionStore(tmp_path / "editions.sqlite3")
+    stop = asyncio.Event()
+    progress = await run_materializer(
+        FakeConsumer(messages[:3], stop),
+        store,
+        decoder,
+        topic="ltd.events",
+        batch_size=2,
+        stop=stop,
+    )
+    assert (progress.consumed, progress.applied, progress.skipped) == (3, 2, 1)
+    assert store.offsets("ltd.events") == {0: 3}
+
+    # A restarted materializer resumes from the stored offset
+    stop = asyncio.Event()
+    consumer = FakeConsumer(messages, stop)
+    progress = await run_materializer(
+        consumer, store, decoder, topic="ltd.events", stop=stop
+    )
+    assert progress.consumed == 2
+    assert store.offsets("ltd.events") == {0: 5}
+    editions = store.editions("example")
+    assert [state.edition for state in editions] == ["a"]
+    assert editions[0].record["event_timestamp"].startswith("2020-01-01 12:04")
+    deleted = store.get("example", "b")
+    assert deleted is not None and deleted.deleted
+
+
+async def test_run_materializer_registry_errors(tmp_path: Path) -> None:
+    registry = FailingRegistryApi(failures=2)
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    for schema_id, schema in enumerate(manager.schemas.values(), start=1):
+        registry.schema_cache.insert(schema, schema_id)
+    serializers = await AvroSerializers.from_manager(manager, registry)
+    record = make_record("edition.updated", "a", 1)
+    message = EVENT_REGISTRY.serialize(
+        EVENT_REGISTRY["edition.updated"], record, serializers
+    )
+    # The decoder has to look up the schema in the Schema Registry
+    decoder = MessageDecoder(registry, {})
+    messages = [message.value, b"bad", None]
+
+    store = EditionStore(tmp_path / "editions.sqlite3")
+    stop = asyncio.Event()
+    progress = await run_materializer(
+        FakeConsumer(messages, stop),
+        store,
+        decoder,
+        topic="ltd.events",
+        batch_size=1,
+        stop=stop,
+        retry_delay=0.01,
+    )
+    # The Schema Registry failures are retried, while the message that isn't
+    # in the wire format is skipped
+    assert progress.retries == 2
+    assert (progress.consumed, progress.applied, progress.skipped) == (3, 1, 2)
+    assert store.offsets("ltd.events") == {0: 3}
+    assert store.get("example", "a") is not None
+
+
+async def test_run_materializer_registry_unavailable(tmp_path: Path) -> None:
+    registry = FailingRegistryApi(failures=1)
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    for schema_id, schema in enumerate(manager.schemas.values(), start=1):
+        registry.schema_cache.insert(schema, schema_id)
+    serializers = await AvroSerializers.from_manager(manager, registry)
+    record = make_record("edition.updated", "a", 1)
+    message = EVENT_REGISTRY.serialize(
+        EVENT_REGISTRY["edition.updated"], record, serializers
+    )
+
+    # The materializer stops while the Schema Registry is failing, without
+    # applying the batch or saving its offset
+    store = EditionStore(tmp_path / "editions.sqlite3")
+    stop = asyncio.Event()
+    progress = await run_materializer(
+        FakeConsumer([message.value], stop),
+        store,
+        MessageDecoder(registry, {}),
+        topic="ltd.events",
+        stop=stop,
+    )
+    assert (progress.consumed, progress.retries) == (0, 1)
+    assert store.offsets("ltd.events") == {}
+    assert store.get("example", "a") is None
+
+
+async def test_decoder_from_manager() -> None:
+    registry = LookupRegistryApi({"ltd.edition_key_v1": 7})
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    decoder = await MessageDecoder.from_manager(manager, registry)
+
+    # The schemas are looked up, not registered, and the schemas that aren't
+    # registered are left out
+    assert registry.requests
+    assert all(method == "POST" for method, _ in registry.requests)
+    assert not any(url.endswith("/versions") for _, url in registry.requests)
+    schema = manager.schemas["ltd.edition_key_v1"]
+    assert registry.schema_cache[schema] == 7
+    assert list(decoder._parsed) == [7]
+
+
+async def test_run_materializer_malformed_record(tmp_path: Path) -> None:
+    schema = {
+        "type": "record",
+        "name": "partial_edition",
+        "fields": [{"name": "event_type", "type": "string"}],
+    }
+    body = BytesIO()
+    fastavro.schemaless_writer(
+        body, fastavro.parse_schema(schema), {"event_type": "edition.updated"}
+    )
+    message = pack_wire_format_prefix(99) + body.getvalue()
+    decoder = MessageDecoder(MockRegistryApi(), {99: schema})
+
+    # The edition record is malformed, so it's skipped instead of retried
+    store = EditionStore(tmp_path / "editions.sqlite3")
+    stop = asyncio.Event()
+    progress = await run_materializer(
+        FakeConsumer([message], stop),
+        store,
+        decoder,
+        topic="ltd.events",
+        stop=stop,
+        retry_delay=0.01,
+    )
+    assert progress.retries == 0
+    assert (progress.consumed, progress.applied, progress.skipped) == (1, 0, 1)
+    assert store.offsets("ltd.events") == {0: 1}
@@ -0,0 +1,65 @@
+"""Tests for the ltdevents.metrics module."""
+
+from __future__ import annotations
+
+from ltdevents.metrics import WebhookMetrics
+
+
+def get_sample(metrics: WebhookMetrics, name: str, **labels: str) -> float:
+    value = metrics.registry.get_sample_value(name, labels)
+    assert value is not None
+    return value
+
+
+def test_stage_timer() -> None:
+    metrics = WebhookMetrics()
+    timer = metrics.timer()
+    timer.lap("decode")
+    timer.lap("validate")
+    timer.reset()
+    timer.lap("validate")
+
+    assert (
+        get_sample(
+            metrics, "ltdevents_webhook_stage_seconds_count", stage="decode"
+        )
+        == 1
+    )
+    assert (
+        get_sample(
+            metrics, "ltdevents_webhook_stage_seconds_count", stage="validate"
+        )
+        == 2
+    )
+    assert (
+        get_sample(
+            metrics, "ltdevents_webhook_stage_seconds_count", stage="publish"
+        )
+        == 0
+    )
+
+
+def test_count_event() -> None:
+    metrics = WebhookMetrics()
+    metrics.count_event("edition.updated", "accepted")
+    metrics.count_event("edition.updated", "accepted")
+    metrics.count_event("unknown", "invalid")
+
+    assert (
+        get_sample(
+            metrics,
+            "ltdevents_webhook_events_total",
+            event_type="edition.updated",
+            outcome="accepted",
+        )
+        == 2
+    )
+    assert (
+        get_sample(
+            metrics,
+            "ltdevents_webhook_events_total",
+            event_type="unknown",
+            outcome="invalid",
+        )
+        == 1
+    )
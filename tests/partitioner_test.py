@@ -0,0 +1,28 @@
+"""Tests for the ltdevents.partitioner module."""
+
+from __future__ import annotations
+
+import pytest
+
+from ltdevents.partitioner import KeyPartitioner, stable_hash
+
+
+def test_stable_hash() -> None:
+    # The hash must not change between processes or releases
+    assert stable_hash(("example", "1.0")) == stable_hash(("example", "1.0"))
+    assert stable_hash(("example", "1.0")) != stable_hash(("example1", ".0"))
+    assert stable_hash(("example", "1.0")) == 0x6F14768FA72437A0
+
+
+def test_key_partitioner() -> None:
+    partitioner = KeyPartitioner(4, cache_size=2)
+    partitions = {partitioner(("example", str(i))) for i in range(100)}
+    assert partitions == {0, 1, 2, 3}
+
+    partitioner(("example", "a"))
+    partitioner(("example", "a"))
+    assert partitioner.cache_info().hits >= 1
+    assert partitioner.cache_info().currsize == 2
+
+    with pytest.raises(ValueError):
+        KeyPartitioner(0)
@@ -0,0 +1,45 @@
+"""Tests for the ltdevents.producer module."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from ltdevents.config import Configuration
+from ltdevents.producer import producer_settings
+
+if TYPE_CHECKING:
+    from _pytest.monkeypatch import MonkeyPatch
+
+
+def test_producer_settings_defaults() -> None:
+    assert producer_settings(Configuration()) == {
+        "compression_type": None,
+        "linger_ms": 0,
+        "max_batch_size": 16384,
+        "acks": 1,
+        "enable_idempotence": False,
+    }
+
+
+def test_producer_settings(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("SAFIR_KAFKA_COMPRESSION_TYPE", "lz4")
+    monkeypatch.setenv("SAFIR_KAFKA_LINGER_MS", "5")
+    monkeypatch.setenv("SAFIR_KAFKA_MAX_BATCH_SIZE", "65536")
+    monkeypatch.setenv("SAFIR_KAFKA_ACKS", "all")
+    monkeypatch.setenv("SAFIR_KAFKA_ENABLE_IDEMPOTENCE", "true")
+    assert producer_settings(Configuration()) == {
+        "compression_type": "lz4",
+        "linger_ms": 5,
+        "max_batch_size": 65536,
+        "acks": "all",
+        "enable_idempotence": True,
+    }
+
+
+def test_producer_settings_idempotence_acks(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("SAFIR_KAFKA_ACKS", "1")
+    monkeypatch.setenv("SAFIR_KAFKA_ENABLE_IDEMPOTENCE", "yes")
+    with pytest.raises(RuntimeError):
+        producer_settings(Configuration())
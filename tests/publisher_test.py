@@ -0,0 +1,288 @@
+"""Tests for the ltdevents.publisher module."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from ltdevents.metrics import WebhookMetrics
+from ltdevents.publisher import (
+    DirectPublisher,
+    OutboundMessage,
+    QueuedPublisher,
+    SpooledPublisher,
+    send_batch,
+)
+from ltdevents.resilience import CircuitBreaker, CircuitOpenError
+from ltdevents.spool import Spool
+
+
+class FakeProducer:
+    """A stand-in for aiokafka.AIOKafkaProducer that records sends."""
+
+    def __init__(self) -> None:
+        self.sent: List[OutboundMessage] = []
+        self.send_calls = 0
+        self.failures = 0
+        self.raises = 0
+        self.hangs = False
+
+    async def send(
+        self,
+        topic: str,
+        value: bytes,
+        key: bytes,
+        partition: Optional[int] = None,
+    ) -> asyncio.Future:
+        self.send_calls += 1
+        if self.raises:
+            self.raises -= 1
+            raise RuntimeError("Buffer full")
+        future = asyncio.get_running_loop().create_future()
+        if self.hangs:
+            return future
+        if self.failures:
+            self.failures -= 1
+            future.set_exception(RuntimeError("Broker unavailable"))
+        else:
+            self.sent.append(
+                OutboundMessage(
+                    topic=topic, key=key, value=value, partition=partition
+                )
+            )
+            future.set_result(None)
+        return future
+
+    async def send_and_wait(
+        self,
+        topic: str,
+        value: bytes,
+        key: bytes,
+        partition: Optional[int] = None,
+    ) -> None:
+        await (
+            await self.send(topic, value=value, key=key, partition=partition)
+        )
+
+
+def make_message(i: int) -> OutboundMessage:
+    return OutboundMessage(
+        topic="ltd.events", key=f"k{i}".encode(), value=f"v{i}".encode()
+    )
+
+
+async def test_direct_publisher() -> None:
+    producer = FakeProducer()
+    publisher = DirectPublisher(producer)
+    await publisher.start()
+    await publisher.publish(make_message(0))
+    await publisher.close()
+
+    assert publisher.accepted_status == 200
+    assert producer.sent == [make_message(0)]
+
+
+async def test_queued_publisher_batches_and_flushes() -> None:
+    producer = FakeProducer()
+    publisher = QueuedPublisher(
+        producer, max_size=100, batch_size=3, linger=0.05
+    )
+    await publisher.start()
+    for i in range(7):
+        await publisher.publish(make_message(i))
+    assert publisher.depth > 0
+
+    await publisher.close()
+
+    assert publisher.accepted_status == 202
+    assert publisher.depth == 0
+    assert producer.sent == [make_message(i) for i in range(7)]
+
+
+async def test_queued_publisher_linger() -> None:
+    """A partial batch is sent once the linger time passes."""
+    producer = FakeProducer()
+    publisher = QueuedPublisher(
+        producer, max_size=100, batch_size=10, linger=0.01
+    )
+    await publisher.start()
+    await publisher.publish(make_message(0))
+    await asyncio.sleep(0.1)
+
+    assert producer.sent == [make_message(0)]
+    await publisher.close()
+
+
+async def test_queued_publisher_send_errors() -> None:
+    """The queue keeps draining after the producer raises."""
+    producer = FakeProducer()
+    producer.raises = 2
+    publisher = QueuedPublisher(producer, max_size=2, batch_size=1, linger=0)
+    await publisher.start()
+    for i in range(5):
+        await publisher.publish(make_message(i))
+    await asyncio.wait_for(publisher.close(), 1.0)
+
+    assert publisher.depth == 0
+    assert producer.sent == [make_message(i) for i in range(2, 5)]
+    assert publisher.dropped == 2
+
+
+async def test_queued_publisher_drain_timeout() -> None:
+    """Closing doesn't wait past the drain timeout for an unreachable
+    broker, and counts the messages that weren't sent.
+    """
+    producer = FakeProducer()
+    producer.hangs = True
+    publisher = QueuedPublisher(
+        producer, max_size=10, batch_size=1, linger=0, drain_timeout=0.05
+    )
+    metrics = WebhookMetrics()
+    metrics.track_publish_queue(publisher)
+    await publisher.start()
+    for i in range(3):
+        await publisher.publish(make_message(i))
+    await asyncio.wait_for(publisher.close(), 1.0)
+
+    # Including the batch whose send was cancelled
+    assert publisher.dropped == 3
+    assert (
+        metrics.registry.get_sample_value("ltdevents_publish_dropped_total")
+        == 3
+    )
+
+
+async def test_queued_publisher_circuit_open() -> None:
+    """Messages aren't enqueued while the circuit breaker is open."""
+    producer = FakeProducer()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0)
+    publisher = QueuedPublisher(
+        producer, max_size=10, batch_size=10, linger=0, breaker=breaker
+    )
+    await publisher.start()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        await publisher.publish(make_message(0))
+    errors = await publisher.publish_batch([make_message(1), make_message(2)])
+    assert all(isinstance(e, CircuitOpenError) for e in errors)
+    assert publisher.depth == 0
+    assert breaker.rejected == 2
+
+    breaker.record_success()
+    await publisher.publish(make_message(3))
+    await publisher.close()
+    assert producer.sent == [make_message(3)]
+
+
+async def test_send_batch_errors() -> None:
+    producer = FakeProducer()
+    producer.raises = 1
+    producer.failures = 1
+    messages = [make_message(i) for i in range(3)]
+    acks: List[int] = []
+    messages[2].on_ack = lambda: acks.append(2)
+    errors = await send_batch(producer, messages)
+
+    assert [None if e is None else str(e) for e in errors] == [
+        "Buffer full",
+        "Broker unavailable",
+        None,
+    ]
+    assert producer.sent == [make_message(2)]
+    assert acks == [2]
+
+
+async def test_direct_publisher_batch() -> None:
+    producer = FakeProducer()
+    publisher = DirectPublisher(producer)
+    messages = [make_message(i) for i in range(3)]
+    errors = await publisher.publish_batch(messages)
+
+    assert errors == [None, None, None]
+    assert producer.sent == messages
+
+
+async def test_spooled_publisher(tmp_path: Path) -> None:
+    producer = FakeProducer()
+    spool = Spool.open(tmp_path)
+    publisher = SpooledPublisher(
+        producer, spool, batch_size=2, retry_interval=0.01
+    )
+    await publisher.start()
+    for i in range(5):
+        await publisher.publish(make_message(i))
+    await publisher.close()
+
+    assert publisher.accepted_status == 202
+    assert publisher.depth == 0
+    assert producer.sent == [make_message(i) for i in range(5)]
+
+
+async def test_spooled_publisher_retries_in_order(tmp_path: Path) -> None:
+    """Messages spooled while the broker fails are forwarded in order once
+    it recovers.
+    """
+    producer = FakeProducer()
+    producer.failures = 3
+    spool = Spool.open(tmp_path)
+    publisher = SpooledPublisher(
+        producer, spool, batch_size=10, retry_interval=0.01
+    )
+    await publisher.start()
+    for i in range(3):
+        await publisher.publish(make_message(i))
+    await publisher.close()
+
+    assert producer.sent[-3:] == [make_message(i) for i in range(3)]
+    assert publisher.depth == 0
+
+
+async def test_spooled_publisher_resumes(tmp_path: Path) -> None:
+    """Messages that weren't forwarded before shutdown are forwarded after
+    a restart.
+    """
+    producer = FakeProducer()
+    producer.failures = 1000
+    publisher = SpooledPublisher(
+        producer,
+        Spool.open(tmp_path),
+        batch_size=10,
+        retry_interval=0.01,
+        drain_timeout=0.05,
+    )
+    await publisher.start()
+    await publisher.publish(make_message(0))
+    await publisher.close()
+    assert publisher.depth == 1
+
+    producer = FakeProducer()
+    publisher = SpooledPublisher(producer, Spool.open(tmp_path), batch_size=10)
+    await publisher.start()
+    await publisher.close()
+    assert producer.sent == [make_message(0)]
+
+
+async def test_spooled_publisher_adopted_spools(tmp_path: Path) -> None:
+    """Messages in adopted spools are forwarded before new messages."""
+    adopted = Spool.open(tmp_path / "worker-2")
+    await adopted.append("ltd.events", b"k0", b"v0")
+    await adopted.close()
+
+    producer = FakeProducer()
+    publisher = SpooledPublisher(
+        producer,
+        Spool.open(tmp_path / "worker-0"),
+        batch_size=10,
+        adopted=[Spool.open(tmp_path / "worker-2")],
+    )
+    assert publisher.depth == 1
+    await publisher.publish(make_message(1))
+    await publisher.start()
+    await publisher.close()
+
+    assert producer.sent == [make_message(0), make_message(1)]
+    assert publisher.adopted == []
+    assert Spool.open(tmp_path / "worker-2").depth == 0
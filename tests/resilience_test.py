@@ -0,0 +1,201 @@
+"""Tests for the ltdevents.resilience module."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import List, Optional
+
+import pytest
+
+from ltdevents.publisher import DirectPublisher, OutboundMessage, send_batch
+from ltdevents.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientProducer,
+    RetryPolicy,
+    is_retriable,
+)
+
+
+class NotLeaderError(Exception):
+    """A stand-in for a retriable Kafka error."""
+
+    retriable = True
+
+
+class FailingProducer:
+    """A fake producer whose first ``failures`` sends fail."""
+
+    def __init__(self, failures: int, error: Exception) -> None:
+        self.failures = failures
+        self.error = error
+        self.attempts: List[Optional[bytes]] = []
+
+    async def send(
+        self,
+        topic: str,
+        value: Optional[bytes] = None,
+        key: Optional[bytes] = None,
+        partition: Optional[int] = None,
+    ) -> asyncio.Future:
+        self.attempts.append(value)
+        future = asyncio.get_running_loop().create_future()
+        if len(self.attempts) <= self.failures:
+            future.set_exception(self.error)
+        else:
+            future.set_result(None)
+        return future
+
+
+def make_producer(
+    producer: FailingProducer,
+    *,
+    breaker: Optional[CircuitBreaker] = None,
+    retries: int = 3,
+    delays: Optional[List[float]] = None,
+) -> ResilientProducer:
+    """Wrap a fake producer, recording the backoff delays instead of
+    sleeping.
+    """
+
+    async def sleep(delay: float) -> None:
+        if delays is not None:
+            delays.append(delay)
+
+    return ResilientProducer(
+        producer,
+        policy=RetryPolicy(retries=retries, base_delay=0.1, max_delay=0.3),
+        breaker=breaker,
+        sleep=sleep,
+        rng=lambda: 1.0,
+    )
+
+
+def test_backoff() -> None:
+    policy = RetryPolicy(retries=5, base_delay=0.1, max_delay=0.3)
+    assert [policy.backoff(n, lambda: 1.0) for n in range(4)] == [
+        0.1,
+        0.2,
+        0.3,
+        0.3,
+    ]
+    assert policy.backoff(1, lambda: 0.5) == 0.1
+    assert is_retriable(NotLeaderError())
+    assert is_retriable(asyncio.TimeoutError())
+    assert not is_retriable(ValueError())
+
+
+async def test_retry() -> None:
+    delays: List[float] = []
+    producer = FailingProducer(2, NotLeaderError("leader election"))
+    resilient = make_producer(producer, delays=delays)
+    await resilient.send_and_wait("ltd.events", value=b"v", key=b"k")
+    assert len(producer.attempts) == 3
+    assert resilient.retries == 2
+    assert delays == [0.1, 0.2]
+
+    producer = FailingProducer(10, NotLeaderError("leader election"))
+    resilient = make_producer(producer, retries=1)
+    with pytest.raises(NotLeaderError):
+        await resilient.send_and_wait("ltd.events", value=b"v", key=b"k")
+    assert len(producer.attempts) == 2
+
+    # Errors that aren't retriable fail immediately
+    producer = FailingProducer(1, ValueError("message too large"))
+    resilient = make_producer(producer)
+    with pytest.raises(ValueError):
+        await resilient.send_and_wait("ltd.events", value=b"v", key=b"k")
+    assert len(producer.attempts) == 1
+
+
+async def test_retry_keeps_key_order() -> None:
+    """A message that's sent while an earlier message of its key is backing
+    off waits for the retry, while other keys go ahead.
+    """
+    backoff = asyncio.Event()
+
+    async def sleep(delay: float) -> None:
+        await backoff.wait()
+
+    producer = FailingProducer(1, NotLeaderError("leader election"))
+    resilient = ResilientProducer(
+        producer,
+        policy=RetryPolicy(retries=3, base_delay=0.1, max_delay=0.3),
+        sleep=sleep,
+    )
+    first = await resilient.send("ltd.events", value=b"1", key=b"k")
+    await asyncio.sleep(0)
+    second = await resilient.send("ltd.events", value=b"2", key=b"k")
+    other = await resilient.send("ltd.events", value=b"3", key=b"other")
+    await other
+    assert producer.attempts == [b"1", b"3"]
+
+    backoff.set()
+    await asyncio.gather(first, second)
+    assert producer.attempts == [b"1", b"3", b"1", b"2"]
+
+    # Once the key's messages are settled, its sends go straight through
+    await resilient.send_and_wait("ltd.events", value=b"4", key=b"k")
+    assert producer.attempts[-1] == b"4"
+
+
+def test_circuit_breaker() -> None:
+    now = 0.0
+    breaker = CircuitBreaker(
+        failure_threshold=2, reset_timeout=5.0, clock=lambda: now
+    )
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == 5.0
+
+    # Once the reset timeout passes, a single trial call is let through
+    now = 5.0
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.trips == 2
+
+    # Work for later calls is rejected only while the circuit is open
+    with pytest.raises(CircuitOpenError):
+        breaker.check_closed()
+    now = 10.0
+    breaker.check_closed()
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats() == {
+        "state": "closed",
+        "failures": 0,
+        "trips": 2,
+        "rejected": 3,
+        "retry_after": 0.0,
+    }
+
+
+async def test_circuit_breaker_fails_fast() -> None:
+    producer = FailingProducer(100, NotLeaderError("no leader"))
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60.0)
+    resilient = make_producer(producer, breaker=breaker, retries=1)
+    publisher = DirectPublisher(resilient)
+    message = OutboundMessage(topic="ltd.events", key=b"k", value=b"v")
+
+    with pytest.raises(NotLeaderError):
+        await publisher.publish(message)
+    with pytest.raises(CircuitOpenError):
+        await publisher.publish(message)
+    assert breaker.state == "open"
+    # The second send's retry was rejected without reaching the producer
+    assert len(producer.attempts) == 3
+
+    errors = await send_batch(resilient, [message, message])
+    assert all(isinstance(e, CircuitOpenError) for e in errors)
+    assert len(producer.attempts) == 3
+    assert breaker.rejected == 3
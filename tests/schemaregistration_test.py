@@ -0,0 +1,116 @@
+"""Tests for the ltdevents.schemaregistration module."""
+
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Mapping, Tuple
+
+from kafkit.registry.manager import RecordNameSchemaManager
+
+from ltdevents.bench import FakeSchemaRegistry
+from ltdevents.schemaregistration import (
+    RegistrationCache,
+    SchemaRegistration,
+    register_schemas,
+)
+
+SCHEMA_ROOT = Path(__file__).parent.parent / "src" / "ltdevents" / "schemas"
+
+
+class UnavailableSchemaRegistry(FakeSchemaRegistry):
+    """A fake Schema Registry that fails its first ``failures`` requests."""
+
+    def __init__(self, failures: int) -> None:
+        super().__init__()
+        self.failures = failures
+
+    async def _request(
+        self, method: str, url: str, headers: Mapping[str, str], body: bytes
+    ) -> Tuple[int, Mapping[str, str], bytes]:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Schema Registry is unavailable")
+        return await super()._request(method, url, headers, body)
+
+
+async def test_register_schemas_cache(tmp_path: Path) -> None:
+    cache_path = tmp_path / "schemas.json"
+    registry = FakeSchemaRegistry()
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+
+    schema_ids = await register_schemas(
+        manager.schemas,
+        registry,
+        compatibility="FORWARD",
+        cache=RegistrationCache(cache_path),
+        concurrency=2,
+    )
+    assert set(schema_ids.keys()) == set(manager.schemas.keys())
+    # One registration and one compatibility request for each subject
+    assert registry.request_count == 2 * len(manager.schemas)
+    assert cache_path.exists()
+
+    # A restarted application doesn't make any requests
+    restarted_registry = FakeSchemaRegistry()
+    assert (
+        await register_schemas(
+            manager.schemas,
+            restarted_registry,
+            compatibility="FORWARD",
+            cache=RegistrationCache(cache_path),
+        )
+        == schema_ids
+    )
+    assert restarted_registry.request_count == 0
+    for name, schema in manager.schemas.items():
+        schema_id = await restarted_registry.register_schema(
+            schema, subject=name
+        )
+        assert schema_id == schema_ids[name]
+
+    # Changing the compatibility setting invalidates the cache
+    changed_registry = FakeSchemaRegistry()
+    await register_schemas(
+        manager.schemas,
+        changed_registry,
+        compatibility="FULL",
+        cache=RegistrationCache(cache_path),
+    )
+    assert changed_registry.request_count == 2 * len(manager.schemas)
+
+
+async def test_schema_registration_lazy() -> None:
+    registry = FakeSchemaRegistry()
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    registration = SchemaRegistration(manager, registry)
+    assert registration.ready is False
+    assert registry.request_count == 0
+
+    # Concurrent callers share a single registration
+    serializers = await asyncio.gather(
+        registration.get_serializers(), registration.get_serializers()
+    )
+    assert serializers[0] is serializers[1]
+    assert registration.ready is True
+    assert registry.request_count == len(manager.schemas)
+    assert serializers[0]["ltd.edition_update_v1"].id > 0
+
+    assert await registration.get_serializers() is serializers[0]
+    assert registry.request_count == len(manager.schemas)
+
+
+async def test_schema_registration_background_retries() -> None:
+    registry = UnavailableSchemaRegistry(failures=2)
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    registration = SchemaRegistration(manager, registry)
+    registration.start_background(retry_delay=0.01)
+
+    for _ in range(100):
+        if registration.ready:
+            break
+        await asyncio.sleep(0.01)
+    assert registration.ready is True
+    assert registration.last_error is None
+    assert registry.failures == 0
+    await registration.close()
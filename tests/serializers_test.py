@@ -0,0 +1,84 @@
+"""Tests for the ltdevents.serializers module."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from kafkit.registry.manager import RecordNameSchemaManager
+from kafkit.registry.sansio import MockRegistryApi
+from kafkit.registry.serializer import Serializer
+
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+from ltdevents.serializers import AvroSerializers
+from ltdevents.webhookmodels import EditionUpdatedEvent
+
+SCHEMA_ROOT = Path(__file__).parent.parent / "src" / "ltdevents" / "schemas"
+
+PAYLOAD = {
+    "event_type": "edition.updated",
+    "event_timestamp": "2020-01-01T12:00:00Z",
+    "product": {
+        "published_url": "https://example.lsst.io/",
+        "url": "https://keeper.lsst.codes/products/example",
+        "title": "Example product",
+        "slug": "example",
+    },
+    "edition": {
+        "published_url": "https://example.lsst.io/v/1.0",
+        "url": "https://keeper.lsst.codes/editions/1234",
+        "title": "Version 1.0",
+        "slug": "1.0",
+        "build_url": "https://keeper.lsst.codes/builds/1",
+    },
+}
+
+
+async def make_serializers() -> AvroSerializers:
+    registry = MockRegistryApi()
+    manager = RecordNameSchemaManager(root=SCHEMA_ROOT, registry=registry)
+    for schema_id, schema in enumerate(manager.schemas.values(), start=1):
+        registry.schema_cache.insert(schema, schema_id)
+    return await AvroSerializers.from_manager(
+        manager, registry, key_cache_size=2
+    )
+
+
+async def test_serialize_matches_kafkit() -> None:
+    serializers = await make_serializers()
+    event = EditionUpdatedEvent.parse_obj(PAYLOAD)
+    value_serializer = serializers["ltd.edition_update_v1"]
+    kafkit_serializer = Serializer(
+        schema=value_serializer._parsed_schema, schema_id=value_serializer.id
+    )
+
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+    _, record = registry.parse(PAYLOAD)
+    assert serializers.serialize(
+        record, name="ltd.edition_update_v1"
+    ) == kafkit_serializer(event.dict())
+
+
+async def test_serialize_key_cache() -> None:
+    serializers = await make_serializers()
+    key_serializer = serializers["ltd.edition_key_v1"]
+
+    key = serializers.serialize_key(
+        ("example", "1.0"), name="ltd.edition_key_v1"
+    )
+    assert key == key_serializer(
+        {"product_slug": "example", "edition_slug": "1.0"}
+    )
+    assert (
+        serializers.serialize_key(
+            ("example", "1.0"), name="ltd.edition_key_v1"
+        )
+        == key
+    )
+    info = serializers.key_cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+
+    # The cache is bounded
+    for slug in ("a", "b", "c"):
+        serializers.serialize_key(("example", slug), name="ltd.edition_key_v1")
+    assert serializers.key_cache_info().currsize == 2
@@ -0,0 +1,48 @@
+"""Tests for the ltdevents.signatures module."""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from ltdevents.signatures import SignatureVerifier, sign
+
+BODY = b'{"event_type": "edition.updated"}'
+
+
+def test_verify(tmp_path: Path) -> None:
+    (tmp_path / "key1").write_bytes(b"secret1\n")
+    (tmp_path / "..data").mkdir()
+    verifier = SignatureVerifier(tmp_path)
+    assert verifier.key_count == 1
+
+    assert verifier.verify(BODY, sign(b"secret1", BODY)) is True
+    assert verifier.verify(BODY, sign(b"secret1", BODY).upper()) is False
+    assert verifier.verify(BODY + b" ", sign(b"secret1", BODY)) is False
+    assert verifier.verify(BODY, sign(b"other", BODY)) is False
+    assert verifier.verify(BODY, None) is False
+    assert verifier.verify(BODY, "md5=abc") is False
+
+
+def test_key_rotation(tmp_path: Path) -> None:
+    (tmp_path / "key1").write_bytes(b"secret1")
+    verifier = SignatureVerifier(tmp_path)
+    assert verifier.reload() is False
+
+    # Both keys are active during the rotation
+    (tmp_path / "key2").write_bytes(b"secret2")
+    assert verifier.reload() is True
+    assert verifier.key_count == 2
+    assert verifier.verify(BODY, sign(b"secret1", BODY)) is True
+    assert verifier.verify(BODY, sign(b"secret2", BODY)) is True
+
+    os.remove(tmp_path / "key1")
+    assert verifier.reload() is True
+    assert verifier.verify(BODY, sign(b"secret1", BODY)) is False
+    assert verifier.verify(BODY, sign(b"secret2", BODY)) is True
+
+
+def test_no_keys(tmp_path: Path) -> None:
+    verifier = SignatureVerifier(tmp_path / "missing")
+    assert verifier.key_count == 0
+    assert verifier.verify(BODY, sign(b"", BODY)) is False
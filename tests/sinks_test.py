@@ -0,0 +1,166 @@
+"""Tests for the ltdevents.sinks module."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence
+
+import aiohttp
+from aiohttp import web
+
+from ltdevents.sinks import (
+    FanOut,
+    FileSink,
+    HttpCallbackSink,
+    MemorySink,
+    SinkQueue,
+)
+
+if TYPE_CHECKING:
+    from aiohttp.pytest_plugin.test_utils import TestServer
+
+
+class BlockedSink(MemorySink):
+    """A sink whose deliveries wait until it's unblocked."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.name = "blocked"
+        self.unblocked = asyncio.Event()
+
+    async def deliver(
+        self, bodies: Sequence[bytes]
+    ) -> List[Optional[BaseException]]:
+        await self.unblocked.wait()
+        return await super().deliver(bodies)
+
+
+async def test_fanout_slow_sink() -> None:
+    fast = MemorySink()
+    slow = BlockedSink()
+    fanout = FanOut(
+        [
+            SinkQueue(fast, max_size=10, batch_size=5),
+            SinkQueue(slow, max_size=2, batch_size=5),
+        ]
+    )
+    await fanout.start()
+
+    fanout.offer({"event_type": "edition.updated", "index": 0})
+    await asyncio.sleep(0.01)
+    for i in range(1, 4):
+        fanout.offer({"event_type": "edition.updated", "index": i})
+    await asyncio.sleep(0.01)
+
+    # The fast sink isn't held up by the slow sink, whose queue is full
+    assert [e["index"] for e in fast.events] == [0, 1, 2, 3]
+    assert list(slow.events) == []
+    stats = {s["sink"]: s for s in fanout.stats()}
+    assert stats["memory"]["delivered"] == 4
+    assert stats["blocked"]["depth"] == 2
+    assert stats["blocked"]["dropped"] == 1
+
+    slow.unblocked.set()
+    await fanout.close(1.0)
+    assert [e["index"] for e in slow.events] == [0, 1, 2]
+
+
+async def test_file_sink(tmp_path: Path) -> None:
+    path = tmp_path / "events.ndjson"
+    queue = SinkQueue(FileSink(path), max_size=10, batch_size=10)
+    await queue.start()
+    queue.offer(b'{"index":0}')
+    queue.offer(b'{"index":1}')
+    await queue.close(1.0)
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["index"] for line in lines] == [0, 1]
+    assert queue.delivered == 2
+
+
+async def test_http_callback_sink_retry(aiohttp_server: Any) -> None:
+    received: List[Any] = []
+    attempts = 0
+
+    async def callback(request: web.Request) -> web.Response:
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            return web.Response(status=503)
+        received.append(await request.json())
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post("/callback", callback)
+    server: TestServer = await aiohttp_server(app)
+
+    async with aiohttp.ClientSession() as session:
+        sink = HttpCallbackSink(
+            str(server.make_url("/callback")),
+            session,
+            retries=2,
+            backoff=0.01,
+        )
+        errors = await sink.deliver([b'{"index":0}', b'{"index":1}'])
+
+    assert errors == [None, None]
+    assert attempts == 3
+    assert received == [{"index": 0}, {"index": 1}]
+
+
+async def test_http_callback_sink_client_error(aiohttp_server: Any) -> None:
+    attempts = 0
+
+    async def callback(request: web.Request) -> web.Response:
+        nonlocal attempts
+        attempts += 1
+        return web.Response(status=400)
+
+    app = web.Application()
+    app.router.add_post("/callback", callback)
+    server: TestServer = await aiohttp_server(app)
+
+    async with aiohttp.ClientSession() as session:
+        sink = HttpCallbackSink(
+            str(server.make_url("/callback")), session, backoff=0.01
+        )
+        queue = SinkQueue(sink, max_size=10, batch_size=10)
+        await queue.start()
+        queue.offer(b"{}")
+        await queue.close(1.0)
+
+    assert attempts == 1
+    assert queue.failed == 1
+
+
+async def test_http_callback_sink_partial_failure(aiohttp_server: Any) -> None:
+    received: List[Any] = []
+
+    async def callback(request: web.Request) -> web.Response:
+        data = await request.json()
+        if data["index"] == 1:
+            return web.Response(status=400)
+        received.append(data)
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post("/callback", callback)
+    server: TestServer = await aiohttp_server(app)
+
+    async with aiohttp.ClientSession() as session:
+        sink = HttpCallbackSink(
+            str(server.make_url("/callback")), session, backoff=0.01
+        )
+        queue = SinkQueue(sink, max_size=10, batch_size=10)
+        await queue.start()
+        for i in range(3):
+            queue.offer(json.dumps({"index": i}).encode())
+        await queue.close(1.0)
+
+    # A failed post doesn't stop the rest of the batch, and only the failed
+    # event is counted as failed
+    assert received == [{"index": 0}, {"index": 2}]
+    assert queue.delivered == 2
+    assert queue.failed == 1
@@ -0,0 +1,152 @@
+"""Tests for the ltdevents.spool module."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from ltdevents.spool import Spool, worker_spool_dirs
+
+
+async def test_append_read_commit(tmp_path: Path) -> None:
+    spool = Spool.open(tmp_path, fsync="always")
+    for i in range(5):
+        offset = await spool.append("ltd.events", f"k{i}".encode(), b"v")
+        assert offset == i
+    assert spool.depth == 5
+
+    records = spool.read(3)
+    assert [r.offset for r in records] == [0, 1, 2]
+    assert records[1].topic == "ltd.events"
+    assert records[1].key == b"k1"
+    assert records[1].value == b"v"
+
+    await spool.commit(3)
+    assert spool.depth == 2
+    assert [r.offset for r in spool.read(10)] == [3, 4]
+    assert spool.read(10) == []
+    await spool.close()
+
+
+async def test_rewind(tmp_path: Path) -> None:
+    spool = Spool.open(tmp_path, fsync="never")
+    for i in range(3):
+        await spool.append("ltd.events", b"k", str(i).encode())
+
+    assert len(spool.read(10)) == 3
+    await spool.commit(1)
+    spool.rewind()
+    assert [r.offset for r in spool.read(10)] == [1, 2]
+    await spool.close()
+
+
+async def test_segments_are_compacted(tmp_path: Path) -> None:
+    spool = Spool.open(tmp_path, fsync="never", segment_bytes=64)
+    for i in range(20):
+        await spool.append("ltd.events", b"key", b"x" * 20)
+    segment_count = len(list(tmp_path.glob("*.log")))
+    assert segment_count > 1
+
+    # Records are read across segment boundaries
+    assert [r.offset for r in spool.read(100)] == list(range(20))
+
+    await spool.commit(20)
+    assert len(list(tmp_path.glob("*.log"))) == 1
+    await spool.close()
+
+
+async def test_reopen_recovers_state(tmp_path: Path) -> None:
+    spool = Spool.open(tmp_path, fsync="always", segment_bytes=64)
+    for i in range(10):
+        await spool.append("ltd.events", b"key", str(i).encode())
+    await spool.commit(4)
+    await spool.close()
+
+    # Simulate a record torn by a crash
+    last_segment = sorted(tmp_path.glob("*.log"))[-1]
+    with open(last_segment, "ab") as f:
+        f.write(b"\x00\x00\x00\xff\x00")
+
+    spool = Spool.open(tmp_path, fsync="always", segment_bytes=64)
+    assert spool.committed_offset == 4
+    assert spool.next_offset == 10
+    assert [r.value for r in spool.read(100)] == [
+        str(i).encode() for i in range(4, 10)
+    ]
+
+    # Appending continues after the recovered records
+    assert await spool.append("ltd.events", b"key", b"10") == 10
+    assert [r.value for r in spool.read(100)] == [b"10"]
+    await spool.close()
+
+
+async def test_interval_fsync(tmp_path: Path) -> None:
+    spool = Spool.open(tmp_path, fsync="interval", fsync_interval=0.01)
+    spool.start()
+    await spool.append("ltd.events", b"key", b"value")
+    await spool.close()
+
+    spool = Spool.open(tmp_path)
+    assert spool.depth == 1
+    await spool.close()
+
+
+def test_invalid_fsync_policy(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        Spool(tmp_path, fsync="sometimes")
+
+
+async def test_partition(tmp_path: Path) -> None:
+    spool = Spool.open(tmp_path, fsync="never")
+    await spool.append("ltd.events", b"k", b"v0")
+    await spool.append("ltd.events", b"k", b"v1", partition=3)
+    await spool.close()
+
+    spool = Spool.open(tmp_path, fsync="never")
+    records = spool.read(10)
+    assert [r.partition for r in records] == [None, 3]
+    assert records[1].topic == "ltd.events"
+    assert records[1].value == b"v1"
+    await spool.close()
+
+
+async def test_tombstone(tmp_path: Path) -> None:
+    spool = Spool.open(tmp_path, fsync="never")
+    await spool.append("ltd.editions", b"k", None)
+    await spool.append("ltd.editions", b"k", None, partition=1)
+    await spool.append("ltd.editions", b"k", b"")
+    await spool.close()
+
+    spool = Spool.open(tmp_path, fsync="never")
+    records = spool.read(10)
+    assert [r.value for r in records] == [None, None, b""]
+    assert [r.partition for r in records] == [None, 1, None]
+    assert records[1].topic == "ltd.editions"
+    await spool.close()
+
+
+async def test_worker_spool_dirs(tmp_path: Path) -> None:
+    # Spools left by a single process, and by four workers
+    for directory in [tmp_path] + [tmp_path / f"worker-{i}" for i in range(4)]:
+        spool = Spool.open(directory)
+        await spool.append("ltd.events", b"k", b"v")
+        await spool.close()
+    (tmp_path / "worker-7").mkdir()
+
+    assert worker_spool_dirs(tmp_path, 0, 2) == (
+        tmp_path / "worker-0",
+        [tmp_path, tmp_path / "worker-2"],
+    )
+    assert worker_spool_dirs(tmp_path, 1, 2) == (
+        tmp_path / "worker-1",
+        [tmp_path / "worker-3"],
+    )
+    assert worker_spool_dirs(tmp_path, 0, 1) == (
+        tmp_path,
+        [tmp_path / f"worker-{i}" for i in range(4)],
+    )
+    assert worker_spool_dirs(tmp_path / "missing", 0, 2) == (
+        tmp_path / "missing" / "worker-0",
+        [],
+    )
@@ -0,0 +1,127 @@
+"""Tests for the ltdevents.validators module."""
+
+from __future__ import annotations
+
+import copy
+import datetime
+from typing import Any, Dict, Optional
+
+import pydantic
+import pytest
+from pydantic import BaseModel, validator
+
+from ltdevents.eventregistry import EVENT_TYPES, EventRegistry
+from ltdevents.validators import compile_validator
+from ltdevents.webhookmodels import EditionUpdatedEvent
+
+PAYLOAD: Dict[str, Any] = {
+    "event_type": "edition.updated",
+    "event_timestamp": "2020-01-01T12:00:00Z",
+    "product": {
+        "published_url": "https://example.lsst.io/",
+        "url": "https://keeper.lsst.codes/products/example",
+        "title": "Example product",
+        "slug": "example",
+    },
+    "edition": {
+        "published_url": "https://example.lsst.io/v/1.0",
+        "url": "https://keeper.lsst.codes/editions/1234",
+        "title": "Version 1.0",
+        "slug": "1.0",
+        "build_url": "https://keeper.lsst.codes/builds/1",
+    },
+}
+
+
+def make_payload(**changes: Any) -> Dict[str, Any]:
+    """Copy the payload, setting dotted field paths to new values."""
+    payload = copy.deepcopy(PAYLOAD)
+    for path, value in changes.items():
+        *parents, name = path.split("__")
+        target = payload
+        for parent in parents:
+            target = target[parent]
+        target[name] = value
+    return payload
+
+
+def test_fast_path_matches_pydantic() -> None:
+    fast_validator = compile_validator(EditionUpdatedEvent)
+    assert fast_validator is not None
+
+    record = fast_validator(PAYLOAD)
+    assert record == EditionUpdatedEvent.parse_obj(PAYLOAD).dict()
+    assert record["event_timestamp"] == datetime.datetime(
+        2020, 1, 1, 12, tzinfo=datetime.timezone.utc
+    )
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        "2020-01-01T12:00:00.5Z",
+        "2020-01-01T12:00:00.123456+01:30",
+        "2020-01-01T12:00:00-07:00",
+    ],
+)
+def test_fast_path_timestamps(timestamp: str) -> None:
+    fast_validator = compile_validator(EditionUpdatedEvent)
+    assert fast_validator is not None
+    payload = make_payload(event_timestamp=timestamp)
+
+    record = fast_validator(payload)
+    assert record is not None
+    expected = EditionUpdatedEvent.parse_obj(payload).event_timestamp
+    assert record["event_timestamp"] == expected
+    assert record["event_timestamp"].utcoffset() == expected.utcoffset()
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        {"event_timestamp": "2020-01-01T12:00:00"},  # naive timestamp
+        {"event_timestamp": 1577880000},  # unix timestamp
+        {"event_timestamp": "2020-01-01"},  # invalid
+        {"event_timestamp": "2020-13-01T12:00:00Z"},  # invalid
+        {"product__title": 42},  # coerced to str by pydantic
+        {"edition__url": "https://keeper.lsst.codes:8443/editions/1"},
+        {"edition__url": "https://keeper.lsst.codes/editions/1\n"},
+        {"edition__url": "not a url"},  # invalid
+        {"edition__build_url": None},  # invalid
+        {"product": "example"},  # invalid
+    ],
+)
+def test_fast_path_fallback(changes: Dict[str, Any]) -> None:
+    """Payloads that the fast path can't validate fall back to pydantic, so
+    the result is always the same as pydantic's.
+    """
+    fast_validator = compile_validator(EditionUpdatedEvent)
+    assert fast_validator is not None
+    payload = make_payload(**changes)
+    registry = EventRegistry(EVENT_TYPES, default_topic="ltd.events")
+
+    assert fast_validator(payload) is None
+
+    try:
+        expected: Optional[Dict[str, Any]] = registry.parse_event(
+            payload
+        ).dict()
+    except pydantic.ValidationError as e:
+        with pytest.raises(pydantic.ValidationError) as excinfo:
+            registry.parse(payload)
+        assert excinfo.value.json() == e.json()
+    else:
+        assert registry.parse(payload)[1] == expected
+
+
+def test_compile_validator_unsupported() -> None:
+    """Models with custom validators don't have a fast path."""
+
+    class Model(BaseModel):
+        name: str
+
+        @validator("name")
+        def check_name(cls, v: str) -> str:
+            return v.lower()
+
+    assert compile_validator(Model) is None
@@ -0,0 +1,77 @@
+"""Tests for the ltdevents.workers module."""
+
+from __future__ import annotations
+
+import os
+import signal
+import sys
+import time
+from typing import Optional
+
+from ltdevents.workers import WorkerSupervisor
+
+
+def sleep_forever(
+    index: int, host: Optional[str], port: int, workers: int
+) -> None:
+    while True:
+        time.sleep(1)
+
+
+def exit_after_start(
+    index: int, host: Optional[str], port: int, workers: int
+) -> None:
+    sys.exit(1)
+
+
+def ignore_sigterm(
+    index: int, host: Optional[str], port: int, workers: int
+) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    sleep_forever(index, host, port, workers)
+
+
+def test_restart_dead_worker() -> None:
+    supervisor = WorkerSupervisor(
+        workers=2, port=8080, restart_delay=0.0, target=sleep_forever
+    )
+    supervisor.start()
+    try:
+        pids = supervisor.pids
+        assert len(pids) == 2
+        os.kill(pids[1], signal.SIGKILL)
+
+        deadline = time.monotonic() + 10
+        while supervisor.restart_count == 0 and time.monotonic() < deadline:
+            supervisor.check(timeout=0.1)
+        assert supervisor.restart_count == 1
+        assert len(supervisor.pids) == 2
+        assert supervisor.pids[0] == pids[0]
+        assert supervisor.pids[1] != pids[1]
+    finally:
+        supervisor.stop()
+    assert supervisor.pids == {}
+
+
+def test_restart_delay() -> None:
+    supervisor = WorkerSupervisor(
+        workers=1, port=8080, restart_delay=60.0, target=exit_after_start
+    )
+    supervisor.start()
+    try:
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            supervisor.check(timeout=0.1)
+        assert supervisor.restart_count == 0
+    finally:
+        supervisor.stop()
+
+
+def test_stop_kills_stuck_workers() -> None:
+    supervisor = WorkerSupervisor(
+        workers=1, port=8080, shutdown_timeout=0.5, target=ignore_sigterm
+    )
+    supervisor.start()
+    time.sleep(1)
+    supervisor.stop()
+    assert supervisor.pids == {}